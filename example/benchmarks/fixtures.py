@@ -0,0 +1,116 @@
+import os
+import json
+import logging
+import argparse
+
+from example.utilities.ffmpeg_tools import run_ffmpeg
+
+FIXTURE_VERSION = 1
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "youtube_sleep_automation", "bench_fixtures")
+
+RESOLUTIONS = {"360p": (640, 360), "720p": (1280, 720), "1080p": (1920, 1080)}
+CLIP_SECONDS = (10, 30)
+MUSIC_SECONDS = (60, 300)
+LOOPED_AUDIO_SECONDS = 3600
+LIBRARY_FILES = 24
+
+
+def make_video(path, seconds, size, fps=24):
+    """A moving synthetic clip (fractal zoom), so encoders cannot shortcut static frames."""
+    width, height = size
+    run_ffmpeg(["-f", "lavfi", "-i", f"mandelbrot=s={width}x{height}:r={fps}", "-t", str(seconds),
+                "-pix_fmt", "yuv420p", "-c:v", "libx264", "-preset", "veryfast", path],
+               description=f"fixture {os.path.basename(path)}")
+    return path
+
+
+def make_intro(path, size, seconds=3, fps=24):
+    width, height = size
+    run_ffmpeg(["-f", "lavfi", "-i", f"testsrc2=s={width}x{height}:r={fps}:d={seconds}",
+                "-pix_fmt", "yuv420p", "-c:v", "libx264", "-preset", "veryfast", path],
+               description=f"fixture {os.path.basename(path)}")
+    return path
+
+
+def make_music(path, seconds, frequency=220, seed=42):
+    """A tone over seeded pink noise: deterministic, but not trivially periodic for loop-point search."""
+    run_ffmpeg(["-f", "lavfi", "-i", f"sine=frequency={frequency}:sample_rate=44100:duration={seconds}",
+                "-f", "lavfi", "-i", f"anoisesrc=duration={seconds}:color=pink:amplitude=0.05:seed={seed}",
+                "-filter_complex", "amix=inputs=2:duration=shortest", "-ac", "2", "-ar", "44100", path],
+               description=f"fixture {os.path.basename(path)}")
+    return path
+
+
+def make_looped_audio(path, seconds):
+    """An AAC track standing in for the looper's output, long enough for the longest render case."""
+    run_ffmpeg(["-f", "lavfi", "-i", f"sine=frequency=220:sample_rate=44100:duration={seconds}",
+                "-ac", "2", "-c:a", "aac", "-b:a", "128k", path],
+               description=f"fixture {os.path.basename(path)}")
+    return path
+
+
+def fixture_paths(fixture_dir):
+    """Paths of every fixture, keyed the way the benchmark cases look them up."""
+    paths = {"looped_audio": os.path.join(fixture_dir, f"looped_audio_{LOOPED_AUDIO_SECONDS}s.m4a"),
+             "library_music": os.path.join(fixture_dir, "library", "music"),
+             "library_video": os.path.join(fixture_dir, "library", "videos")}
+    for label in RESOLUTIONS:
+        paths[f"intro_{label}"] = os.path.join(fixture_dir, f"intro_{label}.mp4")
+        for seconds in CLIP_SECONDS:
+            paths[f"clip_{label}_{seconds}s"] = os.path.join(fixture_dir, f"clip_{label}_{seconds}s.mp4")
+    for seconds in MUSIC_SECONDS:
+        paths[f"music_{seconds}s"] = os.path.join(fixture_dir, f"music_{seconds}s.wav")
+    return paths
+
+
+def ensure_fixtures(fixture_dir=None):
+    """
+    Generate the synthetic media the benchmarks run on, unless it is already there.
+
+    Everything comes from ffmpeg's lavfi sources, so no downloads are needed and every machine
+    benchmarks the same content: a 3 s intro and 10 s / 30 s clips at 360p, 720p and 1080p,
+    60 s and 300 s music tracks, an hour of AAC audio for the render cases, and a small staging
+    library of short files for the selection helpers. A stamp file records the fixture version.
+
+    Parameters:
+    - fixture_dir (str): Where fixtures are kept. Defaults to ~/.cache/youtube_sleep_automation/bench_fixtures.
+
+    Returns:
+    - dict: Fixture name -> path.
+    """
+    fixture_dir = os.path.abspath(fixture_dir or DEFAULT_FIXTURE_DIR)
+    paths = fixture_paths(fixture_dir)
+    stamp_path = os.path.join(fixture_dir, "fixtures.json")
+    if os.path.exists(stamp_path):
+        with open(stamp_path) as stamp_file:
+            if json.load(stamp_file).get("version") == FIXTURE_VERSION:
+                return paths
+
+    logging.info(f"Generating benchmark fixtures in {fixture_dir}...")
+    os.makedirs(paths["library_music"], exist_ok=True)
+    os.makedirs(paths["library_video"], exist_ok=True)
+    for label, size in RESOLUTIONS.items():
+        make_intro(paths[f"intro_{label}"], size)
+        for seconds in CLIP_SECONDS:
+            make_video(paths[f"clip_{label}_{seconds}s"], seconds, size)
+    for seconds in MUSIC_SECONDS:
+        make_music(paths[f"music_{seconds}s"], seconds)
+    make_looped_audio(paths["looped_audio"], LOOPED_AUDIO_SECONDS)
+    for index in range(LIBRARY_FILES):
+        make_music(os.path.join(paths["library_music"], f"track_{index:02d}.wav"), 5, frequency=110 + 10 * index,
+                   seed=index)
+        make_video(os.path.join(paths["library_video"], f"clip_{index:02d}.mp4"), 2, RESOLUTIONS["360p"])
+
+    with open(stamp_path, "w") as stamp_file:
+        json.dump({"version": FIXTURE_VERSION, "paths": paths}, stamp_file, indent=2)
+    return paths
+
+
+# Usage example
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Generate the synthetic benchmark fixtures.")
+    parser.add_argument("--fixtures-dir", default=DEFAULT_FIXTURE_DIR)
+    args = parser.parse_args()
+
+    print(json.dumps(ensure_fixtures(args.fixtures_dir), indent=2))
@@ -0,0 +1,421 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import subprocess
+
+from example.benchmarks.fixtures import DEFAULT_FIXTURE_DIR, ensure_fixtures, fixture_paths
+from example.utilities.ffmpeg_tools import get_ffmpeg_binary
+from example.utilities.hashing import file_sha256
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RESULT_MARKER = "BENCHMARK_RESULT "
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# main.py and the pipeline modules must import within this budget and without any of the heavy dependencies
+IMPORT_BUDGET_SECONDS = 0.3
+HEAVY_MODULES = ("moviepy", "pydub", "numpy", "googleapiclient", "google_auth_oauthlib")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Whether a larger value of a metric is better or worse; other metrics are reported but not compared
+METRIC_DIRECTIONS = {
+    "wall_seconds": "lower",
+    "peak_rss_bytes": "lower",
+    "realtime_factor": "higher",
+    "mib_per_second": "higher",
+    "upload_lag_seconds": "lower",
+    "resume_seconds": "lower",
+    "rss_growth_ratio": "lower",
+    "import_seconds": "lower",
+}
+
+
+def peak_rss():
+    """High-water RSS of this process and of its largest finished child (ffmpeg), in bytes."""
+    if resource is None:
+        return {}
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {"peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+            "children_peak_rss_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit}
+
+
+def benchmark_shell(work_dir, render_mode="stream_copy"):
+    """An ExampleShell whose caches and library live in work_dir, so every case starts cold."""
+    from example.example import ExampleShell
+
+    configs = {"media_library_path": os.path.join(work_dir, "media_library.sqlite3"),
+               "loop_point_cache_dir": os.path.join(work_dir, "loop_points"),
+               "segment_cache_dir": os.path.join(work_dir, "segment_cache"),
+               "render_mode": render_mode, "seamless_loops": "False"}
+    return ExampleShell(configs=configs, run=False)
+
+
+def case_render(fixtures, work_dir, duration_minutes, resolution="720p", render_mode="stream_copy"):
+    """ExampleShell.create_video_with_black_screen on a 10 s clip and the hour-long audio track."""
+    from example.utilities.ffmpeg_tools import probe_media
+
+    shell = benchmark_shell(work_dir, render_mode)
+    shell.intro_path = fixtures[f"intro_{resolution}"]
+    output_path = os.path.join(work_dir, "final_output_video.mp4")
+    start_time = time.perf_counter()
+    shell.create_video_with_black_screen(fixtures[f"clip_{resolution}_10s"], fixtures["looped_audio"], output_path,
+                                         duration_minutes / 60, output_dir=work_dir)
+    wall = time.perf_counter() - start_time
+    if shell.last_renderer != render_mode:
+        # Timing the moviepy fallback under this case's name would hide the failure
+        raise RuntimeError(f"The {render_mode} renderer failed and {shell.last_renderer} rendered instead")
+    media_seconds = probe_media(output_path)["duration"]
+    return {"wall_seconds": wall, "media_seconds": media_seconds, "realtime_factor": media_seconds / wall,
+            "output_bytes": os.path.getsize(output_path), "renderer": shell.last_renderer}
+
+
+def case_audio_loop(fixtures, work_dir, duration_minutes):
+    """The streaming audio looper; peak RSS should stay flat as the output gets longer."""
+    from example.utilities.audio_looper import AudioLooper
+
+    output_path = os.path.join(work_dir, "looped_audio.m4a")
+    start_time = time.perf_counter()
+    AudioLooper(crossfade_seconds=5.0, codec="aac").loop_audio(fixtures["music_60s"], output_path,
+                                                                duration_minutes / 60, work_dir=work_dir)
+    wall = time.perf_counter() - start_time
+    return {"wall_seconds": wall, "realtime_factor": duration_minutes * 60 / wall}
+
+
+def case_select_media(fixtures, work_dir, rounds=50):
+    """get_music_file/get_video_file on the fixture library: a cold first call syncs, later calls only query the index."""
+    shell = benchmark_shell(work_dir)
+    shell.music_dir = fixtures["library_music"]
+    shell.video_dir = fixtures["library_video"]
+    shell.media_library.measure_loudness = False
+
+    start_time = time.perf_counter()
+    shell.get_music_file()
+    shell.get_video_file()
+    cold = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        shell.get_music_file()
+        shell.get_video_file()
+    warm = (time.perf_counter() - start_time) / rounds
+    return {"wall_seconds": cold + warm * rounds, "cold_seconds": cold, "warm_seconds": warm}
+
+
+def case_upload(fixtures, work_dir, size_mib=256, error_rate=0.0, partial_rate=0.0, disconnect_rate=0.0):
+    """YouTubeUploader's chunk loop against the local FakeUploadServer, optionally with injected failures."""
+    import requests
+    from example.utilities.fake_upload_server import FakeUploadServer
+    from example.utilities.youtube_uploader import YouTubeUploader
+
+    media_path = os.path.join(work_dir, "upload.bin")
+    with open(media_path, "wb") as media:
+        for _ in range(size_mib):
+            media.write(os.urandom(1024 * 1024))
+    with FakeUploadServer(output_dir=os.path.join(work_dir, "received"), error_rate=error_rate,
+                          partial_rate=partial_rate, disconnect_rate=disconnect_rate, seed=7) as server:
+        with YouTubeUploader(session=requests.Session(), upload_url=server.upload_url) as uploader:
+            start_time = time.perf_counter()
+            video = uploader.upload(media_path, "benchmark", "", "10", "private")
+            wall = time.perf_counter() - start_time
+        injected = sum(server.injected.values())
+        received = next(upload["path"] for upload in server.uploads.values() if upload["video_id"] == video["id"])
+        if file_sha256(received) != file_sha256(media_path):
+            raise RuntimeError(f"Uploaded bytes differ from {media_path} after {injected} injected failures")
+    return {"wall_seconds": wall, "mib_per_second": size_mib / wall, "injected_failures": injected}
+
+
+def case_pipelined_upload(fixtures, work_dir, duration_minutes=10):
+    """Render with the final join streamed into an upload; measures how long the upload trails the render."""
+    import requests
+    from example.utilities.fake_upload_server import FakeUploadServer
+    from example.utilities.youtube_uploader import YouTubeUploader
+    from example.utilities.pipelined_upload import PipelinedUpload
+    from example.utilities.stream_renderer import StreamCopyRenderer
+
+    output_path = os.path.join(work_dir, "final_output_video.mp4")
+    with FakeUploadServer(output_dir=os.path.join(work_dir, "received")) as server:
+        with YouTubeUploader(session=requests.Session(), upload_url=server.upload_url) as uploader:
+            pipeline = PipelinedUpload(lambda: uploader.start_resumable_upload("benchmark", "", "10", "private"))
+            start_time = time.perf_counter()
+            StreamCopyRenderer().render(fixtures["intro_720p"], fixtures["clip_720p_10s"], fixtures["looped_audio"],
+                                        output_path, duration_minutes / 60, work_dir=os.path.join(work_dir, "segments"),
+                                        pipeline=pipeline)
+            rendered = time.perf_counter() - start_time
+            video = pipeline.finish()
+            wall = time.perf_counter() - start_time
+        if video is None:
+            raise RuntimeError(f"Pipelined upload failed: {pipeline.error}")
+        received = server.uploads[next(iter(server.uploads))]["path"]
+        identical = open(received, "rb").read() == open(output_path, "rb").read()
+    return {"wall_seconds": wall, "render_seconds": rendered, "upload_lag_seconds": wall - rendered,
+            "identical": identical}
+
+
+def render_job(fixtures, output_dir, duration_minutes):
+    """A checkpointed stream-copy render, run in its own process by case_resume_render so it can be killed."""
+    from example.utilities.checkpoint import RenderManifest
+    from example.utilities.stream_renderer import StreamCopyRenderer
+
+    StreamCopyRenderer().render(fixtures["intro_720p"], fixtures["clip_720p_30s"], fixtures["looped_audio"],
+                                os.path.join(output_dir, "final_output_video.mp4"), duration_minutes / 60,
+                                work_dir=os.path.join(output_dir, "segments"), manifest=RenderManifest(output_dir))
+
+
+def case_resume_render(fixtures, work_dir, duration_minutes=30, fixtures_dir=None):
+    """
+    Kill a checkpointed render once two segments are done, then resume it in-process.
+
+    Compares the resume with an uninterrupted render to show how much work checkpoints save,
+    and fails unless the resumed output is stream-identical to the uninterrupted one.
+    """
+    from example.utilities.checkpoint import RenderManifest
+    from example.utilities.ffmpeg_tools import stream_hashes
+
+    full_dir = os.path.join(work_dir, "full")
+    os.makedirs(full_dir)
+    start_time = time.perf_counter()
+    render_job(fixtures, full_dir, duration_minutes)
+    full = time.perf_counter() - start_time
+
+    resumed_dir = os.path.join(work_dir, "resumed")
+    os.makedirs(resumed_dir)
+    command = [sys.executable, "-m", "example.benchmarks.suite", "--render-job", resumed_dir,
+               "--duration-minutes", str(duration_minutes), "--fixtures-dir", fixtures_dir]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    start_time = time.perf_counter()
+    while process.poll() is None:
+        manifest = RenderManifest(resumed_dir) if os.path.exists(os.path.join(resumed_dir, "manifest.json")) else None
+        if manifest is not None and len(manifest.data["segments"]) >= 2:
+            process.kill()
+            break
+        time.sleep(0.05)
+    process.wait()
+    killed_after = time.perf_counter() - start_time
+    reused = len(RenderManifest(resumed_dir).data["segments"])
+
+    start_time = time.perf_counter()
+    render_job(fixtures, resumed_dir, duration_minutes)
+    resumed = time.perf_counter() - start_time
+    if stream_hashes(os.path.join(resumed_dir, "final_output_video.mp4")) != stream_hashes(
+            os.path.join(full_dir, "final_output_video.mp4")):
+        raise RuntimeError("The resumed render is not stream-identical to the uninterrupted one")
+    return {"wall_seconds": killed_after + resumed, "full_seconds": full, "killed_after_seconds": killed_after,
+            "resume_seconds": resumed, "segments_reused": reused, "saved_fraction": 1 - resumed / full}
+
+
+def case_import_time(fixtures, work_dir, repeats=5, budget=IMPORT_BUDGET_SECONDS):
+    """
+    Time importing main.py and ExampleShell in a fresh interpreter, as the --plan and cron paths do.
+
+    Fails if a heavy dependency is imported eagerly or the median import exceeds the budget.
+    """
+    script = ("import sys, time, json; start = time.perf_counter(); import main, example.example; "
+              "print(json.dumps({'seconds': time.perf_counter() - start, "
+              f"'heavy': [name for name in {HEAVY_MODULES!r} if name in sys.modules]}}))")
+    samples = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing main.py failed: {result.stderr.strip().splitlines()[-1:]}")
+        samples.append(json.loads(result.stdout))
+    heavy = sorted({name for sample in samples for name in sample["heavy"]})
+    if heavy:
+        raise RuntimeError(f"Importing main.py loaded heavy dependencies: {', '.join(heavy)}")
+    seconds = sorted(sample["seconds"] for sample in samples)[len(samples) // 2]
+    if seconds > budget:
+        raise RuntimeError(f"Importing main.py took {seconds * 1000:.0f} ms, over the {budget * 1000:.0f} ms budget")
+    return {"wall_seconds": seconds, "import_seconds": seconds, "budget_seconds": budget}
+
+
+# name -> (function, keyword arguments, included in --quick)
+CASES = {
+    "render_1min_720p": (case_render, {"duration_minutes": 1}, True),
+    "render_30min_720p": (case_render, {"duration_minutes": 30}, False),
+    "render_1h_720p": (case_render, {"duration_minutes": 60}, False),
+    "render_1min_360p": (case_render, {"duration_minutes": 1, "resolution": "360p"}, True),
+    "render_1min_1080p": (case_render, {"duration_minutes": 1, "resolution": "1080p"}, False),
+    "render_1min_720p_parallel": (case_render, {"duration_minutes": 1, "render_mode": "parallel"}, False),
+    "audio_loop_1min": (case_audio_loop, {"duration_minutes": 1}, True),
+    "audio_loop_30min": (case_audio_loop, {"duration_minutes": 30}, False),
+    "audio_loop_1h": (case_audio_loop, {"duration_minutes": 60}, False),
+    "select_media": (case_select_media, {}, True),
+    "upload_chunk_loop": (case_upload, {}, True),
+    "upload_chunk_loop_faulty": (case_upload, {"error_rate": 0.1, "partial_rate": 0.05, "disconnect_rate": 0.02},
+                                 False),
+    "pipelined_upload": (case_pipelined_upload, {}, False),
+    "resume_render": (case_resume_render, {}, False),
+    "import_time": (case_import_time, {}, True),
+}
+
+
+def run_case_here(name, fixtures_dir):
+    """Run one case in this process and return its metrics plus this process's peak RSS."""
+    function, kwargs, _ = CASES[name]
+    fixtures = fixture_paths(fixtures_dir)
+    if function is case_resume_render:
+        kwargs = dict(kwargs, fixtures_dir=fixtures_dir)
+    work_dir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        metrics = function(fixtures, work_dir, **kwargs)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    metrics.update(peak_rss())
+    return metrics
+
+
+def run_case(name, fixtures_dir, timeout=None):
+    """
+    Run one case in a fresh interpreter, so imports, caches and peak RSS do not leak between cases.
+
+    Returns:
+    - dict: The case's metrics, or {"error": ...} if it failed.
+    """
+    command = [sys.executable, "-m", "example.benchmarks.suite", "--run-case", name, "--fixtures-dir", fixtures_dir]
+    logging.info(f"Benchmark {name}...")
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"error": f"timed out after {timeout} seconds"}
+    for line in result.stdout.decode(errors="replace").splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    stderr = result.stderr.decode(errors="replace").strip()
+    return {"error": f"exit code {result.returncode}: {stderr[-2000:]}"}
+
+
+def machine_info():
+    version = subprocess.run([get_ffmpeg_binary(), "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return {"platform": platform.platform(), "machine": platform.machine(), "python": platform.python_version(),
+            "cpu_count": os.cpu_count(), "ffmpeg": version.stdout.decode(errors="replace").split("\n")[0]}
+
+
+def derived_checks(cases):
+    """Cross-case figures: how audio-loop RSS scales with output length."""
+    checks = {}
+    short, long = cases.get("audio_loop_1min", {}), cases.get("audio_loop_1h", {})
+    if short.get("peak_rss_bytes") and long.get("peak_rss_bytes"):
+        checks["audio_loop_rss"] = {"rss_growth_ratio": long["peak_rss_bytes"] / short["peak_rss_bytes"]}
+    return checks
+
+
+def run_suite(names, fixtures_dir=None, timeout=None):
+    """
+    Run the named benchmark cases and collect their results.
+
+    Returns:
+    - dict: created_at, machine, cases (name -> metrics) and derived checks.
+    """
+    fixtures_dir = os.path.abspath(fixtures_dir or DEFAULT_FIXTURE_DIR)
+    ensure_fixtures(fixtures_dir)
+    cases = {}
+    for name in names:
+        cases[name] = run_case(name, fixtures_dir, timeout=timeout)
+        if "error" in cases[name]:
+            logging.error(f"Benchmark {name} failed: {cases[name]['error']}")
+        else:
+            logging.info(f"Benchmark {name}: {cases[name]['wall_seconds']:.2f}s")
+    return {"created_at": time.time(), "machine": machine_info(), "cases": cases, "checks": derived_checks(cases)}
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Compare results with a baseline run, metric by metric.
+
+    Parameters:
+    - tolerance (float): Relative change allowed before a metric counts as regressed or improved.
+
+    Returns:
+    - list: (case, metric, baseline value, current value, relative change, status) rows, where
+      status is "ok", "regressed" or "improved".
+    """
+    rows = []
+    for section in ("cases", "checks"):
+        for name, metrics in results.get(section, {}).items():
+            for metric, direction in METRIC_DIRECTIONS.items():
+                before = baseline.get(section, {}).get(name, {}).get(metric)
+                after = metrics.get(metric)
+                if not before or after is None:
+                    continue
+                change = (after - before) / before
+                worse = change > tolerance if direction == "lower" else change < -tolerance
+                better = change < -tolerance if direction == "lower" else change > tolerance
+                rows.append((name, metric, before, after, change,
+                             "regressed" if worse else "improved" if better else "ok"))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'case':<28} {'metric':<20} {'baseline':>14} {'current':>14} {'change':>8}  status")
+    for name, metric, before, after, change, status in rows:
+        print(f"{name:<28} {metric:<20} {before:>14.4g} {after:>14.4g} {change:>+8.1%}  {status}")
+
+
+# Benchmark entry point
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    parser = argparse.ArgumentParser(description="Benchmark the render, audio, selection and upload hot paths.")
+    parser.add_argument("cases", nargs="*", help=f"Cases to run (default: all). One of: {', '.join(CASES)}")
+    parser.add_argument("--quick", action="store_true", help="Only the short cases")
+    parser.add_argument("--fixtures-dir", default=DEFAULT_FIXTURE_DIR)
+    parser.add_argument("--output", help="Write the results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help=f"Compare with this results file, e.g. {DEFAULT_BASELINE}. If it does "
+                                           f"not exist yet, a successful run is stored there as the baseline.")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Also store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change tolerated (default: 0.1)")
+    parser.add_argument("--timeout", type=float, default=3 * 60 * 60, help="Seconds allowed per case")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--render-job", help=argparse.SUPPRESS)
+    parser.add_argument("--duration-minutes", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(RESULT_MARKER + json.dumps(run_case_here(args.run_case, args.fixtures_dir)))
+        raise SystemExit(0)
+    if args.render_job:
+        render_job(fixture_paths(args.fixtures_dir), args.render_job, args.duration_minutes)
+        raise SystemExit(0)
+
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(unknown)}")
+    names = args.cases or [name for name, (_, _, quick) in CASES.items() if quick or not args.quick]
+    results = run_suite(names, fixtures_dir=args.fixtures_dir, timeout=args.timeout)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            baseline_file.write(text + "\n")
+
+    failed = [name for name, metrics in results["cases"].items() if "error" in metrics]
+    regressed = []
+    if args.baseline and not os.path.exists(args.baseline):
+        # Baselines are per machine and toolchain, so the first run on a machine records one
+        if failed:
+            logging.error(f"Not recording {args.baseline}: {', '.join(failed)} failed.")
+        else:
+            with open(args.baseline, "w") as baseline_file:
+                baseline_file.write(text + "\n")
+            logging.info(f"No baseline at {args.baseline} yet; stored these results as the baseline.")
+    elif args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("machine") != results["machine"]:
+            logging.warning("The baseline was recorded on a different machine or toolchain; compare with care.")
+        rows = compare(results, baseline, tolerance=args.tolerance)
+        print_comparison(rows)
+        regressed = [row for row in rows if row[-1] == "regressed"]
+    raise SystemExit(1 if failed or regressed else 0)
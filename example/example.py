@@ -3,16 +3,31 @@ import shutil
 import time
 import os
 from datetime import datetime
-from pydub import AudioSegment
-from moviepy.editor import VideoFileClip, concatenate_videoclips, ColorClip, AudioFileClip
 # from moviepy.video.fx.all import loop
 import random
+import threading
 
-from example.utilities.youtube_uploader import YouTubeUploader
+# moviepy, numpy and the Google API client are imported inside the stages that use them, so
+# importing the shell (e.g. for main.py --plan or a cron check) stays fast
 from example.utilities.logic_pro import LogicProAutomation
+from example.utilities.audio_looper import AudioLooper
+from example.utilities.stream_renderer import StreamCopyRenderer, verify_audio_duration, plan_timeline
+from example.utilities.parallel_encoder import ParallelSegmentEncoder
+from example.utilities.segment_cache import SegmentCache
+from example.utilities.ffmpeg_tools import probe_media, mux_audio
+from example.utilities.encode_profiles import get_profile, log_output_size, estimate_output_bytes
+from example.utilities.media_library import MediaLibrary
+from example.utilities.loop_points import LoopPointFinder
+from example.utilities.batch_scheduler import BatchScheduler
+from example.utilities.checkpoint import RenderManifest
+from example.utilities.stage_graph import StageGraph
+from example.utilities.hashing import file_sha256
+from example.utilities.pipelined_upload import PipelinedUpload
+from example.utilities.upload_service import UploadService, QuotaRateLimiter
+from example.utilities.instrumentation import RunReport, record
 
 class ExampleShell:
-    def __init__(self, configs, debug=True, duration_hours=0.5):
+    def __init__(self, configs, debug=True, duration_hours=0.5, run=True):
         #30 min = 0.5
         # 1 min duration = 0.0166
         # 30-sec duration = 0.0083
@@ -20,65 +35,491 @@ class ExampleShell:
         # Configure logging
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.debug = debug
-        self.output_dir = os.path.abspath(self.create_output_directory())
+        # Batch runs (run=False) give every job its own output directory instead
+        self.output_dir = os.path.abspath(self.create_output_directory()) if run else None
         self.music_dir = "/Users/mac/PycharmProjects/youtube_sleep_automation/staging_files/music"
 
         self.video_dir = "/Users/mac/PycharmProjects/youtube_sleep_automation/staging_files/videos"
         self.duration_hours = duration_hours  # Customizable duration in hours
-        self.logic_pro_automation = LogicProAutomation("example/utilities/logic_pro_loop_and_bounce.scpt")  # Path to Logic Pro script
 
-        self.main()
+        # The catalog, caches and renderer touch the disk when created, so they are built on first use
+        # (see the properties below); --plan never creates them
+        self.configs = configs
+        self.components = {}
+        self.components_lock = threading.Lock()
+
+        # Indexed catalog of the staging files; selection is a query instead of a directory rescan
+        self.media_library_path = configs.get('media_library_path') or os.path.join(
+            os.path.dirname(self.music_dir), "media_library.sqlite3")
+        self.min_video_height = int(configs['min_video_height']) if configs.get('min_video_height') else None
+        self.min_video_duration = float(configs['min_video_duration']) if configs.get('min_video_duration') else None
+        self.media_library_synced = False
+
+        self.encode_profile = get_profile(configs.get('encode_profile') or 'default')
+
+        # Seamless loop points for the music and the clip, analyzed once per content hash
+        self.seamless_loops = str(configs.get('seamless_loops') or 'True') == 'True'
+
+        # Audio looping backend: "numpy" (streaming crossfade looper) or "logic_pro" (AppleScript bounce).
+        # The looped track is written in its final codec and muxed into the video without re-encoding.
+        self.audio_backend = configs.get('audio_backend') or 'numpy'
+        if self.audio_backend == 'logic_pro':
+            self.logic_pro_automation = LogicProAutomation(
+                "example/utilities/logic_pro_loop_and_bounce.scpt",  # Path to Logic Pro script
+                timeout=float(configs.get('logic_pro_timeout') or 3 * 60 * 60))
+            self.looped_audio_name = "looped_audio.mp3"
+        elif self.audio_backend == 'numpy':
+            self.audio_looper = AudioLooper(crossfade_seconds=5.0, codec="aac", bitrate=self.encode_profile.audio_bitrate)
+            self.looped_audio_name = "looped_audio.m4a"
+        else:
+            raise ValueError(f"Unknown audio backend: {self.audio_backend}")
+
+        # Render mode: "stream_copy" (encode each distinct segment once), "parallel" (segmented
+        # full encode across a process pool) or "moviepy" (single-process full re-encode)
+        self.intro_path = "/Users/mac/PycharmProjects/staging_files/intro_video/Welcome.mp4"
+        # Seconds; lets --plan size the timeline when the intro is not in the media library
+        self.intro_duration = float(configs['intro_duration']) if configs.get('intro_duration') else None
+        self.render_mode = configs.get('render_mode') or 'stream_copy'
+        if self.render_mode not in ('stream_copy', 'parallel', 'moviepy'):
+            raise ValueError(f"Unknown render mode: {self.render_mode}")
+        # Renderer that produced the last video; differs from render_mode after a moviepy fallback
+        self.last_renderer = None
+        self.render_workers = int(configs.get('render_workers') or 0) or os.cpu_count()
+        # Upload the final join while it is being written (stream_copy and parallel modes)
+        self.pipelined_upload = str(configs.get('pipelined_upload') or 'False') == 'True'
+
+        # Batch mode: concurrent stages allowed per resource (encoding, the Logic Pro bounce, uploads)
+        self.batch_limits = {
+            "cpu": int(configs.get('batch_cpu_slots') or 1),
+            "logic": int(configs.get('batch_logic_slots') or 1),
+            "upload": int(configs.get('batch_upload_slots') or 1),
+        }
+
+        # One authenticated uploader and upload queue shared by every upload of this shell, created on first use
+        self.youtube_daily_quota = int(configs.get('youtube_daily_quota') or 10000)
+        self.upload_quota_state = configs.get('upload_quota_state') or 'upload_quota.json'
+        self.upload_service = None
+        self.upload_service_lock = threading.Lock()
+
+        # Per-stage timings go to performance.json in each output directory, and optionally to a Prometheus textfile
+        self.metrics_textfile = configs.get('metrics_textfile')
+
+        if run:
+            self.main()
+
+    def component(self, name, create):
+        """Return the shared component called name, creating it on first use (thread-safe for batch jobs)."""
+        with self.components_lock:
+            if name not in self.components:
+                self.components[name] = create()
+            return self.components[name]
+
+    @property
+    def media_library(self):
+        return self.component("media_library", lambda: MediaLibrary(self.media_library_path))
+
+    @property
+    def loop_point_finder(self):
+        return self.component("loop_point_finder",
+                              lambda: LoopPointFinder(cache_dir=self.configs.get('loop_point_cache_dir')))
+
+    @property
+    def segment_cache(self):
+        # Encoded intro and black-tail blocks are reused across runs from a persistent LRU cache
+        max_gb = float(self.configs.get('segment_cache_max_gb') or 20)
+        return self.component("segment_cache", lambda: SegmentCache(cache_dir=self.configs.get('segment_cache_dir'),
+                                                                    max_bytes=int(max_gb * 1024 ** 3)))
+
+    @property
+    def stream_renderer(self):
+        return self.component("stream_renderer", lambda: StreamCopyRenderer(
+            profile=self.encode_profile, black_unit_seconds=600, segment_cache=self.segment_cache))
 
     def main(self):
         start_time = time.time()
         logging.info("Starting YouTube Shell...")
 
+        report = RunReport(self.output_dir, textfile=self.metrics_textfile)
         try:
-            # Step 1: Prepare music file
-            music_file = self.get_music_file()
-            looped_audio_path = os.path.join(self.output_dir, "looped_audio.mp3")
-            logging.info("LogicPro: Looping audio with crossfade...")
+            with report.stage("select_media"):
+                music_file = self.get_music_file()
+                video_file = self.get_video_file()
+            for stage_name, resource, stage in self.job_stages(music_file, video_file, self.output_dir,
+                                                               report=report):
+                stage()
+
+        except Exception as e:
+            logging.error(f"An error occurred in the pipeline: {e}")
+        finally:
+            self.close_upload_service()
+            elapsed_time = time.time() - start_time
+            logging.info(f"ExampleShell completed in {elapsed_time:.2f} seconds.")
+
+    def resume(self, output_dir, from_stage=None, only_stage=None):
+        """
+        Finish an interrupted run in its own output directory, or rerun some of its stages.
+
+        The run's manifest names the music and video files and the settings it started with;
+        up-to-date stages are skipped and the render encodes only the segments that are missing.
 
-            # Run Logic Pro automation, passing the music file and dynamic output directory
-            self.logic_pro_automation.run_automation(target_folder=self.music_dir, save_to_folder=self.output_dir)
+        Parameters:
+        - output_dir (str): Output directory of the run.
+        - from_stage (str): Rerun this stage and every later one, e.g. "render".
+        - only_stage (str): Rerun just this stage, e.g. "upload".
+        """
+        start_time = time.time()
+        output_dir = os.path.abspath(output_dir)
+        manifest = RenderManifest(output_dir)
+        if not manifest.exists:
+            raise FileNotFoundError(f"No checkpoint manifest found in {output_dir}")
+        job = manifest.job
+        logging.info(f"Resuming run in {output_dir}: {manifest.summary()['stages']}")
+
+        # Re-render with the settings the run started with so reused segments match new ones
+        self.output_dir = output_dir
+        self.duration_hours = job["duration_hours"]
+        self.render_mode = job["render_mode"]
+        for setting, current in (("encode_profile", self.encode_profile.name), ("audio_backend", self.audio_backend)):
+            if job.get(setting) != current:
+                logging.warning(f"Run started with {setting}={job.get(setting)}, resuming with {current}; "
+                                f"segments encoded with the old setting will be redone.")
+        try:
+            for stage_name, resource, stage in self.job_stages(job["music_file"], job["video_file"], output_dir,
+                                                               manifest=manifest, from_stage=from_stage,
+                                                               only_stage=only_stage):
+                stage()
+
+        except Exception as e:
+            logging.error(f"An error occurred in the pipeline: {e}")
+        finally:
+            self.close_upload_service()
+            elapsed_time = time.time() - start_time
+            logging.info(f"ExampleShell completed in {elapsed_time:.2f} seconds.")
+
+    def job_stages(self, music_file, video_file, output_dir, manifest=None, from_stage=None, only_stage=None,
+                   report=None):
+        """
+        Build the pipeline for one music/video pair as (stage_name, resource, callable) stages.
 
+        main() runs the stages in order; BatchScheduler runs them for many pairs at once, using
+        the resource to decide which concurrency limit each stage counts against. The stages form
+        a StageGraph in the output directory's manifest: each records its inputs and the content
+        hash of its artifact, and is skipped while those are unchanged.
+
+        Parameters:
+        - music_file (str): Path to the music file to loop.
+        - video_file (str): Path to the video file to loop.
+        - output_dir (str): Folder for this job's intermediate and final files.
+        - manifest (RenderManifest): Checkpoint manifest of output_dir. Created if not given.
+        - from_stage (str): Rerun this stage and every later one, keeping the earlier results.
+        - only_stage (str): Rerun just this stage.
+        - report (RunReport): Where stage timings are recorded. Created in output_dir if not given.
+        """
+        if manifest is None:
+            manifest = RenderManifest(output_dir)
+            manifest.set_job(music_file=music_file, video_file=video_file, duration_hours=self.duration_hours,
+                             render_mode=self.render_mode, encode_profile=self.encode_profile.name,
+                             audio_backend=self.audio_backend)
+        graph = StageGraph(manifest, report=report or RunReport(output_dir, textfile=self.metrics_textfile))
+        output_video_path = os.path.join(output_dir, "final_output_video.mp4")
+        # A pipelined upload started by the render is finished by the upload stage, on the upload slot
+        pipelines = {}
+
+        def loop_audio_inputs():
+            if self.audio_backend == 'logic_pro':
+                settings = {"script": file_sha256(self.logic_pro_automation.scpt_path)}
+            else:
+                settings = {"crossfade": self.audio_looper.crossfade_seconds, "codec": self.audio_looper.codec,
+                            "bitrate": self.audio_looper.bitrate, "seamless_loops": self.seamless_loops}
+            return {"music": self.source_hash(music_file, output_dir), "duration_hours": self.duration_hours,
+                    "audio_backend": self.audio_backend, **settings}
+
+        def prepare_audio():
+            # Step 1: Prepare music file
+            looped_audio_path = self.loop_audio(self.locate_source(music_file, output_dir),
+                                                os.path.join(output_dir, self.looped_audio_name), output_dir=output_dir)
             logging.info(f"Looped audio saved at: {looped_audio_path}")
+            return {"looped_audio_path": looped_audio_path}
 
+        def render_inputs():
+            return {"video": self.source_hash(video_file, output_dir), "intro": file_sha256(self.intro_path),
+                    "audio": graph.artifact_hash("loop_audio", "looped_audio_path"),
+                    "duration_hours": self.duration_hours, "render_mode": self.render_mode,
+                    "encode_profile": self.encode_profile.to_dict(), "seamless_loops": self.seamless_loops}
+
+        def render_video():
             # Step 2: Prepare video file
-            video_file = self.get_video_file()
-            output_video_path = os.path.join(self.output_dir, "final_output_video.mp4")
             logging.info(f"Creating video for {self.duration_hours} hours...")
-            self.create_video_with_black_screen(video_file, looped_audio_path, output_video_path, duration_hours=self.duration_hours)
+            source = self.locate_source(video_file, output_dir)
+            pipeline = PipelinedUpload(self.start_pipelined_upload) if self.pipelined_upload else None
+            try:
+                self.create_video_with_black_screen(source, graph.artifact("loop_audio", "looped_audio_path"),
+                                                    output_video_path, duration_hours=self.duration_hours,
+                                                    video_loop=self.find_loop_points(source, "video"),
+                                                    output_dir=output_dir, manifest=manifest, pipeline=pipeline)
+            except Exception:
+                if pipeline is not None:
+                    pipeline.abort()
+                raise
             logging.info(f"Video created and saved at: {output_video_path}")
+            if pipeline is not None:
+                pipelines["render"] = pipeline
+            return {"video_path": output_video_path}
 
+        def archive():
             # Step 3: Archive used files
             logging.info("Moving used music and video files to output directory for archival...")
-            self.cleanup_directories(music_file, video_file)
+            self.cleanup_directories(music_file, video_file, output_dir=output_dir)
+            return {"music_path": os.path.join(output_dir, os.path.basename(music_file)),
+                    "video_path": os.path.join(output_dir, os.path.basename(video_file))}
 
+        def upload():
             # Step 4: Upload to YouTube
             logging.info("Step 4: Uploading video to YouTube...")
-            self.upload_to_youtube(output_video_path)
+            video_path = graph.artifact("render", "video_path")
+            pipeline = pipelines.pop("render", None)
+            uploaded = pipeline.finish() if pipeline is not None else None
+            if uploaded:
+                logging.info(f"Video was uploaded while rendering, ID: {uploaded['id']}")
+                return {"video_id": uploaded["id"]}
+            video_id = self.upload_to_youtube(video_path)
+            if not video_id:
+                raise RuntimeError(f"Upload of {video_path} failed")
+            return {"video_id": video_id}
+
+        audio_resource = "logic" if self.audio_backend == 'logic_pro' else "cpu"
+        graph.add("loop_audio", audio_resource, prepare_audio, loop_audio_inputs, artifact_files=("looped_audio_path",))
+        graph.add("render", "cpu", render_video, render_inputs, artifact_files=("video_path",))
+        graph.add("archive", None, archive, lambda: {"music": music_file, "video": video_file})
+        graph.add("upload", "upload", upload, lambda: {"video": graph.artifact_hash("render", "video_path")})
+        return graph.plan(from_stage=from_stage, only_stage=only_stage)
+
+    def source_hash(self, path, output_dir):
+        """Content hash of a staging file, from the media library when it has been indexed."""
+        entry = self.media_library.get(path)
+        if entry and entry["content_hash"]:
+            return entry["content_hash"]
+        return file_sha256(self.locate_source(path, output_dir))
+
+    def locate_source(self, path, output_dir):
+        """Where a staging file is now: in place, or in the output directory once it has been archived."""
+        if os.path.exists(path):
+            return path
+        entry = self.media_library.get(path)
+        if entry and entry["archived_path"] and os.path.exists(entry["archived_path"]):
+            return entry["archived_path"]
+        return os.path.join(output_dir, os.path.basename(path))
+
+    def run_batch(self, count):
+        """
+        Render and upload up to `count` videos from the staging library concurrently.
 
-        except Exception as e:
-            logging.error(f"An error occurred in the pipeline: {e}")
+        Every job gets its own output directory. Pairs are reserved in the media library up front
+        so no two jobs pick the same file, and the files of a job that fails before archiving are
+        released for a later batch.
+
+        Parameters:
+        - count (int): Number of videos to make.
+
+        Returns:
+        - dict: The BatchScheduler report, including videos per hour.
+        """
+        pairs = self.plan_batch(count)
+        jobs = []
+        for index, (music_file, video_file) in enumerate(pairs):
+            output_dir = os.path.abspath(self.create_output_directory(suffix=f"job{index + 1:02d}"))
+            jobs.append((os.path.basename(output_dir), self.job_stages(music_file, video_file, output_dir)))
+
+        try:
+            report = BatchScheduler(limits=self.batch_limits).run(jobs)
         finally:
-            elapsed_time = time.time() - start_time
-            logging.info(f"ExampleShell completed in {elapsed_time:.2f} seconds.")
+            self.close_upload_service()
+        for (music_file, video_file), result in zip(pairs, report["jobs"]):
+            if result["status"] == "failed" and "archive" not in result["stages"]:
+                self.media_library.mark_unused(music_file)
+                self.media_library.mark_unused(video_file)
+        return report
+
+    def plan_batch(self, count):
+        """Pick up to `count` unused music/video pairs and mark them used so they are not picked twice."""
+        self.sync_media_library()
+        music = self.media_library.select_many("music", count, folder=self.music_dir)
+        videos = self.media_library.select_many("video", count, min_height=self.min_video_height,
+                                                min_duration=self.min_video_duration, folder=self.video_dir)
+        pairs = [(music_row["path"], video_row["path"]) for music_row, video_row in zip(music, videos)]
+        for music_file, video_file in pairs:
+            self.media_library.mark_used(music_file)
+            self.media_library.mark_used(video_file)
+        logging.info(f"Planned {len(pairs)} of {count} requested jobs "
+                     f"({len(music)} music files, {len(videos)} videos available).")
+        return pairs
+
+    def plan_run(self, count=1):
+        """
+        Dry run: report what the next run (or a batch of `count` jobs) would make, without rendering.
+
+        Inputs are picked from the media library's existing metadata; nothing is synced, decoded or
+        marked used, and files a sync would still have to index are only listed. The library is
+        opened read-only and not created if it does not exist yet, and no cache folder is created.
+        The intro duration comes from the library if the intro is indexed, otherwise from the
+        intro_duration setting; no media file is opened. The timeline is the one the stream-copy renderer would plan, looping the whole clip (loop points
+        are not analyzed) and with the looped audio filling the duration as loop_audio produces it.
+
+        Parameters:
+        - count (int): Number of jobs to plan.
 
-    def create_output_directory(self):
+        Returns:
+        - dict: Settings, unindexed staging files and, per job, the selected inputs, num_loops,
+          black-screen seconds and the estimated output size.
+        """
+        total_duration = self.duration_hours * 60 * 60
+        library = self.components.get("media_library") or MediaLibrary(self.media_library_path, read_only=True)
+        music = library.select_many("music", count, folder=self.music_dir)
+        videos = library.select_many("video", count, min_height=self.min_video_height,
+                                     min_duration=self.min_video_duration, folder=self.video_dir)
+        intro = library.get(self.intro_path)
+        intro_duration = intro["duration"] if intro else self.intro_duration
+        if intro_duration is None:
+            logging.warning(f"The intro {self.intro_path} is not in the media library and intro_duration is not "
+                            f"set; planning without it.")
+            intro_duration = 0.0
+        if intro:
+            intro_bytes = intro["size"]
+        else:
+            intro_bytes = os.path.getsize(self.intro_path) if os.path.exists(self.intro_path) else 0
+
+        jobs = []
+        for music_row, video_row in zip(music, videos):
+            timeline = plan_timeline(intro_duration, video_row["duration"], total_duration, total_duration,
+                                     self.encode_profile.fps, self.encode_profile.black_fps)
+            source_rate = video_row["size"] / video_row["duration"] if video_row["duration"] else 0.0
+            jobs.append({
+                "music_file": music_row["path"],
+                "music_duration": music_row["duration"],
+                "video_file": video_row["path"],
+                "video_resolution": f"{video_row['width']}x{video_row['height']}",
+                "video_duration": video_row["duration"],
+                "num_loops": timeline["num_loops"],
+                "black_screen_seconds": timeline["black_frames"] / timeline["black_fps"],
+                "output_seconds": timeline["duration"],
+                "estimated_output_bytes": estimate_output_bytes(timeline, source_rate, intro_bytes,
+                                                                self.encode_profile),
+            })
+        if len(jobs) < count:
+            logging.warning(f"Only {len(jobs)} of {count} requested jobs have unused inputs in the media library.")
+        unindexed = {"music": library.pending(self.music_dir, "music"),
+                     "video": library.pending(self.video_dir, "video")}
+        if library is not self.components.get("media_library"):
+            library.close()
+        return {
+            "duration_hours": self.duration_hours,
+            "render_mode": self.render_mode,
+            "encode_profile": self.encode_profile.name,
+            "audio_backend": self.audio_backend,
+            "unindexed": unindexed,
+            "jobs": jobs,
+        }
+
+    def loop_audio(self, music_file, looped_audio_path, output_dir=None):
+        """
+        Build the looped audio track with the configured backend.
+
+        Parameters:
+        - music_file (str): Path to the selected music file.
+        - looped_audio_path (str): Path where the looped audio will be saved.
+        - output_dir (str): Folder the job writes to. Defaults to output_dir.
+        """
+        output_dir = output_dir or self.output_dir
+        if self.audio_backend == 'logic_pro':
+            logging.info("LogicPro: Looping audio with crossfade...")
+            # The script imports the first file of its target folder, so give it a folder holding only this
+            # job's music file; otherwise concurrent batch jobs would all bounce whatever sorts first
+            target_folder = os.path.join(output_dir, "logic_input")
+            os.makedirs(target_folder, exist_ok=True)
+            staged_music = os.path.join(target_folder, os.path.basename(music_file))
+            if not os.path.exists(staged_music):
+                try:
+                    os.link(music_file, staged_music)
+                except OSError:
+                    shutil.copy2(music_file, staged_music)
+            try:
+                # Run Logic Pro automation, passing the music folder and dynamic output directory;
+                # it returns the bounced file once it has stopped changing
+                looped_audio_path = self.logic_pro_automation.run_automation(target_folder=target_folder,
+                                                                             save_to_folder=output_dir)
+            finally:
+                shutil.rmtree(target_folder, ignore_errors=True)
+        else:
+            logging.info("AudioLooper: Looping audio with crossfade...")
+            audio_loop = self.find_loop_points(music_file, "music") or {}
+            self.audio_looper.loop_audio(music_file, looped_audio_path, duration_hours=self.duration_hours,
+                                         work_dir=output_dir, loop_in=audio_loop.get("loop_in"),
+                                         loop_out=audio_loop.get("loop_out"))
+        return looped_audio_path
+
+    def find_loop_points(self, path, kind):
+        """
+        Look up the seamless loop range of a music file or clip, or None if disabled or not found.
+
+        Parameters:
+        - path (str): Path to the selected file.
+        - kind (str): "music" or "video".
+        """
+        if not self.seamless_loops:
+            return None
+        try:
+            entry = self.media_library.get(path)
+            content_hash = entry["content_hash"] if entry else None
+            if kind == "music":
+                return self.loop_point_finder.find_audio_loop(path, content_hash=content_hash)
+            return self.loop_point_finder.find_video_loop(path, content_hash=content_hash)
+        except Exception as e:
+            logging.error(f"Loop point analysis failed for {path}, looping the whole file: {e}")
+            return None
+
+    def create_output_directory(self, suffix=None):
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-        output_dir = os.path.join(os.getcwd(), f"output_{timestamp}")
-        os.makedirs(output_dir, exist_ok=True)
+        base_dir = os.path.join(os.getcwd(), f"output_{timestamp}_{suffix}" if suffix else f"output_{timestamp}")
+        # Runs started within the same second must not share a directory
+        output_dir, attempt = base_dir, 1
+        while os.path.exists(output_dir):
+            attempt += 1
+            output_dir = f"{base_dir}_{attempt}"
+        os.makedirs(output_dir)
         logging.info(f"Created output directory: {output_dir}")
         return output_dir
 
+    def sync_media_library(self, force=False):
+        """Index new or changed staging files, once per run; selections after that only query the index."""
+        if self.media_library_synced and not force:
+            return
+        self.media_library.sync(self.music_dir, "music")
+        self.media_library.sync(self.video_dir, "video")
+        self.media_library_synced = True
+
+    def select_staged(self, kind, folder, **constraints):
+        """
+        Select an unused staging file from the index, syncing the library on the first call of the run.
+
+        A file removed from the staging folder after the sync is noticed here (a single stat of the
+        chosen file), and only then is the library synced again.
+        """
+        self.sync_media_library()
+        selected = self.media_library.select(kind, folder=folder, **constraints)
+        if selected and not os.path.exists(selected["path"]):
+            logging.info(f"{selected['path']} was removed since the last sync; syncing the media library again.")
+            self.sync_media_library(force=True)
+            selected = self.media_library.select(kind, folder=folder, **constraints)
+        return selected
+
     def get_music_file(self):
         try:
-            music_files = [f for f in os.listdir(self.music_dir) if f.endswith(('.mp3', '.wav'))]
-            if not music_files:
+            selected = self.select_staged("music", self.music_dir)
+            if not selected:
                 raise FileNotFoundError(f"No supported music files found in {self.music_dir}.")
-            selected_file = os.path.join(self.music_dir, music_files[0])
-            logging.info(f"Selected music file: {selected_file}")
+            selected_file = selected["path"]
+            logging.info(f"Selected music file: {selected_file} ({selected['duration']:.1f}s, "
+                         f"loudness {selected['loudness']} LUFS)")
             return selected_file
         except Exception as e:
             logging.error(f"Failed to retrieve music file: {e}")
@@ -86,172 +527,268 @@ class ExampleShell:
 
     def get_video_file(self):
         try:
-            files = os.listdir(self.video_dir)
-            if not files:
+            selected = self.select_staged("video", self.video_dir, min_height=self.min_video_height,
+                                          min_duration=self.min_video_duration)
+            if not selected:
                 raise FileNotFoundError("No video files found in the video directory.")
-            selected_file = os.path.join(self.video_dir, files[0])
-            logging.info(f"Selected video file: {selected_file}")
+            selected_file = selected["path"]
+            logging.info(f"Selected video file: {selected_file} ({selected['width']}x{selected['height']}, "
+                         f"{selected['duration']:.1f}s, {selected['video_codec']})")
             return selected_file
         except Exception as e:
             logging.error(f"Failed to retrieve video file: {e}")
             raise
 
-    def create_video_with_black_screen(self, video_file, audio_path, output_video_path, duration_hours):
+    def create_video_with_black_screen(self, video_file, audio_path, output_video_path, duration_hours, workers=None,
+                                       video_loop=None, output_dir=None, manifest=None, pipeline=None):
         """
         Create a video with an intro, an initial looped segment covering the audio duration,
         followed by a black screen if necessary.
 
+        Uses the configured render mode; the moviepy path is the fallback if the ffmpeg renderers fail.
+
+        Parameters:
+        - video_file (str): Path to the main video file to loop.
+        - audio_path (str): Path to the audio file.
+        - output_video_path (str): Path where the final video will be saved.
+        - duration_hours (float): Desired total duration of the video in hours.
+        - workers (int): Encoder processes for the "parallel" render mode. Defaults to render_workers.
+        - video_loop (dict): Optional loop_in/loop_out seconds of the clip to repeat.
+        - output_dir (str): Folder the job writes to. Defaults to output_dir.
+        - manifest (RenderManifest): Checkpoint manifest; completed segments are reused on resume.
+        - pipeline (PipelinedUpload): Optional; the ffmpeg renderers upload the final join while
+          writing it. Aborted if the moviepy fallback takes over.
+        """
+        output_dir = output_dir or self.output_dir
+        work_dir = os.path.join(output_dir, "segments")
+        rendered = False
+        try:
+            if self.render_mode == 'stream_copy':
+                self.stream_renderer.render(self.intro_path, video_file, audio_path, output_video_path,
+                                            duration_hours, work_dir=work_dir, video_loop=video_loop,
+                                            manifest=manifest, pipeline=pipeline)
+                rendered = True
+            elif self.render_mode == 'parallel':
+                encoder = ParallelSegmentEncoder(workers=workers or self.render_workers, profile=self.encode_profile)
+                encoder.render(self.intro_path, video_file, audio_path, output_video_path,
+                               duration_hours, work_dir=work_dir, video_loop=video_loop, manifest=manifest,
+                               pipeline=pipeline)
+                rendered = True
+        except Exception as e:
+            logging.error(f"{self.render_mode} render failed, falling back to moviepy: {e}")
+        if not rendered:
+            if pipeline is not None:
+                pipeline.abort()
+            self.create_video_with_moviepy(video_file, audio_path, output_video_path, duration_hours,
+                                           video_loop=video_loop, output_dir=output_dir)
+        self.last_renderer = self.render_mode if rendered else 'moviepy'
+        log_output_size(output_video_path, duration_hours, self.encode_profile)
+        return output_video_path
+
+    def create_video_with_moviepy(self, video_file, audio_path, output_video_path, duration_hours, video_loop=None,
+                                  output_dir=None):
+        """
+        Render the whole timeline through moviepy, re-encoding every frame.
+
         Parameters:
         - video_file (str): Path to the main video file to loop.
         - audio_path (str): Path to the audio file.
         - output_video_path (str): Path where the final video will be saved.
         - duration_hours (float): Desired total duration of the video in hours.
         - buffer_duration (float): Duration of the buffer in seconds between intro and main video.
+        - video_loop (dict): Optional loop_in/loop_out seconds of the clip to repeat.
+        - output_dir (str): Folder the job writes to. Defaults to output_dir.
         """
+        from moviepy.editor import VideoFileClip, concatenate_videoclips, ColorClip
+        from example.utilities.looped_clip import LoopedVideoClip
+
+        output_dir = output_dir or self.output_dir
+        looped_video = None
         try:
             # Load intro video
-            intro_path = "/Users/mac/PycharmProjects/staging_files/intro_video/Welcome.mp4"
-            intro_clip = VideoFileClip(intro_path)
+            intro_clip = VideoFileClip(self.intro_path)
 
-            # Load the main video and check dimensions without resizing
-            video_clip = VideoFileClip(video_file)
+            # Check the main video dimensions without opening a reader or resizing
+            video_info = probe_media(video_file)
+            video_size = (video_info["width"], video_info["height"])
 
             # Calculate the total desired duration in seconds
             total_duration = duration_hours * 60 * 60
 
-            # Load audio and determine its duration
-            audio_clip = AudioFileClip(audio_path)
-            audio_duration = audio_clip.duration
+            # Determine the audio duration; the track itself is muxed later without being decoded
+            audio_duration = probe_media(audio_path)["duration"]
 
             # Calculate loop duration to cover audio duration, minus intro and buffer
             loop_duration = min(total_duration, audio_duration) - intro_clip.duration
             if loop_duration <= 0:
                 logging.warning("Intro and buffer duration exceed or match the specified total duration.")
                 # Use only the intro clip trimmed to total_duration
-                main_video_with_intro = intro_clip.subclip(0, total_duration).set_audio(audio_clip)
+                main_video_with_intro = intro_clip.subclip(0, total_duration)
                 black_screen_duration = 0
             else:
-                # Loop the main video to cover the audio duration
-                num_loops = int(loop_duration / video_clip.duration) + 1
+                # Loop the main video to cover the audio duration from a single cached pass
                 logging.info("Creating looped video segment to match audio duration...")
-                looped_video = concatenate_videoclips([video_clip] * num_loops).subclip(0, loop_duration)
+                looped_video = LoopedVideoClip(video_file, duration=loop_duration, cache_dir=output_dir,
+                                               size=video_size, fps=self.encode_profile.fps,
+                                               loop_in=video_loop["loop_in"] if video_loop else None,
+                                               loop_out=video_loop["loop_out"] if video_loop else None)
 
-                # Concatenate intro, buffer, and looped main video, then set audio
-                main_video_with_intro = concatenate_videoclips([intro_clip, looped_video]).set_audio(
-                    audio_clip)
+                # Concatenate intro, buffer, and looped main video
+                main_video_with_intro = concatenate_videoclips([intro_clip, looped_video])
 
                 # Calculate any remaining time to fill with a black screen
                 black_screen_duration = total_duration - main_video_with_intro.duration
 
             # Create a black screen for any remaining duration
             if black_screen_duration > 0:
-                black_screen = ColorClip(size=video_clip.size, color=(0, 0, 0), duration=black_screen_duration)
+                black_screen = ColorClip(size=video_size, color=(0, 0, 0), duration=black_screen_duration)
                 final_video = concatenate_videoclips([main_video_with_intro, black_screen])
             else:
                 final_video = main_video_with_intro
 
-            # Export the final video with high-quality settings to avoid artifacts
+            # Export the video stream only with high-quality settings to avoid artifacts
             logging.info("Exporting final video with intro, buffer, looped segment, and black screen as needed...")
+            video_only_path = os.path.join(output_dir, "video_only.mp4")
             final_video.write_videofile(
-                output_video_path,
-                codec="libx264",
-                audio_codec="aac",
-                fps=24,
-                preset="medium",  # Adjust preset for balance between quality and speed
-                threads=4  # Use multithreading if possible
+                video_only_path,
+                codec=self.encode_profile.codec,
+                audio=False,
+                fps=self.encode_profile.fps,
+                preset=self.encode_profile.preset,  # Adjust preset for balance between quality and speed
+                threads=4,  # Use multithreading if possible
+                ffmpeg_params=self.encode_profile.tuning_args() + ["-g", str(self.encode_profile.gop)]
             )
+
+            # Mux the looped audio as-is so it is never decoded and re-encoded
+            video_duration = final_video.duration
+            mux_audio(video_only_path, audio_path, output_video_path, audio_codec="copy", duration=video_duration)
+            os.remove(video_only_path)
+            verify_audio_duration(output_video_path, min(audio_duration, video_duration), video_duration,
+                                  self.encode_profile.fps)
             logging.info(f"Final video saved at: {output_video_path}")
+            record(frames_encoded=int(round(video_duration * self.encode_profile.fps)), media_seconds=video_duration)
 
         except Exception as e:
             logging.error(f"Failed to create video with black screen: {e}")
             raise
-
-
-    def cleanup_directories(self, music_file, video_file):
-        """Move used music and video files to the output directory after each run."""
-        try:
-            shutil.move(music_file, os.path.join(self.output_dir, os.path.basename(music_file)))
-            logging.info(f"Moved used music file to {self.output_dir}")
-        except Exception as e:
-            logging.error(f"Failed to move {music_file}. Reason: {e}")
-
-        try:
-            shutil.move(video_file, os.path.join(self.output_dir, os.path.basename(video_file)))
-            logging.info(f"Moved used video file to {self.output_dir}")
-        except Exception as e:
-            logging.error(f"Failed to move {video_file}. Reason: {e}")
+        finally:
+            if looped_video is not None:
+                looped_video.close()
+
+
+    def cleanup_directories(self, music_file, video_file, output_dir=None):
+        """Move used music and video files to the output directory after each run and mark them archived."""
+        output_dir = output_dir or self.output_dir
+        for label, used_file in (("music", music_file), ("video", video_file)):
+            archived_path = os.path.join(output_dir, os.path.basename(used_file))
+            if not os.path.exists(used_file) and os.path.exists(archived_path):
+                continue  # Already archived by an earlier attempt
+            try:
+                shutil.move(used_file, archived_path)
+                self.media_library.mark_archived(used_file, archived_path)
+                logging.info(f"Moved used {label} file to {output_dir}")
+            except Exception as e:
+                logging.error(f"Failed to move {used_file}. Reason: {e}")
+
+    def upload_metadata(self):
+        """Pick the title, description, category and privacy status for an upload."""
+        # Generate an optimized title with engaging elements
+        title_options = [
+            "Relaxing Ambient Music for Deep Sleep & Relaxation 🌌 | 10 Hours of Soothing Sounds",
+            "10 Hours of Binaural Beats for Deep Sleep & Relaxation 🎶",
+            "Ultimate 10-Hour Binaural Beats for Sleep & Meditation 🛌 | Deep Relaxation",
+            "10 Hours of Pure Binaural Beats 🌙 | Achieve Deep Sleep & Relaxation",
+            "Soothing Binaural Beats for Restful Sleep 🌌 | 10 Hours of Calm",
+            "Peaceful Binaural Meditation Music 🧘 | 10 Hours for Sleep & Relaxation",
+            "10 Hours of Calming Binaural Waves 🌊 | Ultimate Sleep & Meditation Sounds",
+            "Deep Sleep with Binaural Beats 🌙 | 10 Hours of Soothing Meditation Music",
+            "Binaural Soundscape for Deep Relaxation 🌌 | 10 Hours for Sleep",
+            "10-Hour Relaxing Binaural Beats | Meditative Music for Deep Sleep 🎶",
+            "Tranquil Binaural Ambience 🌠 | 10 Hours of Deep Sleep Music",
+            "Ultimate Deep Sleep with Binaural Beats 🔊 | 10 Hours of Healing Sounds",
+            "10 Hours of Peaceful Binaural Tones 🌙 | Perfect for Meditation & Sleep",
+            "Calming Binaural Meditation Music 🌌 | 10 Hours for Sleep and Relaxation",
+            "Binaural Beats & Soothing Ambience 🌙 | 10 Hours for Restful Sleep",
+            "10 Hours of Gentle Binaural Beats for Sleep 🎶 | Deep Relaxation",
+            "Ultimate Calm Binaural Ambience 🌌 | 10 Hours of Sleep-Inducing Sounds",
+            "10-Hour Binaural Sound Therapy 🎶 | Fall Asleep Fast with Relaxing Music",
+            "Healing Binaural Tones 🌙 | 10 Hours of Relaxation for Sleep & Meditation",
+            "Deep Sleep Music with Binaural Beats 🌌 | 10 Hours of Calming Sounds"
+        ]
+
+        title = random.choice(title_options)
+
+        # Create an optimized description to engage viewers and encourage subscribing
+        description = (
+            f"{title}\n\n"
+            "Immerse yourself in 10 hours of soothing, relaxing ambient sounds designed to help you "
+            "unwind, meditate, and drift into deep, restful sleep. Ideal for background ambiance, relaxation, "
+            "and creating a calming environment.\n\n"
+            "📌 Like, Share, and Subscribe for more relaxing sounds and sleep music.\n"
+            "🔔 Don't forget to hit the notification bell to stay updated with new uploads!\n\n"
+            "Follow us on our journey to peace and relaxation.\n\n"
+            "#RelaxingMusic #DeepSleep #AmbientSounds #Meditation #Calm #SleepMusic"
+        )
+
+        # Use an optimal YouTube category for relaxation and music content
+        # 10: Music, 22: People & Blogs, 24: Entertainment
+        category_id = "10"  # Music category tends to work well for ambient and sleep videos
+
+        # Set video privacy status to public to reach a larger audience
+        privacy_status = "unlisted"
+
+        # Set an optimized thumbnail (replace 'thumbnail_path' with actual path to the file)
+        # thumbnail_path = "/path/to/optimized_thumbnail.jpg"  # Update this path with the actual thumbnail location
+
+        return {"title": title, "description": description, "category_id": category_id,
+                "privacy_status": privacy_status}
+
+    def get_upload_service(self):
+        """Return the shell's UploadService, authenticating once on first use (thread-safe for batch jobs)."""
+        with self.upload_service_lock:
+            if self.upload_service is None:
+                from example.utilities.youtube_uploader import YouTubeUploader
+
+                workers = self.batch_limits["upload"]
+                youtube_uploader = YouTubeUploader(credentials_file='client_secrets.json', pool_size=workers + 1)
+                rate_limiter = QuotaRateLimiter(daily_units=self.youtube_daily_quota, state_path=self.upload_quota_state)
+                self.upload_service = UploadService(youtube_uploader, workers=workers, rate_limiter=rate_limiter)
+            return self.upload_service
+
+    def close_upload_service(self):
+        with self.upload_service_lock:
+            if self.upload_service is not None:
+                self.upload_service.close()
+                self.upload_service.uploader.close()
+                self.upload_service = None
+
+    def start_pipelined_upload(self):
+        """Open a resumable upload session for a video that is about to be rendered."""
+        return self.get_upload_service().start_session(self.upload_metadata())
 
     def upload_to_youtube(self, video_path):
-        """Upload the video to YouTube with optimized settings for gaining subscribers."""
+        """Upload the video to YouTube with optimized settings for gaining subscribers; returns the video ID or None."""
         try:
-            youtube_uploader = YouTubeUploader(credentials_file='client_secrets.json')
-
-            # Generate an optimized title with engaging elements
-            title_options = [
-                "Relaxing Ambient Music for Deep Sleep & Relaxation 🌌 | 10 Hours of Soothing Sounds",
-                "10 Hours of Binaural Beats for Deep Sleep & Relaxation 🎶",
-                "Ultimate 10-Hour Binaural Beats for Sleep & Meditation 🛌 | Deep Relaxation",
-                "10 Hours of Pure Binaural Beats 🌙 | Achieve Deep Sleep & Relaxation",
-                "Soothing Binaural Beats for Restful Sleep 🌌 | 10 Hours of Calm",
-                "Peaceful Binaural Meditation Music 🧘 | 10 Hours for Sleep & Relaxation",
-                "10 Hours of Calming Binaural Waves 🌊 | Ultimate Sleep & Meditation Sounds",
-                "Deep Sleep with Binaural Beats 🌙 | 10 Hours of Soothing Meditation Music",
-                "Binaural Soundscape for Deep Relaxation 🌌 | 10 Hours for Sleep",
-                "10-Hour Relaxing Binaural Beats | Meditative Music for Deep Sleep 🎶",
-                "Tranquil Binaural Ambience 🌠 | 10 Hours of Deep Sleep Music",
-                "Ultimate Deep Sleep with Binaural Beats 🔊 | 10 Hours of Healing Sounds",
-                "10 Hours of Peaceful Binaural Tones 🌙 | Perfect for Meditation & Sleep",
-                "Calming Binaural Meditation Music 🌌 | 10 Hours for Sleep and Relaxation",
-                "Binaural Beats & Soothing Ambience 🌙 | 10 Hours for Restful Sleep",
-                "10 Hours of Gentle Binaural Beats for Sleep 🎶 | Deep Relaxation",
-                "Ultimate Calm Binaural Ambience 🌌 | 10 Hours of Sleep-Inducing Sounds",
-                "10-Hour Binaural Sound Therapy 🎶 | Fall Asleep Fast with Relaxing Music",
-                "Healing Binaural Tones 🌙 | 10 Hours of Relaxation for Sleep & Meditation",
-                "Deep Sleep Music with Binaural Beats 🌌 | 10 Hours of Calming Sounds"
-            ]
-
-            title = random.choice(title_options)
-
-            # Create an optimized description to engage viewers and encourage subscribing
-            description = (
-                f"{title}\n\n"
-                "Immerse yourself in 10 hours of soothing, relaxing ambient sounds designed to help you "
-                "unwind, meditate, and drift into deep, restful sleep. Ideal for background ambiance, relaxation, "
-                "and creating a calming environment.\n\n"
-                "📌 Like, Share, and Subscribe for more relaxing sounds and sleep music.\n"
-                "🔔 Don't forget to hit the notification bell to stay updated with new uploads!\n\n"
-                "Follow us on our journey to peace and relaxation.\n\n"
-                "#RelaxingMusic #DeepSleep #AmbientSounds #Meditation #Calm #SleepMusic"
-            )
-
-            # Use an optimal YouTube category for relaxation and music content
-            # 10: Music, 22: People & Blogs, 24: Entertainment
-            category_id = "10"  # Music category tends to work well for ambient and sleep videos
-
-            # Set video privacy status to public to reach a larger audience
-            privacy_status = "unlisted"
-
-            # Set an optimized thumbnail (replace 'thumbnail_path' with actual path to the file)
-            # thumbnail_path = "/path/to/optimized_thumbnail.jpg"  # Update this path with the actual thumbnail location
+            metadata = self.upload_metadata()
 
             logging.info("Initiating YouTube upload...")
-            video_id = youtube_uploader.upload_video(
+            video = self.get_upload_service().submit(
                 video_path,
-                title=title,
-                description=description,
-                category_id=category_id,
-                privacy_status=privacy_status,
+                metadata,
                 # thumbnail=thumbnail_path  # Optional: Add thumbnail
-            )
+            ).result()
+            video_id = video.get("id")
 
             if video_id:
                 logging.info(f"Video uploaded successfully with ID: {video_id}")
-                logging.info(f"Video Title: {title}")
+                logging.info(f"Video Title: {metadata['title']}")
             else:
                 logging.error("Video upload failed.")
+            return video_id
 
         except Exception as e:
             logging.error(f"An error occurred during YouTube upload: {e}")
+            return None
 
 
 
@@ -0,0 +1,1264 @@
+import os
+import sys
+import json
+import time
+import shutil
+import datetime
+import tempfile
+import unittest
+import threading
+import subprocess
+import importlib.util
+
+from example.utilities.ffmpeg_tools import get_ffmpeg_binary
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HAS_FFMPEG = shutil.which(get_ffmpeg_binary()) is not None
+
+
+def has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def requires(*modules, ffmpeg=False):
+    """Skip a test when its optional dependencies are not installed."""
+    missing = [name for name in modules if not has_module(name)]
+    if ffmpeg and not HAS_FFMPEG:
+        missing.append("ffmpeg")
+    return unittest.skipIf(missing, f"requires {', '.join(missing)}")
+
+
+def run_python(code, timeout=900):
+    """Run code in a fresh interpreter at the repo root and return the JSON it prints last."""
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise AssertionError(f"Subprocess failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TempDirTestCase(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix="yt_sleep_test_")
+        self.addCleanup(shutil.rmtree, self.work_dir, True)
+
+
+LOOPED_CLIP_RSS = """
+import json, resource
+from example.utilities.looped_clip import LoopedVideoClip
+clip = LoopedVideoClip({source!r}, duration={duration}, cache_dir={work_dir!r}, fps=4)
+clip.write_videofile({output!r}, codec="libx264", audio=False, fps=4, preset="ultrafast", logger=None)
+clip.close()
+print(json.dumps({{"peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+
+@requires("numpy", "moviepy", ffmpeg=True)
+class LoopedVideoClipTest(TempDirTestCase):
+    def test_peak_rss_is_flat_from_one_minute_to_one_hour(self):
+        from example.benchmarks.fixtures import make_video
+
+        source = make_video(os.path.join(self.work_dir, "clip.mp4"), 2, (64, 36))
+        peaks = {}
+        for minutes in (1, 60):
+            output = os.path.join(self.work_dir, f"looped_{minutes}.mp4")
+            peaks[minutes] = run_python(LOOPED_CLIP_RSS.format(source=source, duration=minutes * 60,
+                                                               work_dir=self.work_dir, output=output))["peak_rss"]
+            self.assertTrue(os.path.getsize(output) > 0)
+        # Sixty times the frames must not mean more memory: allow only allocator noise
+        self.assertLess(peaks[60], peaks[1] * 1.2, peaks)
+
+
+class EncodeProfileTest(unittest.TestCase):
+    def test_default_profile_keeps_the_original_export_settings(self):
+        from example.utilities.encode_profiles import get_profile
+
+        profile = get_profile(None)
+        self.assertEqual(profile.name, "default")
+        self.assertEqual(profile.encoder_args(), ["-c:v", "libx264", "-preset", "medium", "-pix_fmt", "yuv420p"])
+        self.assertEqual(profile.tuning_args(), [])
+        self.assertEqual(profile.tail_fps, 24)
+
+    def test_sleep_static_maps_to_still_image_rate_capped_args(self):
+        from example.utilities.encode_profiles import get_profile
+
+        profile = get_profile("sleep-static")
+        self.assertEqual(profile.tuning_args(),
+                         ["-crf", "26", "-tune", "stillimage", "-maxrate", "2M", "-bufsize", "4M"])
+        self.assertEqual(profile.encoder_args()[-len(profile.tuning_args()):], profile.tuning_args())
+        self.assertEqual((profile.fps, profile.tail_fps, profile.gop), (24, 1, 240))
+
+    def test_bufsize_defaults_to_maxrate(self):
+        from example.utilities.encode_profiles import EncodeProfile
+
+        self.assertEqual(EncodeProfile(name="capped", maxrate="1M").tuning_args(), ["-maxrate", "1M", "-bufsize", "1M"])
+
+    def test_unknown_profile_lists_the_available_ones(self):
+        from example.utilities.encode_profiles import get_profile
+
+        with self.assertRaisesRegex(ValueError, "default, sleep-static"):
+            get_profile("slow")
+
+    def test_renderer_segments_use_the_profile_args_and_black_fps(self):
+        from unittest import mock
+        from example.utilities.encode_profiles import get_profile
+        from example.utilities.stream_renderer import StreamCopyRenderer
+
+        profile = get_profile("sleep-static")
+        renderer = StreamCopyRenderer(profile=profile)
+        with mock.patch("example.utilities.stream_renderer.run_ffmpeg") as run_ffmpeg:
+            renderer.encode_file_segment("clip.mp4", "loop.mp4", 48, (640, 360))
+            renderer.encode_black_segment("black.mp4", 600, (640, 360))
+        (loop_args,), _ = run_ffmpeg.call_args_list[0]
+        (black_args,), _ = run_ffmpeg.call_args_list[1]
+        for args in (loop_args, black_args):
+            self.assertIn(" ".join(profile.encoder_args() + ["-g", "240"]), " ".join(args))
+        self.assertIn("fps=24,", loop_args[loop_args.index("-vf") + 1])
+        self.assertIn("color=c=black:s=640x360:r=1", black_args)
+        self.assertIn("fps=1,", black_args[black_args.index("-vf") + 1])
+
+    def test_estimate_output_bytes_counts_intro_loop_black_and_audio(self):
+        from example.utilities.stream_renderer import plan_timeline
+        from example.utilities.encode_profiles import get_profile, estimate_output_bytes, parse_bitrate
+
+        self.assertEqual((parse_bitrate("320k"), parse_bitrate("2M"), parse_bitrate(128000)), (320e3, 2e6, 128e3))
+        # 10 hours: a 3 s intro and the 10 s clip looped under an hour of audio, then 9 hours of black
+        profile = get_profile("sleep-static")
+        plan = plan_timeline(3, 10, 3600, 10 * 3600, profile.fps, profile.black_fps)
+        self.assertEqual((plan["intro_frames"], plan["loop_frames"], plan["black_frames"]), (72, 86328, 32400))
+        expected = 5000 + 86328 / 24 * 100000 + 32400 * 300 + 10 * 3600 * 192000 / 8
+        self.assertEqual(estimate_output_bytes(plan, 100000, 5000, profile), int(expected))
+
+        # The default profile keeps 24 fps black frames and 320k audio, so the same run is larger
+        default = get_profile("default")
+        default_plan = plan_timeline(3, 10, 3600, 10 * 3600, default.fps, default.black_fps)
+        self.assertGreater(estimate_output_bytes(default_plan, 100000, 5000, default), int(expected))
+
+
+def make_render_sources(folder, clip_seconds=2, audio_seconds=10, size=(64, 36)):
+    """A tiny intro, clip and AAC track for render tests."""
+    from example.benchmarks.fixtures import make_intro, make_video, make_looped_audio
+
+    return (make_intro(os.path.join(folder, "intro.mp4"), size, seconds=1),
+            make_video(os.path.join(folder, "clip.mp4"), clip_seconds, size),
+            make_looped_audio(os.path.join(folder, "audio.m4a"), audio_seconds))
+
+
+@requires(ffmpeg=True)
+class ParallelSegmentEncoderTest(TempDirTestCase):
+    def test_black_tail_is_encoded_at_the_profile_black_fps(self):
+        from example.utilities.ffmpeg_tools import probe_media
+        from example.utilities.encode_profiles import get_profile
+        from example.utilities.parallel_encoder import ParallelSegmentEncoder
+
+        intro, clip, audio = make_render_sources(self.work_dir)
+        output = os.path.join(self.work_dir, "out.mp4")
+        # 10 s of intro and loop at 24 fps, then 20 s of black at the sleep-static profile's 1 fps
+        ParallelSegmentEncoder(workers=2, profile=get_profile("sleep-static")).render(
+            intro, clip, audio, output, 30 / 3600, work_dir=os.path.join(self.work_dir, "segments"))
+        self.assertEqual(probe_media(output, count_packets=True)["video_packets"], 10 * 24 + 20)
+
+    def test_replaced_clip_invalidates_the_checkpointed_loop_source(self):
+        from example.benchmarks.fixtures import make_intro
+        from example.utilities.hashing import file_sha256
+        from example.utilities.checkpoint import RenderManifest
+        from example.utilities.parallel_encoder import ParallelSegmentEncoder
+
+        class InterruptedEncoder(ParallelSegmentEncoder):
+            def encode_segments(self, jobs, manifest=None):
+                raise RuntimeError("interrupted")
+
+        intro, clip, audio = make_render_sources(self.work_dir)
+        output_dir = os.path.join(self.work_dir, "job")
+        render_args = (intro, clip, audio, os.path.join(output_dir, "out.mp4"), 10 / 3600)
+        render_kwargs = {"work_dir": os.path.join(output_dir, "segments"),
+                         "video_loop": {"loop_in": 0.5, "loop_out": 1.5}}
+        with self.assertRaises(RuntimeError):
+            InterruptedEncoder(workers=1).render(*render_args, manifest=RenderManifest(output_dir), **render_kwargs)
+
+        # A different clip saved under the same name before resuming
+        make_intro(clip, (64, 36), seconds=2)
+        manifest = RenderManifest(output_dir)
+        ParallelSegmentEncoder(workers=1).render(*render_args, manifest=manifest, **render_kwargs)
+        loop_source = manifest.data["segments"][os.path.join("segments", "loop_source.mkv")]
+        self.assertEqual(loop_source["params"]["source"], file_sha256(clip))
+
+
+@requires(ffmpeg=True)
+class StreamCopyRendererTest(TempDirTestCase):
+    def render(self):
+        from example.utilities.ffmpeg_tools import probe_media
+        from example.utilities.encode_profiles import EncodeProfile
+        from example.utilities.stream_renderer import StreamCopyRenderer, plan_timeline
+
+        intro, clip, audio = make_render_sources(self.work_dir)
+        profile = EncodeProfile(name="test", black_fps=1, gop=24)
+        output = os.path.join(self.work_dir, "out.mp4")
+        # 1 s intro, 9 s of the 2 s clip looped under the 10 s track, then 20 s of black in two blocks
+        StreamCopyRenderer(profile=profile, black_unit_seconds=10).render(intro, clip, audio, output, 30 / 3600)
+        plan = plan_timeline(probe_media(intro)["duration"], probe_media(clip)["duration"],
+                             probe_media(audio)["duration"], 30, profile.fps, profile.black_fps)
+        return output, plan
+
+    def test_intro_loop_and_black_join_in_sync(self):
+        from example.utilities.ffmpeg_tools import probe_media
+        from example.utilities.stream_renderer import verify_av_sync
+
+        output, plan = self.render()
+        self.assertEqual((plan["intro_frames"], plan["loop_frames"], plan["black_frames"]), (24, 9 * 24, 20))
+        info = probe_media(output, count_packets=True)
+        self.assertEqual(info["video_packets"], plan["total_frames"])
+        self.assertAlmostEqual(info["video_duration"] or info["duration"], 30, delta=1 / 24)
+        self.assertAlmostEqual(info["audio_duration"], 10, delta=1 / 24)
+        verify_av_sync(output, plan)
+
+    def test_shifted_audio_fails_the_sync_check(self):
+        from example.utilities.ffmpeg_tools import run_ffmpeg
+        from example.utilities.stream_renderer import verify_av_sync
+
+        output, plan = self.render()
+        shifted = os.path.join(self.work_dir, "shifted.mp4")
+        # Same streams, with the audio delayed by half a second
+        run_ffmpeg(["-i", output, "-itsoffset", "0.5", "-i", output, "-map", "0:v", "-map", "1:a",
+                    "-c", "copy", shifted], description="shifted remux")
+        with self.assertRaisesRegex(RuntimeError, "Audio starts|Muxed audio runs"):
+            verify_av_sync(shifted, plan)
+
+
+CRASHING_RENDER = """
+import os
+from example.utilities.checkpoint import RenderManifest
+from example.utilities.encode_profiles import EncodeProfile
+from example.utilities.stream_renderer import StreamCopyRenderer
+from example.utilities.parallel_encoder import ParallelSegmentEncoder
+
+
+class CrashingManifest(RenderManifest):
+    def mark_segment_done(self, segment_path, params):
+        super().mark_segment_done(segment_path, params)
+        if len(self.data["segments"]) >= {crash_after}:
+            os._exit(9)  # Die like a killed process: no cleanup, no exception handlers
+
+
+profile = EncodeProfile(name="test", gop=24)
+renderer = {renderer}
+renderer.render({intro!r}, {clip!r}, {audio!r}, os.path.join({output_dir!r}, "out.mp4"), 30 / 3600,
+                work_dir=os.path.join({output_dir!r}, "segments"), manifest=CrashingManifest({output_dir!r}))
+"""
+
+
+@requires(ffmpeg=True)
+class ResumeRenderTest(TempDirTestCase):
+    renderers = {"stream_copy": "StreamCopyRenderer(profile=profile, black_unit_seconds=10)",
+                 "parallel": "ParallelSegmentEncoder(workers=2, profile=profile)"}
+
+    def render(self, renderer, output_dir, crash_after=None):
+        from example.utilities.checkpoint import RenderManifest
+
+        os.makedirs(output_dir, exist_ok=True)
+        code = CRASHING_RENDER.format(crash_after=crash_after or 10 ** 6, renderer=self.renderers[renderer],
+                                      intro=self.sources[0], clip=self.sources[1], audio=self.sources[2],
+                                      output_dir=output_dir)
+        result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True, timeout=600)
+        self.assertEqual(result.returncode, 9 if crash_after else 0, result.stderr[-2000:])
+        return RenderManifest(output_dir)
+
+    def assert_resume_is_stream_identical(self, renderer):
+        from example.utilities.ffmpeg_tools import stream_hashes
+
+        self.sources = make_render_sources(self.work_dir)
+        full_dir, resumed_dir = os.path.join(self.work_dir, "full"), os.path.join(self.work_dir, "resumed")
+        self.render(renderer, full_dir)
+        crashed = self.render(renderer, resumed_dir, crash_after=2)
+        self.assertEqual(len(crashed.data["segments"]), 2)
+        self.assertFalse(os.path.exists(os.path.join(resumed_dir, "out.mp4")))
+        resumed = self.render(renderer, resumed_dir)
+        self.assertGreater(len(resumed.data["segments"]), 2)
+        self.assertEqual(stream_hashes(os.path.join(resumed_dir, "out.mp4")),
+                         stream_hashes(os.path.join(full_dir, "out.mp4")))
+
+    def test_stream_copy_resume_is_stream_identical(self):
+        self.assert_resume_is_stream_identical("stream_copy")
+
+    def test_parallel_resume_is_stream_identical(self):
+        self.assert_resume_is_stream_identical("parallel")
+
+
+class RecordingSink:
+    """Stands in for ffmpeg's stdin: keeps what was written and signals each write."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.wrote = threading.Event()
+
+    def write(self, data):
+        self.data += data
+        self.wrote.set()
+        return len(data)
+
+
+def copy_reader(args, description="copy"):
+    """Replaces the per-segment remux with a plain byte copy of the segment named after -i."""
+    return subprocess.Popen([sys.executable, "-c", "import sys, shutil; "
+                             "shutil.copyfileobj(open(sys.argv[1], 'rb'), sys.stdout.buffer)", args[1]],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+class SegmentFeederTest(TempDirTestCase):
+    def make_entries(self, count=3):
+        entries = []
+        for index in range(count):
+            path = os.path.join(self.work_dir, f"segment_{index}.mp4")
+            with open(path, "wb") as segment:
+                segment.write(bytes([index]) * 1000)
+            entries.append((path, 24, 24))
+        return entries
+
+    def test_segments_are_fed_in_order_as_soon_as_each_is_done(self):
+        from example.utilities.parallel_encoder import SegmentFeeder
+
+        entries = self.make_entries()
+        feeder = SegmentFeeder(entries, reader=copy_reader)
+        sink = RecordingSink()
+        thread = threading.Thread(target=feeder.feed, args=(sink,), daemon=True)
+        thread.start()
+        # The last segment finishing first must not be fed ahead of the others
+        feeder.mark_done(entries[2][0])
+        feeder.mark_done(entries[0][0])
+        self.assertTrue(sink.wrote.wait(30))
+        thread.join(0.5)
+        self.assertEqual(bytes(sink.data), bytes([0]) * 1000)
+        feeder.mark_done(entries[1][0])
+        thread.join(30)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(bytes(sink.data), bytes([0]) * 1000 + bytes([1]) * 1000 + bytes([2]) * 1000)
+
+    def test_failed_encode_stops_the_feed(self):
+        from example.utilities.parallel_encoder import SegmentFeeder
+
+        entries = self.make_entries()
+        feeder = SegmentFeeder(entries, reader=copy_reader)
+        feeder.mark_done(entries[0][0])
+        feeder.fail(RuntimeError("encoder died"))
+        with self.assertRaises(RuntimeError):
+            feeder.feed(RecordingSink())
+
+
+@requires("requests", "google_auth_oauthlib", ffmpeg=True)
+class PipelinedUploadTest(TempDirTestCase):
+    def test_parallel_render_uploads_segments_while_encoding(self):
+        import requests
+        from example.utilities.fake_upload_server import FakeUploadServer
+        from example.utilities.youtube_uploader import YouTubeUploader
+        from example.utilities.pipelined_upload import PipelinedUpload
+        from example.utilities.parallel_encoder import ParallelSegmentEncoder
+
+        sessions_while_encoding = []
+
+        class WatchedEncoder(ParallelSegmentEncoder):
+            def encode_segments(self, jobs, manifest=None, on_done=None):
+                super().encode_segments(jobs, manifest, on_done=on_done)
+                sessions_while_encoding.append(len(server.uploads))
+
+        intro, clip, audio = make_render_sources(self.work_dir, audio_seconds=30)
+        output = os.path.join(self.work_dir, "out.mp4")
+        with FakeUploadServer(output_dir=os.path.join(self.work_dir, "received")) as server:
+            with YouTubeUploader(session=requests.Session(), upload_url=server.upload_url) as uploader:
+                pipeline = PipelinedUpload(lambda: uploader.start_resumable_upload("test", "", "10", "private"))
+                WatchedEncoder(workers=2).render(intro, clip, audio, output, 30 / 3600,
+                                                 work_dir=os.path.join(self.work_dir, "segments"), pipeline=pipeline)
+                # The join (and its upload session) started before the last segment was encoded
+                self.assertEqual(sessions_while_encoding, [1])
+                upload = next(iter(server.uploads.values()))
+                # The final chunk waits for finish(), which the upload stage calls
+                self.assertIsNone(upload["video_id"])
+                video = pipeline.finish()
+        self.assertIsNotNone(video, pipeline.error)
+        self.assertEqual(video["id"], upload["video_id"])
+        with open(upload["path"], "rb") as received, open(output, "rb") as rendered:
+            self.assertEqual(received.read(), rendered.read())
+
+
+class KilledReader:
+    """Reads a file until limit bytes have been read, then fails like a process dying mid-upload."""
+
+    def __init__(self, path, limit):
+        self.file = open(path, "rb")
+        self.limit = limit
+
+    def read(self, size):
+        if self.file.tell() >= self.limit:
+            self.file.close()
+            raise RuntimeError("killed")
+        return self.file.read(min(size, self.limit - self.file.tell()))
+
+
+@requires("requests")
+class ResumableUploadTest(TempDirTestCase):
+    metadata = {"snippet": {"title": "test", "description": "", "categoryId": "10"},
+                "status": {"privacyStatus": "private"}}
+
+    def start_server(self, **failures):
+        from example.utilities.fake_upload_server import FakeUploadServer
+
+        server = FakeUploadServer(output_dir=os.path.join(self.work_dir, "received"), seed=7, **failures)
+        server.start()
+        self.addCleanup(server.stop)
+        return server
+
+    def make_upload(self, server, **kwargs):
+        import requests
+        from example.utilities.resumable_upload import ResumableUpload, CHUNK_ALIGNMENT
+
+        session = requests.Session()
+        self.addCleanup(session.close)
+        options = {"chunk_size": CHUNK_ALIGNMENT, "backoff_base": 0.01, "backoff_cap": 0.05, "max_retries": 30,
+                   "state_path": os.path.join(self.work_dir, "video.mp4.upload.json")}
+        return ResumableUpload(session, upload_url=server.upload_url, **dict(options, **kwargs))
+
+    def make_video(self, size=3 * 1024 * 1024 + 123):
+        path = os.path.join(self.work_dir, "video.mp4")
+        with open(path, "wb") as video:
+            video.write(os.urandom(size))
+        return path
+
+    def assert_received(self, server, video, path):
+        upload = next(upload for upload in server.uploads.values() if upload["video_id"] == video["id"])
+        with open(upload["path"], "rb") as received, open(path, "rb") as source:
+            self.assertEqual(received.read(), source.read())
+
+    def assert_survives(self, failure):
+        from example.utilities.resumable_upload import upload_file
+
+        server = self.start_server(**{f"{failure}_rate": 0.3})
+        path = self.make_video()
+        video = upload_file(self.make_upload(server), path, self.metadata)
+        self.assertGreater(server.injected[failure], 0)
+        self.assert_received(server, video, path)
+
+    def test_retries_backend_errors(self):
+        self.assert_survives("error")
+
+    def test_resyncs_after_partially_kept_chunks(self):
+        self.assert_survives("partial")
+
+    def test_resyncs_after_dropped_connections(self):
+        self.assert_survives("disconnect")
+
+    def test_chunks_grow_on_a_fast_link_and_shrink_on_a_slow_one(self):
+        from example.utilities.resumable_upload import upload_file, CHUNK_ALIGNMENT
+
+        path = self.make_video()
+        fast = self.make_upload(self.start_server(), max_chunk_size=4 * CHUNK_ALIGNMENT)
+        upload_file(fast, path, self.metadata)
+        # Growth is capped at 2x per chunk and at max_chunk_size
+        self.assertEqual([metric["next_chunk_size"] for metric in fast.metrics[:2]],
+                         [2 * CHUNK_ALIGNMENT, 4 * CHUNK_ALIGNMENT])
+
+        # 2 MiB/s and 0.25 s per chunk make 512 KiB the target
+        slow = self.make_upload(self.start_server(bytes_per_second=2 * 1024 * 1024), chunk_size=8 * CHUNK_ALIGNMENT,
+                                target_chunk_seconds=0.25)
+        upload_file(slow, path, self.metadata)
+        self.assertLessEqual(slow.metrics[-1]["next_chunk_size"], 4 * CHUNK_ALIGNMENT)
+
+    def test_restarted_upload_continues_at_the_acknowledged_offset(self):
+        from example.utilities.resumable_upload import upload_file, CHUNK_ALIGNMENT
+
+        server = self.start_server()
+        path = self.make_video()
+        upload = self.make_upload(server)
+        upload.start(self.metadata, media_path=path)
+        with self.assertRaises(RuntimeError):
+            upload.upload_stream(KilledReader(path, 5 * CHUNK_ALIGNMENT))
+        with open(upload.state_path) as state_file:
+            saved_offset = json.load(state_file)["offset"]
+        self.assertGreater(saved_offset, 0)
+
+        # A new process picks up the saved session where the server left off
+        resumed = self.make_upload(server)
+        self.assertTrue(resumed.restore(path))
+        self.assertEqual(resumed.offset, saved_offset)
+        video = upload_file(resumed, path, self.metadata)
+        self.assertEqual(len(server.uploads), 1)
+        self.assertEqual(resumed.metrics[0]["offset"], saved_offset)
+        self.assertFalse(os.path.exists(upload.state_path))
+        self.assert_received(server, video, path)
+
+
+def utc_in(seconds):
+    """Naive UTC time seconds from now, as google-auth stores token expiry."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(seconds=seconds)
+
+
+class ExpiringCredentials:
+    """Credentials whose token is about to expire; refresh() pushes the expiry out by an hour."""
+
+    def __init__(self, expires_in):
+        self.expiry = utc_in(expires_in)
+        self.refreshes = 0
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.expiry = utc_in(60 * 60)
+
+
+UPLOAD_METADATA = {"title": "test", "description": "", "category_id": "10", "privacy_status": "private"}
+
+
+@requires("requests", "google_auth_oauthlib")
+class UploadServiceTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        import requests
+        from example.utilities.fake_upload_server import FakeUploadServer
+        from example.utilities.youtube_uploader import YouTubeUploader
+
+        self.server = FakeUploadServer(output_dir=os.path.join(self.work_dir, "received"), quota_units=10 ** 6)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.uploader = YouTubeUploader(session=requests.Session(), upload_url=self.server.upload_url,
+                                        token_file=os.path.join(self.work_dir, "token.pickle"))
+        self.addCleanup(self.uploader.close)
+
+    def make_video(self, name="video.mp4"):
+        path = os.path.join(self.work_dir, name)
+        with open(path, "wb") as video:
+            video.write(os.urandom(1024 * 1024 + 123))
+        return path
+
+    def received(self, video):
+        with open(self.server.uploads[next(upload_id for upload_id, upload in self.server.uploads.items()
+                                           if upload["video_id"] == video["id"])]["path"], "rb") as media:
+            return media.read()
+
+    def test_token_is_refreshed_before_it_expires(self):
+        self.uploader.credentials = ExpiringCredentials(expires_in=60)
+        path = self.make_video()
+        video = self.uploader.upload(path, **UPLOAD_METADATA)
+        # Refreshed once on the first request, then valid for the rest of the upload
+        self.assertEqual(self.uploader.credentials.refreshes, 1)
+        self.assertTrue(os.path.exists(self.uploader.token_file))
+        with open(path, "rb") as media:
+            self.assertEqual(self.received(video), media.read())
+
+    def test_submit_blocks_while_the_queue_is_full(self):
+        from example.utilities.upload_service import UploadService, QuotaRateLimiter
+
+        gate = threading.Event()
+        upload = self.uploader.upload
+
+        def gated_upload(*args, **kwargs):
+            gate.wait(30)
+            return upload(*args, **kwargs)
+
+        self.uploader.upload = gated_upload
+        paths = [self.make_video(f"video_{index}.mp4") for index in range(3)]
+        with UploadService(self.uploader, workers=1, queue_size=1, rate_limiter=QuotaRateLimiter(10 ** 6)) as service:
+            futures = [service.submit(paths[0], UPLOAD_METADATA)]
+            # The worker has taken the first upload once the queue has room again
+            for _ in range(100):
+                if service.queue.empty():
+                    break
+                time.sleep(0.05)
+            futures.append(service.submit(paths[1], UPLOAD_METADATA))
+            blocked = threading.Thread(target=lambda: futures.append(service.submit(paths[2], UPLOAD_METADATA)),
+                                       daemon=True)
+            blocked.start()
+            blocked.join(0.5)
+            self.assertTrue(blocked.is_alive())
+            gate.set()
+            blocked.join(30)
+            self.assertFalse(blocked.is_alive())
+            videos = [future.result(timeout=60) for future in futures]
+        self.assertEqual(len({video["id"] for video in videos}), 3)
+
+    def test_upload_waits_for_quota_and_fails_past_the_timeout(self):
+        from example.utilities.resumable_upload import QuotaExceededError
+        from example.utilities.upload_service import UploadService, QuotaRateLimiter
+
+        limiter = QuotaRateLimiter(daily_units=3200, min_interval=0.5)
+        with UploadService(self.uploader, workers=1, rate_limiter=limiter, quota_timeout=1) as service:
+            start_time = time.time()
+            service.upload(self.make_video("first.mp4"), UPLOAD_METADATA)
+            service.upload(self.make_video("second.mp4"), UPLOAD_METADATA)
+            # The second start waited out min_interval
+            self.assertGreaterEqual(time.time() - start_time, 0.5)
+            with self.assertRaises(QuotaExceededError):
+                service.upload(self.make_video("third.mp4"), UPLOAD_METADATA)
+        # The spent budget was enforced locally, without asking the API for a third session
+        self.assertEqual(self.server.quota_used, 3200)
+        self.assertEqual(limiter.remaining, 0)
+
+    def test_resumed_session_is_not_charged_again(self):
+        from example.utilities.resumable_upload import ResumableUpload
+        from example.utilities.upload_service import UploadService, QuotaRateLimiter
+
+        path = self.make_video()
+        # A session opened (and charged) by a process that died before sending anything
+        ResumableUpload(self.uploader, upload_url=self.server.upload_url, state_path=f"{path}.upload.json").start(
+            self.uploader.build_request_body(*UPLOAD_METADATA.values()), media_path=path)
+        limiter = QuotaRateLimiter(daily_units=3200)
+        with UploadService(self.uploader, workers=1, rate_limiter=limiter) as service:
+            video = service.upload(path, UPLOAD_METADATA)
+        self.assertEqual(limiter.remaining, 3200)
+        self.assertEqual(len(self.server.uploads), 1)
+        with open(path, "rb") as media:
+            self.assertEqual(self.received(video), media.read())
+
+
+PROMETHEUS_SAMPLE = r'^([a-zA-Z_:][a-zA-Z0-9_:]*)\{((?:[a-zA-Z_]\w*="[^"]*",?)+)\} (-?[0-9.]+(?:e[+-]?[0-9]+)?)$'
+
+
+class RunReportTest(TempDirTestCase):
+    def run_stages(self, report):
+        from example.utilities.instrumentation import stage, record, instrumented
+
+        @instrumented("probe")
+        def probe():
+            time.sleep(0.02)
+
+        with report.stage("render"):
+            with stage("encode"):
+                record(frames_encoded=48, media_seconds=2.0)
+                time.sleep(0.05)
+            probe()
+        with self.assertRaises(RuntimeError):
+            with report.stage("upload"):
+                raise RuntimeError("connection reset")
+
+    def read_report(self):
+        with open(os.path.join(self.work_dir, "performance.json")) as report_file:
+            return json.load(report_file)
+
+    def test_performance_json_records_every_stage(self):
+        from example.utilities.instrumentation import RunReport
+
+        self.run_stages(RunReport(self.work_dir, job="job-1"))
+        report = self.read_report()
+        stages = {entry["stage"]: entry for entry in report["stages"]}
+        self.assertEqual([entry["stage"] for entry in report["stages"]],
+                         ["render.encode", "render.probe", "render", "upload"])
+        self.assertEqual([entry["status"] for entry in report["stages"]], ["ok", "ok", "ok", "failed"])
+        self.assertGreaterEqual(stages["render.encode"]["wall_seconds"], 0.05)
+        self.assertGreaterEqual(stages["render.probe"]["wall_seconds"], 0.02)
+        self.assertGreaterEqual(stages["render"]["wall_seconds"], 0.07)
+        # Counters recorded in a nested stage count for the outer stage too
+        for name in ("render.encode", "render"):
+            self.assertEqual(stages[name]["counters"], {"frames_encoded": 48, "media_seconds": 2.0})
+            self.assertGreater(stages[name]["encode_fps"], 0)
+        self.assertEqual(report["job"], "job-1")
+        self.assertEqual(report["failed"], ["upload"])
+        # Nested stages are already inside their outer stage's time
+        self.assertAlmostEqual(report["wall_seconds"], stages["render"]["wall_seconds"]
+                               + stages["upload"]["wall_seconds"])
+        self.assertFalse(os.path.exists(os.path.join(self.work_dir, "performance.json.tmp")))
+
+    def test_resumed_run_appends_to_the_report(self):
+        from example.utilities.instrumentation import RunReport
+
+        self.run_stages(RunReport(self.work_dir))
+        resumed = RunReport(self.work_dir)
+        resumed.skipped("render")
+        with resumed.stage("upload"):
+            pass
+        self.assertEqual([(entry["stage"], entry["status"]) for entry in self.read_report()["stages"][-3:]],
+                         [("upload", "failed"), ("render", "skipped"), ("upload", "ok")])
+
+    def test_prometheus_textfile_is_well_formed(self):
+        import re
+        from example.utilities.instrumentation import RunReport
+
+        textfile = os.path.join(self.work_dir, "metrics.prom")
+        self.run_stages(RunReport(os.path.join(self.work_dir, "first"), textfile=textfile))
+        self.run_stages(RunReport(os.path.join(self.work_dir, "second"), textfile=textfile))
+        with open(textfile) as metrics:
+            text = metrics.read()
+        self.assertTrue(text.endswith("\n"))
+
+        declared, samples = {}, []
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                self.assertEqual(len(line.split(" ", 3)), 4, line)
+            elif line.startswith("# TYPE "):
+                _, _, name, kind = line.split(" ")
+                self.assertNotIn(name, declared, f"{name} declared twice")
+                self.assertEqual(kind, "gauge")
+                declared[name] = line
+            else:
+                match = re.match(PROMETHEUS_SAMPLE, line)
+                self.assertIsNotNone(match, line)
+                self.assertIn(match.group(1), declared, f"{line} has no TYPE line before it")
+                float(match.group(3))
+                samples.append((match.group(1), dict(re.findall(r'(\w+)="([^"]*)"', match.group(2)))))
+
+        # Both runs of this process share the file, each labelled with its own job
+        self.assertIn(("youtube_sleep_stage_wall_seconds", {"job": "first", "stage": "render"}), samples)
+        self.assertIn(("youtube_sleep_stage_wall_seconds", {"job": "second", "stage": "render.encode"}), samples)
+        self.assertIn(("youtube_sleep_stage_success", {"job": "second", "stage": "upload"}), samples)
+        self.assertIn("youtube_sleep_stage_success{job=\"second\",stage=\"upload\"} 0", text)
+
+    def test_textfile_is_replaced_atomically(self):
+        from unittest import mock
+        from example.utilities.instrumentation import RunReport
+
+        textfile = os.path.join(self.work_dir, "metrics.prom")
+        with mock.patch("example.utilities.instrumentation.os.replace", wraps=os.replace) as replace:
+            self.run_stages(RunReport(self.work_dir, textfile=textfile))
+        # Every write goes to a temporary file that is then renamed over the textfile, so the collector
+        # never sees it half-written
+        textfile_writes = [call.args for call in replace.call_args_list if call.args[1] == textfile]
+        self.assertEqual(textfile_writes, [(f"{textfile}.tmp", textfile)] * 4)
+        self.assertFalse(os.path.exists(f"{textfile}.tmp"))
+
+
+class StageGraphTest(TempDirTestCase):
+    """A three-stage pipeline of tiny files: write -> double -> publish."""
+
+    def setUp(self):
+        super().setUp()
+        self.settings = {"text": "a", "times": 2}
+        self.runs = []
+
+    def build(self):
+        from example.utilities.checkpoint import RenderManifest
+        from example.utilities.stage_graph import StageGraph
+
+        # A fresh manifest object each time, like a new process resuming the run
+        graph = StageGraph(RenderManifest(self.work_dir))
+        written = os.path.join(self.work_dir, "written.txt")
+        doubled = os.path.join(self.work_dir, "doubled.txt")
+
+        def write():
+            self.runs.append("write")
+            with open(written, "w") as output:
+                output.write(self.settings["text"])
+            return {"path": written}
+
+        def double():
+            self.runs.append("double")
+            with open(graph.artifact("write", "path")) as source, open(doubled, "w") as output:
+                output.write(source.read() * self.settings["times"])
+            return {"path": doubled}
+
+        def publish():
+            self.runs.append("publish")
+            return {"published": graph.artifact_hash("double", "path")}
+
+        graph.add("write", "cpu", write, lambda: {"text": self.settings["text"]}, artifact_files=("path",))
+        graph.add("double", "cpu", double,
+                  lambda: {"source": graph.artifact_hash("write", "path"), "times": self.settings["times"]},
+                  artifact_files=("path",))
+        graph.add("publish", "upload", publish, lambda: {"video": graph.artifact_hash("double", "path")})
+        return graph
+
+    def run_plan(self, **selection):
+        self.runs = []
+        entries = self.build().plan(**selection)
+        for _, _, action in entries:
+            action()
+        return entries
+
+    def test_up_to_date_stages_are_skipped(self):
+        self.run_plan()
+        self.assertEqual(self.runs, ["write", "double", "publish"])
+        self.run_plan()
+        self.assertEqual(self.runs, [])
+
+    def test_changed_input_reruns_the_stage_and_everything_downstream(self):
+        self.run_plan()
+        self.settings["text"] = "b"
+        self.run_plan()
+        self.assertEqual(self.runs, ["write", "double", "publish"])
+
+    def test_changed_setting_of_a_later_stage_keeps_the_earlier_ones(self):
+        self.run_plan()
+        self.settings["times"] = 3
+        self.run_plan()
+        self.assertEqual(self.runs, ["double", "publish"])
+
+    def test_unchanged_artifact_stops_the_invalidation(self):
+        self.run_plan()
+        # Rewriting the same content reruns write, but double's input hash is unchanged
+        os.remove(os.path.join(self.work_dir, "written.txt"))
+        self.run_plan()
+        self.assertEqual(self.runs, ["write"])
+
+    def test_edited_artifact_reruns_its_stage(self):
+        self.run_plan()
+        with open(os.path.join(self.work_dir, "doubled.txt"), "w") as output:
+            output.write("tampered")
+        self.run_plan()
+        self.assertEqual(self.runs, ["double"])
+
+    def test_from_stage_forces_that_stage_and_later_ones(self):
+        self.run_plan()
+        entries = self.run_plan(from_stage="double")
+        self.assertEqual(self.runs, ["double", "publish"])
+        # Stages left out do not take a scheduler slot
+        self.assertEqual([resource for _, resource, _ in entries], [None, "cpu", "upload"])
+
+    def test_only_stage_forces_just_that_stage(self):
+        self.run_plan()
+        self.run_plan(only_stage="double")
+        self.assertEqual(self.runs, ["double"])
+
+    def test_selected_stage_needs_the_earlier_stages_recorded(self):
+        with self.assertRaisesRegex(RuntimeError, "write has not completed"):
+            self.run_plan(from_stage="double")
+        with self.assertRaises(ValueError):
+            self.build().plan(only_stage="encode")
+
+
+class SegmentCacheTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.encodes = []
+        self.cache_dir = os.path.join(self.work_dir, "cache")
+
+    def encode(self, content):
+        def write(path):
+            self.encodes.append(path)
+            with open(path, "wb") as segment:
+                segment.write(content)
+            return path
+        return write
+
+    def test_hit_is_linked_without_encoding(self):
+        from example.utilities.segment_cache import SegmentCache
+
+        cache = SegmentCache(cache_dir=self.cache_dir, max_bytes=None)
+        params = {"kind": "black", "frames": 24}
+        cache.fetch_into(params, self.encode(b"black"), os.path.join(self.work_dir, "first.mp4"))
+        destination = cache.fetch_into(params, self.encode(b"black"), os.path.join(self.work_dir, "second.mp4"))
+        self.assertEqual(len(self.encodes), 1)
+        with open(destination, "rb") as segment:
+            self.assertEqual(segment.read(), b"black")
+
+    def test_entry_evicted_after_lookup_is_encoded_again(self):
+        from example.utilities.segment_cache import SegmentCache
+
+        class RacingCache(SegmentCache):
+            def get(self, key):
+                path = super().get(key)
+                self.evict(0)  # Another job trims the cache right after this lookup
+                return path
+
+        params = {"kind": "intro", "frames": 72}
+        SegmentCache(cache_dir=self.cache_dir, max_bytes=None).get_or_create(params, self.encode(b"intro"))
+        destination = os.path.join(self.work_dir, "intro.mp4")
+        RacingCache(cache_dir=self.cache_dir, max_bytes=None).fetch_into(params, self.encode(b"intro"), destination)
+        self.assertEqual(self.encodes[-1], destination)
+        with open(destination, "rb") as segment:
+            self.assertEqual(segment.read(), b"intro")
+
+
+class LogicProAutomationTest(TempDirTestCase):
+    def run_fake(self, env, **options):
+        """Run a bounce through fake_osascript.py; returns the bounced path and the osascript process."""
+        from unittest import mock
+        from example.utilities.logic_pro import LogicProAutomation
+
+        save_to_folder = os.path.join(self.work_dir, "bounces")
+        os.makedirs(save_to_folder, exist_ok=True)
+        utilities = os.path.join(REPO_ROOT, "example", "utilities")
+        automation = LogicProAutomation(os.path.join(utilities, "logic_pro_loop_and_bounce.scpt"),
+                                        osascript_binary=os.path.join(utilities, "fake_osascript.py"),
+                                        **dict({"timeout": 30, "stable_seconds": 0.3}, **options))
+        processes = []
+        popen = subprocess.Popen
+
+        def record_popen(*args, **kwargs):
+            processes.append(popen(*args, **kwargs))
+            return processes[-1]
+
+        env = dict({"FAKE_OSASCRIPT_CHUNKS": "2", "FAKE_OSASCRIPT_DELAY": "0.05"}, **env)
+        with mock.patch.dict(os.environ, env), mock.patch("subprocess.Popen", record_popen):
+            try:
+                return automation.run_automation(self.work_dir, save_to_folder), processes[0]
+            finally:
+                self.addCleanup(lambda: processes and processes[0].poll() is None and processes[0].kill())
+                self.processes = processes
+
+    def run_bounce(self, cleanup_seconds, exit_grace):
+        marker = os.path.join(self.work_dir, "cleanup_done")
+        bounced, _ = self.run_fake({"FAKE_OSASCRIPT_CLEANUP_SECONDS": str(cleanup_seconds),
+                                    "FAKE_OSASCRIPT_CLEANUP_MARKER": marker}, exit_grace=exit_grace)
+        self.assertEqual(os.path.basename(bounced), "looped_audio.mp3")
+        return marker
+
+    def test_script_cleanup_finishes_within_the_grace_period(self):
+        marker = self.run_bounce(cleanup_seconds=1, exit_grace=10)
+        self.assertTrue(os.path.exists(marker))
+
+    def test_script_still_cleaning_up_is_not_killed(self):
+        marker = self.run_bounce(cleanup_seconds=2, exit_grace=0.2)
+        self.assertFalse(os.path.exists(marker))
+        deadline = time.monotonic() + 10
+        while not os.path.exists(marker) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.assertTrue(os.path.exists(marker))
+
+    def test_hung_script_times_out_and_is_killed(self):
+        with self.assertRaises(TimeoutError):
+            self.run_fake({"FAKE_OSASCRIPT_MODE": "hang"}, timeout=1)
+        self.assertIsNotNone(self.processes[0].poll())
+
+    def test_failing_script_raises_with_its_error(self):
+        start_time = time.monotonic()
+        with self.assertRaisesRegex(RuntimeError, "status 3.*Can't get window 1"):
+            self.run_fake({"FAKE_OSASCRIPT_MODE": "fail", "FAKE_OSASCRIPT_EXIT_CODE": "3"})
+        self.assertLess(time.monotonic() - start_time, 10)
+
+    def test_clean_exit_without_a_bounce_fails_after_the_output_grace(self):
+        start_time = time.monotonic()
+        with self.assertRaisesRegex(RuntimeError, "without bouncing"):
+            self.run_fake({"FAKE_OSASCRIPT_MODE": "noop"}, output_grace=0.5)
+        # Well before the 30 second bounce timeout
+        self.assertLess(time.monotonic() - start_time, 10)
+
+    def test_chatty_script_does_not_block_on_stderr(self):
+        bounced, process = self.run_fake({"FAKE_OSASCRIPT_STDERR_BYTES": str(1024 * 1024)}, timeout=20)
+        self.assertEqual(os.path.basename(bounced), "looped_audio.mp3")
+        self.assertEqual(process.wait(10), 0)
+
+
+@requires("numpy")
+class AudioLooperSeamTest(unittest.TestCase):
+    rate = 1000
+    period = 200  # 5 Hz at 1 kHz
+
+    def loop(self, loop_in, loop_out, seconds=10, target_seconds=40):
+        import numpy as np
+        from example.utilities.audio_looper import AudioLooper
+
+        looper = AudioLooper(crossfade_seconds=0.5, sample_rate=self.rate, channels=1, block_seconds=0.3)
+        source = np.sin(2 * np.pi * np.arange(seconds * self.rate) / self.period).astype(np.float32)[:, None]
+        blocks = looper.iter_looped_blocks(source, target_seconds * self.rate, loop_in, loop_out)
+        return source[:, 0], np.concatenate(list(blocks))[:, 0]
+
+    def assert_continuous_sine(self, source, output):
+        import numpy as np
+
+        # Loop points a whole number of periods apart: the looped output should stay in phase with the
+        # source sine, with no jump at a seam and no cancellation inside the crossfade
+        ideal = np.sin(2 * np.pi * np.arange(len(output)) / self.period)
+        self.assertLessEqual(np.abs(np.diff(output)).max(), 2 * np.abs(np.diff(source)).max())
+        for start in range(0, len(output) - self.period + 1, self.period // 2):
+            window, expected = output[start:start + self.period], ideal[start:start + self.period]
+            correlation = np.dot(window, expected) / (np.linalg.norm(window) * np.linalg.norm(expected) + 1e-9)
+            self.assertGreater(correlation, 0.99, f"seam out of phase at sample {start}")
+            self.assertGreater(np.linalg.norm(window), 0.9 * np.linalg.norm(expected), f"dip at sample {start}")
+
+    def test_seam_is_continuous_with_audio_after_loop_out(self):
+        source, output = self.loop(loop_in=1230, loop_out=1230 + 30 * self.period)
+        self.assert_continuous_sine(source, output)
+
+    def test_seam_is_continuous_when_loop_out_is_near_the_end(self):
+        source, output = self.loop(loop_in=2030, loop_out=2030 + 39 * self.period)
+        self.assert_continuous_sine(source, output)
+
+
+LOOPED_AUDIO_RSS = """
+import json, resource
+from example.utilities.audio_looper import AudioLooper
+looper = AudioLooper(crossfade_seconds=1.0, bitrate="64k")
+looper.loop_audio({source!r}, {output!r}, {hours!r}, loop_in=2.0, loop_out=8.0)
+print(json.dumps({{"peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+
+@requires("numpy", ffmpeg=True)
+class AudioLooperRunTest(TempDirTestCase):
+    def test_output_duration_and_flat_memory(self):
+        from example.benchmarks.fixtures import make_music
+        from example.utilities.ffmpeg_tools import probe_media
+
+        source = make_music(os.path.join(self.work_dir, "track.wav"), 10)
+        peaks = {}
+        for minutes in (1, 60):
+            output = os.path.join(self.work_dir, f"looped_{minutes}.m4a")
+            peaks[minutes] = run_python(LOOPED_AUDIO_RSS.format(source=source, output=output,
+                                                                hours=minutes / 60))["peak_rss"]
+            info = probe_media(output)
+            # AAC pads the last frame, so allow a few milliseconds over the target
+            self.assertAlmostEqual(info["audio_duration"] or info["duration"], minutes * 60, delta=0.05)
+        # The source is memory-mapped and streamed into the encoder: an hour must cost no more than a minute
+        self.assertLess(peaks[60], peaks[1] * 1.2, peaks)
+
+
+@requires("numpy")
+class LoopPointFinderTest(TempDirTestCase):
+    rate = 1000
+    audio_period = 1370  # samples
+    fps = 24
+    video_period = 17  # frames
+    size = (32, 18)
+
+    def setUp(self):
+        super().setUp()
+        from types import SimpleNamespace
+        from unittest import mock
+
+        # Decodes return the file's bytes as if ffmpeg had produced them, so the fixtures are the raw
+        # samples and frames themselves and a changed file is also a changed content hash
+        self.decodes = []
+
+        def fake_run_ffmpeg(args, description="ffmpeg"):
+            path = args[args.index("-i") + 1]
+            self.decodes.append(path)
+            with open(path, "rb") as source:
+                return SimpleNamespace(stdout=source.read())
+
+        for patcher in (mock.patch("example.utilities.loop_points.run_ffmpeg", fake_run_ffmpeg),
+                        mock.patch("example.utilities.loop_points.probe_media", return_value={"fps": self.fps})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_finder(self):
+        from example.utilities.loop_points import LoopPointFinder
+        return LoopPointFinder(cache_dir=os.path.join(self.work_dir, "loop_points"), analysis_rate=self.rate,
+                               template_seconds=1.0, search_seconds=4.0, video_size=self.size)
+
+    def write_periodic_audio(self, name="track.f32", seconds=20, seed=1):
+        import numpy as np
+        # Noise repeated every audio_period samples: only loop lengths that are whole periods match
+        cycle = np.random.default_rng(seed).standard_normal(self.audio_period).astype(np.float32)
+        path = os.path.join(self.work_dir, name)
+        np.resize(cycle, seconds * self.rate).tofile(path)
+        return path
+
+    def write_periodic_clip(self, name="clip.gray", seconds=12, seed=2):
+        import numpy as np
+        width, height = self.size
+        cycle = np.random.default_rng(seed).integers(0, 256, (self.video_period, width * height), dtype=np.uint8)
+        path = os.path.join(self.work_dir, name)
+        np.resize(cycle, (seconds * self.fps, width * height)).tofile(path)
+        return path
+
+    def assert_whole_periods(self, result, rate, period):
+        # A seam is clean when loop-in and loop-out are the same point in the cycle, to within one
+        # sample or frame
+        length = round((result["loop_out"] - result["loop_in"]) * rate)
+        self.assertGreater(length, 0)
+        self.assertLessEqual(min(length % period, period - length % period), 1, result)
+
+    def test_audio_loop_spans_whole_periods(self):
+        result = self.make_finder().find_audio_loop(self.write_periodic_audio())
+        self.assert_whole_periods(result, self.rate, self.audio_period)
+        self.assertGreater(result["score"], 0.99)
+
+    def test_video_loop_spans_whole_periods(self):
+        result = self.make_finder().find_video_loop(self.write_periodic_clip())
+        self.assert_whole_periods(result, self.fps, self.video_period)
+        # Mean squared difference per pixel: exact repeats leave only float rounding, against ~10000
+        # for unrelated noise frames
+        self.assertLess(result["score"], 1.0)
+
+    def test_cache_is_reused_per_content_hash(self):
+        path = self.write_periodic_audio()
+        first = self.make_finder().find_audio_loop(path)
+        self.assertEqual(len(os.listdir(os.path.join(self.work_dir, "loop_points"))), 1)
+
+        # A second call, even from a new finder as in the next run, is answered from the JSON cache
+        self.assertEqual(self.make_finder().find_audio_loop(path), first)
+        self.assertEqual(self.decodes, [path])
+
+        # New content under the same path is a new hash, so it is analyzed again
+        self.write_periodic_audio(seed=3)
+        self.make_finder().find_audio_loop(path)
+        self.assertEqual(self.decodes, [path, path])
+        self.assertEqual(len(os.listdir(os.path.join(self.work_dir, "loop_points"))), 2)
+
+
+def make_shell(work_dir, **configs):
+    """An ExampleShell whose library and caches live in work_dir, with empty staging folders."""
+    from example.example import ExampleShell
+
+    configs = dict({"media_library_path": os.path.join(work_dir, "media_library.sqlite3"),
+                    "loop_point_cache_dir": os.path.join(work_dir, "loop_points"),
+                    "segment_cache_dir": os.path.join(work_dir, "segment_cache")}, **configs)
+    shell = ExampleShell(configs=configs, run=False)
+    shell.music_dir = os.path.join(work_dir, "music")
+    shell.video_dir = os.path.join(work_dir, "videos")
+    os.makedirs(shell.music_dir)
+    os.makedirs(shell.video_dir)
+    return shell
+
+
+def add_staged_file(library, path, kind, duration=60.0, height=1080):
+    """Create a staging file and its catalog row, as if it had been indexed already."""
+    with open(path, "wb") as staged:
+        staged.write(os.urandom(1024))
+    stat = os.stat(path)
+    with library.connection:
+        library.connection.execute(
+            "INSERT INTO media (path, kind, size, mtime_ns, duration, width, height) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (os.path.abspath(path), kind, stat.st_size, stat.st_mtime_ns, duration,
+             None if kind == "music" else height * 16 // 9, None if kind == "music" else height))
+
+
+class MediaSelectionTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shell = make_shell(self.work_dir)
+        library = self.shell.media_library
+        for index in range(3):
+            add_staged_file(library, os.path.join(self.shell.music_dir, f"track_{index}.wav"), "music")
+            add_staged_file(library, os.path.join(self.shell.video_dir, f"clip_{index}.mp4"), "video")
+        self.syncs = []
+        sync = library.sync
+        library.sync = lambda folder, kind: self.syncs.append(kind) or sync(folder, kind)
+
+    def test_library_is_synced_once_per_run(self):
+        for _ in range(5):
+            self.assertTrue(self.shell.get_music_file().endswith("track_0.wav"))
+            self.assertTrue(self.shell.get_video_file().endswith("clip_0.mp4"))
+        self.assertEqual(sorted(self.syncs), ["music", "video"])
+
+    def test_file_removed_after_the_sync_is_not_selected(self):
+        os.remove(self.shell.get_music_file())
+        self.assertTrue(self.shell.get_music_file().endswith("track_1.wav"))
+        self.assertEqual(self.syncs.count("music"), 2)
+
+
+class MediaLibraryTest(TempDirTestCase):
+    def test_new_file_restaged_under_an_archived_name_is_selected(self):
+        from unittest import mock
+        from example.utilities.media_library import MediaLibrary
+
+        library = MediaLibrary(os.path.join(self.work_dir, "media_library.sqlite3"))
+        self.addCleanup(library.close)
+        staging = os.path.join(self.work_dir, "videos")
+        archive = os.path.join(self.work_dir, "output")
+        os.makedirs(staging)
+        os.makedirs(archive)
+        clip = os.path.join(staging, "clip.mp4")
+        info = {"duration": 60.0, "width": 1920, "height": 1080, "fps": 24.0, "video_codec": "h264",
+                "audio_codec": None}
+        with mock.patch("example.utilities.media_library.probe_media", return_value=info):
+            with open(clip, "wb") as staged:
+                staged.write(b"first clip")
+            library.sync(staging, "video")
+            self.assertEqual(library.select("video")["path"], clip)
+            shutil.move(clip, os.path.join(archive, "clip.mp4"))
+            library.mark_archived(clip, os.path.join(archive, "clip.mp4"))
+            self.assertIsNone(library.select("video"))
+
+            with open(clip, "wb") as staged:
+                staged.write(b"a different clip")
+            library.sync(staging, "video")
+        selected = library.select("video")
+        self.assertEqual(selected["path"], clip)
+        self.assertEqual(selected["status"], "unused")
+        self.assertIsNone(selected["archived_path"])
+
+    def test_reindexing_the_same_content_keeps_the_status(self):
+        from unittest import mock
+        from example.utilities.media_library import MediaLibrary
+
+        library = MediaLibrary(os.path.join(self.work_dir, "media_library.sqlite3"))
+        self.addCleanup(library.close)
+        clip = os.path.join(self.work_dir, "clip.mp4")
+        with open(clip, "wb") as staged:
+            staged.write(b"clip")
+        info = {"duration": 60.0, "width": 1920, "height": 1080, "fps": 24.0, "video_codec": "h264",
+                "audio_codec": None}
+        with mock.patch("example.utilities.media_library.probe_media", return_value=info):
+            library.index_file(clip, "video")
+            library.mark_used(clip)
+            os.utime(clip)  # Touched, not replaced
+            library.index_file(clip, "video")
+        self.assertEqual(library.get(clip)["status"], "used")
+
+
+class PlanRunTest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        from unittest import mock
+
+        self.shell = make_shell(self.work_dir, intro_duration="5")
+        self.created = [self.shell.media_library_path, self.shell.configs["segment_cache_dir"],
+                        self.shell.configs["loop_point_cache_dir"]]
+        # Planning must not open any media
+        for target in ("example.example.probe_media", "example.utilities.media_library.probe_media"):
+            patcher = mock.patch(target, side_effect=AssertionError("probe_media called while planning"))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_plan_without_a_catalog_creates_nothing(self):
+        with open(os.path.join(self.shell.video_dir, "clip.mp4"), "wb") as clip:
+            clip.write(b"clip")
+        plan = self.shell.plan_run()
+        self.assertEqual(plan["jobs"], [])
+        self.assertEqual(plan["unindexed"]["video"], [os.path.join(self.shell.video_dir, "clip.mp4")])
+        for path in self.created:
+            self.assertFalse(os.path.exists(path), path)
+
+    def test_plan_reads_the_catalog_without_writing_to_it(self):
+        from example.utilities.media_library import MediaLibrary
+
+        library = MediaLibrary(self.shell.media_library_path)
+        add_staged_file(library, os.path.join(self.shell.music_dir, "track.wav"), "music", duration=120.0)
+        add_staged_file(library, os.path.join(self.shell.video_dir, "clip.mp4"), "video", duration=10.0)
+        library.close()
+        modified = os.stat(self.shell.media_library_path).st_mtime_ns
+
+        plan = self.shell.plan_run()
+        self.assertEqual(len(plan["jobs"]), 1)
+        # 30 minutes: 5 s of intro (from intro_duration), then the 10 s clip repeated to the end
+        self.assertEqual(plan["jobs"][0]["num_loops"], 180)
+        self.assertEqual(os.stat(self.shell.media_library_path).st_mtime_ns, modified)
+        for path in self.created[1:]:
+            self.assertFalse(os.path.exists(path), path)
+
+
+class LogicProBatchInputTest(TempDirTestCase):
+    def test_each_job_bounces_its_own_music_file(self):
+        shell = make_shell(self.work_dir, audio_backend="logic_pro")
+        seen = {}
+
+        def run_automation(target_folder, save_to_folder):
+            seen[save_to_folder] = sorted(os.listdir(target_folder))
+            bounced = os.path.join(save_to_folder, "looped_audio.mp3")
+            open(bounced, "w").close()
+            return bounced
+
+        shell.logic_pro_automation.run_automation = run_automation
+        for index in range(3):
+            with open(os.path.join(shell.music_dir, f"track_{index}.wav"), "w") as track:
+                track.write("music")
+        for index in (2, 1):
+            job_dir = os.path.join(self.work_dir, f"job{index}")
+            os.makedirs(job_dir)
+            shell.loop_audio(os.path.join(shell.music_dir, f"track_{index}.wav"),
+                             os.path.join(job_dir, "looped_audio.mp3"), output_dir=job_dir)
+            self.assertEqual(seen[job_dir], [f"track_{index}.wav"])
+            self.assertFalse(os.path.exists(os.path.join(job_dir, "logic_input")))
+        self.assertEqual(len(os.listdir(shell.music_dir)), 3)
+
+
+IMPORT_MAIN = """
+import sys, time, json
+start = time.perf_counter()
+import main, example.example
+print(json.dumps({{"seconds": time.perf_counter() - start,
+                  "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+@requires("dotenv")
+class ImportTimeTest(unittest.TestCase):
+    def test_main_imports_within_budget_without_heavy_dependencies(self):
+        from example.benchmarks.suite import IMPORT_BUDGET_SECONDS, HEAVY_MODULES
+
+        samples = [run_python(IMPORT_MAIN.format(heavy=HEAVY_MODULES), timeout=60) for _ in range(5)]
+        for sample in samples:
+            self.assertEqual(sample["heavy"], [])
+        # Median of fresh interpreters, so one slow start on a busy machine does not fail the test
+        seconds = sorted(sample["seconds"] for sample in samples)[len(samples) // 2]
+        self.assertLess(seconds, IMPORT_BUDGET_SECONDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
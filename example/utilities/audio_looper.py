@@ -0,0 +1,155 @@
+import os
+import time
+import logging
+import tempfile
+
+from example.utilities.ffmpeg_tools import decode_audio_to_pcm, open_ffmpeg_pipe, close_ffmpeg_pipe
+from example.utilities.instrumentation import record
+
+
+class AudioLooper:
+    def __init__(self, crossfade_seconds=5.0, sample_rate=44100, channels=2, block_seconds=10.0,
+                 codec="aac", bitrate="320k"):
+        """
+        Pure-Python replacement for the Logic Pro loop-and-bounce step.
+
+        The source track is decoded once into a raw PCM file that is memory-mapped, and the
+        looped output is streamed block by block into an ffmpeg encoder, so memory use does
+        not depend on the requested output duration.
+
+        Parameters:
+        - crossfade_seconds (float): Length of the equal-power crossfade applied at every loop seam.
+        - sample_rate (int): Sample rate used while looping and for the encoded output.
+        - channels (int): Channel count used while looping and for the encoded output.
+        - block_seconds (float): Amount of audio handed to the encoder per write.
+        - codec (str): ffmpeg audio encoder for the looped file. This is the final codec: the
+          renderers mux the looped file into the video without re-encoding it.
+        - bitrate (str): Target bitrate for the looped file.
+        """
+        self.crossfade_seconds = crossfade_seconds
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_samples = max(1, int(block_seconds * sample_rate))
+        self.codec = codec
+        self.bitrate = bitrate
+
+    def loop_audio(self, music_file, output_path, duration_hours, work_dir=None, loop_in=None, loop_out=None):
+        """
+        Loop a music file with crossfaded seams until it fills the requested duration.
+
+        Parameters:
+        - music_file (str): Path to the source music file.
+        - output_path (str): Path where the looped audio will be saved.
+        - duration_hours (float): Desired output duration in hours.
+        - work_dir (str): Directory for the temporary PCM cache. Defaults to the output folder.
+        - loop_in (float): Second the repeats jump back to (e.g. from LoopPointFinder). Defaults to 0.
+        - loop_out (float): Second the repeats jump from. Defaults to the end of the track.
+
+        Returns:
+        - str: The path of the looped audio file.
+        """
+        import numpy as np
+        start_time = time.time()
+        work_dir = work_dir or os.path.dirname(os.path.abspath(output_path))
+        target_samples = int(round(duration_hours * 60 * 60 * self.sample_rate))
+        if target_samples <= 0:
+            raise ValueError(f"duration_hours must be positive, got {duration_hours}")
+
+        pcm_fd, pcm_path = tempfile.mkstemp(suffix=".f32", dir=work_dir)
+        os.close(pcm_fd)
+        try:
+            logging.info(f"Decoding {music_file} for looping...")
+            decode_audio_to_pcm(music_file, pcm_path, sample_rate=self.sample_rate, channels=self.channels)
+            source = np.memmap(pcm_path, dtype=np.float32, mode="r")
+            source = source[:len(source) - len(source) % self.channels].reshape(-1, self.channels)
+            if len(source) == 0:
+                raise ValueError(f"No audio samples decoded from {music_file}")
+
+            encoder = open_ffmpeg_pipe(
+                ["-f", "f32le", "-ar", str(self.sample_rate), "-ac", str(self.channels), "-i", "pipe:0",
+                 "-c:a", self.codec, "-b:a", self.bitrate, output_path],
+                description="looped audio encode"
+            )
+            try:
+                loop_in_sample = int(round((loop_in or 0) * self.sample_rate))
+                loop_out_sample = int(round(loop_out * self.sample_rate)) if loop_out else None
+                for block in self.iter_looped_blocks(source, target_samples, loop_in_sample, loop_out_sample):
+                    encoder.stdin.write(block.tobytes())
+            finally:
+                close_ffmpeg_pipe(encoder, description="looped audio encode")
+            del source
+        finally:
+            os.remove(pcm_path)
+
+        record(media_seconds=target_samples / self.sample_rate)
+        elapsed_time = time.time() - start_time
+        logging.info(f"Looped audio ({duration_hours} hours) written to {output_path} in {elapsed_time:.2f} seconds.")
+        return output_path
+
+    def crossfade_samples(self, loop_length):
+        """Crossfade length in samples, capped so every loop pass keeps a non-empty body."""
+        return max(0, min(int(self.crossfade_seconds * self.sample_rate), (loop_length - 1) // 2))
+
+    def build_seam(self, tail, head):
+        """Mix the tail of the loop into its head with an equal-power (sin/cos) crossfade."""
+        import numpy as np
+        crossfade = len(tail)
+        ramp = (np.arange(crossfade, dtype=np.float32) + 0.5) * (np.pi / 2 / crossfade)
+        fade_in = np.sin(ramp)[:, None]
+        fade_out = np.cos(ramp)[:, None]
+        return tail * fade_out + head * fade_in
+
+    def iter_looped_blocks(self, source, target_samples, loop_in=0, loop_out=None):
+        """
+        Yield the looped signal as float32 blocks of at most ``block_samples`` frames.
+
+        LoopPointFinder matches the audio from loop_out with the audio from loop_in, so the seam
+        crossfades two aligned windows: source[loop_out - a:loop_out + b] fades out while
+        source[loop_in - a:loop_in + b] fades in, with the window placed over the matched audio
+        after the points as far as the track allows (b) and before them otherwise (a). The first
+        pass plays the source up to the window; every later pass is the precomputed seam followed
+        by the body from loop_in + b, so each repetition lasts exactly loop_out - loop_in and
+        costs one vectorized slice per block.
+
+        When the whole track is looped there is no audio around either point to align, and the
+        tail of the track is crossfaded into its head instead.
+        """
+        import numpy as np
+        loop_out = min(loop_out or len(source), len(source))
+        loop_in = max(0, min(loop_in, loop_out - 1))
+        crossfade = self.crossfade_samples(loop_out - loop_in)
+        after = min(crossfade, len(source) - loop_out)
+        before = min(crossfade - after, loop_in)
+        if after + before:
+            seam = self.build_seam(source[loop_out - before:loop_out + after],
+                                   source[loop_in - before:loop_in + after]).astype(np.float32)
+            first_pass = source[:loop_out - before]
+            later_passes = [seam, source[loop_in + after:loop_out - before]]
+        elif crossfade:
+            seam = self.build_seam(source[loop_out - crossfade:loop_out],
+                                   source[loop_in:loop_in + crossfade]).astype(np.float32)
+            first_pass = source[:loop_out - crossfade]
+            later_passes = [seam, source[loop_in + crossfade:loop_out - crossfade]]
+        else:
+            first_pass = source[:loop_out]
+            later_passes = [source[loop_in:loop_out]]
+
+        remaining = target_samples
+        pieces = [first_pass]
+        while remaining > 0:
+            for piece in pieces:
+                for start in range(0, len(piece), self.block_samples):
+                    block = piece[start:start + self.block_samples][:remaining]
+                    remaining -= len(block)
+                    yield block
+                    if remaining <= 0:
+                        return
+            pieces = later_passes
+
+
+# Usage example
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    looper = AudioLooper(crossfade_seconds=5.0)
+    looper.loop_audio("staging_files/music/track.mp3", "looped_audio.m4a", duration_hours=0.5)
@@ -0,0 +1,95 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_LIMITS = {"cpu": 1, "logic": 1, "upload": 1}
+
+
+class BatchScheduler:
+    def __init__(self, limits=None, max_jobs=None):
+        """
+        Run many pipeline jobs at once while capping how many use each kind of resource.
+
+        A job is a list of stages; each stage names the resource it occupies ("cpu" for encoding,
+        "logic" for the Logic Pro bounce, "upload" for network transfers, or None for bookkeeping
+        that needs no slot). A stage only starts once a slot of its resource is free, so one job
+        can upload while the next one encodes. A failing job is recorded and the others carry on.
+
+        Parameters:
+        - limits (dict): Concurrent stages allowed per resource, e.g. {"cpu": 2, "logic": 1, "upload": 2}.
+        - max_jobs (int): Jobs in flight at once. Defaults to the sum of the limits, enough to keep
+          every resource busy.
+        """
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.slots = {resource: threading.Semaphore(max(1, count)) for resource, count in self.limits.items()}
+        self.max_jobs = max_jobs or sum(max(1, count) for count in self.limits.values())
+
+    def run(self, jobs):
+        """
+        Run jobs to completion and report throughput.
+
+        Parameters:
+        - jobs (list): (name, stages) pairs, where stages is a list of (stage_name, resource, callable).
+
+        Returns:
+        - dict: Per-job results plus succeeded/failed counts, elapsed seconds and videos per hour.
+        """
+        start_time = time.time()
+        logging.info(f"Batch of {len(jobs)} jobs starting with limits {self.limits}, {self.max_jobs} jobs in flight")
+        with ThreadPoolExecutor(max_workers=max(1, self.max_jobs), thread_name_prefix="batch-job") as executor:
+            results = list(executor.map(lambda job: self.run_job(*job), jobs))
+
+        elapsed = time.time() - start_time
+        succeeded = sum(1 for result in results if result["status"] == "succeeded")
+        report = {
+            "jobs": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "elapsed": elapsed,
+            "videos_per_hour": succeeded / elapsed * 60 * 60 if elapsed > 0 else 0.0,
+        }
+        logging.info(f"Batch finished: {succeeded}/{len(results)} jobs succeeded in {elapsed:.2f} seconds "
+                     f"({report['videos_per_hour']:.2f} videos per hour)")
+        return report
+
+    def run_job(self, name, stages):
+        """Run one job's stages in order, holding the matching resource slot for each."""
+        result = {"name": name, "status": "succeeded", "error": None, "failed_stage": None, "stages": {}}
+        job_start = time.time()
+        for stage_name, resource, stage in stages:
+            try:
+                wait_start = time.time()
+                if resource is None:
+                    waited = 0.0
+                    stage_start = time.time()
+                    stage()
+                else:
+                    with self.slots[resource]:
+                        waited = time.time() - wait_start
+                        stage_start = time.time()
+                        stage()
+                result["stages"][stage_name] = {"resource": resource, "waited": waited,
+                                                "elapsed": time.time() - stage_start}
+            except Exception as e:
+                logging.error(f"Job {name} failed in stage {stage_name}: {e}")
+                result.update(status="failed", error=str(e), failed_stage=stage_name)
+                break
+        result["elapsed"] = time.time() - job_start
+        logging.info(f"Job {name} {result['status']} in {result['elapsed']:.2f} seconds.")
+        return result
+
+
+# Usage example
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s')
+
+    def fake_stage(seconds):
+        return lambda: time.sleep(seconds)
+
+    scheduler = BatchScheduler(limits={"cpu": 2, "logic": 1, "upload": 2})
+    scheduler.run([
+        (f"job-{index}", [("loop_audio", "logic", fake_stage(0.2)), ("render", "cpu", fake_stage(0.5)),
+                          ("upload", "upload", fake_stage(0.3))])
+        for index in range(6)
+    ])
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+
+MANIFEST_NAME = "manifest.json"
+
+
+def normalize_params(params):
+    """Round-trip params through JSON so tuples, numpy scalars etc. compare equal to what was saved."""
+    return json.loads(json.dumps(params, sort_keys=True, default=str))
+
+
+class RenderManifest:
+    def __init__(self, output_dir, filename=MANIFEST_NAME):
+        """
+        Crash-safe record of what a run has finished, kept in its output directory.
+
+        The manifest stores the job inputs, every completed pipeline stage (with the hash of its
+        inputs and the content hashes of its artifacts, see StageGraph) and every completed
+        render segment with the parameters it was encoded with. Segments are written to a partial
+        file and renamed into place once complete, and the manifest itself is replaced atomically,
+        so after a crash anything the manifest lists is known to be whole. A resumed run skips
+        those and encodes only what is missing.
+
+        Parameters:
+        - output_dir (str): The run's output directory.
+        - filename (str): Manifest file name inside output_dir.
+        """
+        self.output_dir = os.path.abspath(output_dir)
+        self.path = os.path.join(self.output_dir, filename)
+        self.lock = threading.Lock()
+        self.exists = os.path.exists(self.path)
+        if self.exists:
+            with open(self.path) as manifest_file:
+                self.data = json.load(manifest_file)
+        else:
+            self.data = {"version": 1, "job": {}, "stages": {}, "segments": {}}
+
+    def save(self):
+        with self.lock:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as manifest_file:
+                json.dump(self.data, manifest_file, indent=2, sort_keys=True)
+                manifest_file.flush()
+                os.fsync(manifest_file.fileno())
+            os.replace(temp_path, self.path)
+            self.exists = True
+
+    @property
+    def job(self):
+        return self.data["job"]
+
+    def set_job(self, **job):
+        """Record the job inputs (music, video, duration, settings) so --resume can rebuild the run."""
+        self.data["job"].update(normalize_params(job))
+        self.save()
+
+    def stage_done(self, name):
+        return self.data["stages"].get(name, {}).get("status") == "complete"
+
+    def stage_info(self, name):
+        """Return what a completed stage recorded (e.g. the looped audio path), or an empty dict."""
+        return self.data["stages"].get(name, {}).get("info", {})
+
+    def stage_inputs_key(self, name):
+        return self.data["stages"].get(name, {}).get("inputs_key")
+
+    def stage_artifacts(self, name):
+        """Return the content hash and fingerprint recorded for each artifact file of a stage."""
+        return self.data["stages"].get(name, {}).get("artifacts", {})
+
+    def mark_stage_done(self, name, info=None, inputs=None, inputs_key=None, artifacts=None):
+        """
+        Record a completed stage.
+
+        Parameters:
+        - name (str): Stage name.
+        - info (dict): What the stage produced (paths, IDs).
+        - inputs (dict): The inputs it ran with, and inputs_key (str) their hash.
+        - artifacts (dict): Content hash and fingerprint of each artifact file.
+        """
+        self.data["stages"][name] = normalize_params({
+            "status": "complete", "finished_at": time.time(), "info": info or {},
+            "inputs": inputs or {}, "inputs_key": inputs_key, "artifacts": artifacts or {},
+        })
+        self.save()
+
+    def relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.output_dir)
+
+    def segment_done(self, segment_path, params):
+        """True if the segment was completed with exactly these parameters and is still whole on disk."""
+        entry = self.data["segments"].get(self.relative(segment_path))
+        if entry is None or entry["params"] != normalize_params(params):
+            return False
+        return os.path.exists(segment_path) and os.path.getsize(segment_path) == entry["size"]
+
+    def mark_segment_done(self, segment_path, params):
+        self.data["segments"][self.relative(segment_path)] = {
+            "params": normalize_params(params), "size": os.path.getsize(segment_path), "finished_at": time.time(),
+        }
+        self.save()
+
+    def checkpoint_segment(self, segment_path, params, encode):
+        """
+        Produce segment_path via encode(path) unless a matching complete copy already exists.
+
+        encode writes to a partial file that is only renamed to segment_path once it returns, so a
+        crash mid-encode never leaves a truncated segment under the final name.
+        """
+        if self.segment_done(segment_path, params):
+            logging.info(f"Checkpoint: reusing completed segment {segment_path}")
+            return segment_path
+        partial_path = partial_path_for(segment_path)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        encode(partial_path)
+        os.replace(partial_path, segment_path)
+        self.mark_segment_done(segment_path, params)
+        return segment_path
+
+    def summary(self):
+        return {
+            "job": self.job,
+            "stages": {name: entry["status"] for name, entry in self.data["stages"].items()},
+            "segments": len(self.data["segments"]),
+        }
+
+
+def partial_path_for(segment_path):
+    """In-progress name for a segment; keeps the extension so ffmpeg still picks the right muxer."""
+    root, extension = os.path.splitext(segment_path)
+    return f"{root}.partial{extension}"
+
+
+# Usage example
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the checkpoint manifest of a run's output directory.")
+    parser.add_argument("output_dir")
+    args = parser.parse_args()
+
+    manifest = RenderManifest(args.output_dir)
+    if not manifest.exists:
+        raise SystemExit(f"No {MANIFEST_NAME} in {args.output_dir}")
+    print(json.dumps(manifest.summary(), indent=2))
@@ -0,0 +1,135 @@
+import os
+import logging
+from dataclasses import dataclass, asdict
+
+
+@dataclass(frozen=True)
+class EncodeProfile:
+    """
+    Named set of export settings shared by every render path.
+
+    Attributes:
+    - name (str): Profile name used in configs.
+    - fps (int): Frame rate of the intro and looped segment.
+    - black_fps (float): Frame rate of the black tail; None keeps it at fps. The stream-copy
+      renderer joins the two rates into one variable-frame-rate file.
+    - codec (str): ffmpeg video encoder.
+    - preset (str): Encoder preset.
+    - crf (int): Constant rate factor; None uses the encoder default.
+    - tune (str): Encoder tuning (e.g. "stillimage"); None for no tuning.
+    - maxrate (str): Bitrate ceiling (e.g. "2M"); None leaves the bitrate unconstrained.
+    - bufsize (str): Rate-control buffer size used with maxrate.
+    - gop (int): Keyframe interval in frames.
+    - pix_fmt (str): Output pixel format.
+    - audio_bitrate (str): Bitrate used when the audio track has to be encoded.
+    """
+    name: str
+    fps: int = 24
+    black_fps: float = None
+    codec: str = "libx264"
+    preset: str = "medium"
+    crf: int = None
+    tune: str = None
+    maxrate: str = None
+    bufsize: str = None
+    gop: int = 240
+    pix_fmt: str = "yuv420p"
+    audio_bitrate: str = "320k"
+
+    @property
+    def tail_fps(self):
+        """Frame rate used for the black tail."""
+        return self.black_fps or self.fps
+
+    def encoder_args(self):
+        """ffmpeg output arguments for the video encoder, excluding frame rate and filters."""
+        return ["-c:v", self.codec, "-preset", self.preset, "-pix_fmt", self.pix_fmt] + self.tuning_args()
+
+    def tuning_args(self):
+        """Rate-control and tuning arguments, also passed to moviepy as extra ffmpeg_params."""
+        args = []
+        if self.crf is not None:
+            args += ["-crf", str(self.crf)]
+        if self.tune:
+            args += ["-tune", self.tune]
+        if self.maxrate:
+            args += ["-maxrate", self.maxrate, "-bufsize", self.bufsize or self.maxrate]
+        return args
+
+    def to_dict(self):
+        return asdict(self)
+
+
+PROFILES = {
+    # The original export settings: 24 fps throughout, preset "medium", encoder-default CRF.
+    "default": EncodeProfile(name="default"),
+    # Looped ambient clip followed by hours of black: still-image tuning, a capped bitrate and
+    # a 1 fps black tail cut both encode CPU and upload size.
+    "sleep-static": EncodeProfile(name="sleep-static", fps=24, black_fps=1, preset="medium", crf=26,
+                                  tune="stillimage", maxrate="2M", bufsize="4M", gop=240,
+                                  audio_bitrate="192k"),
+}
+
+
+def get_profile(name):
+    """
+    Look up an encode profile by name.
+
+    Raises:
+    - ValueError: If no profile with that name exists.
+    """
+    try:
+        return PROFILES[name or "default"]
+    except KeyError:
+        raise ValueError(f"Unknown encode profile '{name}'. Available profiles: {', '.join(sorted(PROFILES))}")
+
+
+def log_output_size(output_video_path, duration_hours, profile):
+    """
+    Log the size of a finished render as bytes per output hour for the given profile.
+
+    Returns:
+    - float: Bytes per output hour.
+    """
+    size_bytes = os.path.getsize(output_video_path)
+    bytes_per_hour = size_bytes / duration_hours if duration_hours else float(size_bytes)
+    logging.info(f"Output size ({profile.name} profile): {size_bytes / 1024 ** 2:.1f} MB total, "
+                 f"{bytes_per_hour / 1024 ** 2:.1f} MB ({int(bytes_per_hour)} bytes) per output hour")
+    return bytes_per_hour
+
+
+def parse_bitrate(bitrate):
+    """Convert an ffmpeg bitrate such as "320k" or "2M" to bits per second."""
+    units = {"k": 1000, "m": 1000 ** 2}
+    text = str(bitrate).strip().lower()
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+# What a black frame costs once encoded: a few hundred bytes at any resolution and CRF
+BLACK_FRAME_BYTES = 300
+
+
+def estimate_output_bytes(plan, source_bytes_per_second, intro_bytes, profile):
+    """
+    Rough size of a render, for dry runs, before anything is encoded.
+
+    The looped clip is assumed to keep its source bitrate after re-encoding, the intro its file
+    size, and black frames cost BLACK_FRAME_BYTES each; the audio track is added at the profile's
+    audio bitrate.
+
+    Parameters:
+    - plan (dict): Timeline from plan_timeline().
+    - source_bytes_per_second (float): Size of the looped clip divided by its duration.
+    - intro_bytes (int): Size of the intro file.
+    - profile (EncodeProfile): Export settings.
+
+    Returns:
+    - int: Estimated bytes.
+    """
+    intro = intro_bytes if plan["intro_frames"] else 0
+    loop = plan["loop_frames"] / plan["fps"] * source_bytes_per_second
+    black = plan["black_frames"] * BLACK_FRAME_BYTES
+    audio = plan["duration"] * parse_bitrate(profile.audio_bitrate) / 8
+    return int(intro + loop + black + audio)
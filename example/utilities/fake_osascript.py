@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Stand-in for `osascript` that imitates a Logic Pro bounce, for running the pipeline on Linux.
+
+Use it by pointing LogicProAutomation at it, e.g. OSASCRIPT_BINARY=example/utilities/fake_osascript.py.
+It receives the .scpt path as its only argument (ignored) and the saveToFolder environment
+variable like the real script. Behaviour is controlled through environment variables:
+
+- FAKE_OSASCRIPT_MODE: "bounce" (default) writes the bounced file, "hang" never writes anything,
+  "fail" prints an error and exits non-zero, "noop" exits 0 without bouncing anything.
+- FAKE_OSASCRIPT_FILENAME: Name of the bounced file (default "looped_audio.mp3").
+- FAKE_OSASCRIPT_CHUNKS / FAKE_OSASCRIPT_CHUNK_BYTES: How the file is written (default 10 x 64 KiB).
+- FAKE_OSASCRIPT_DELAY: Seconds between chunks (default 0.2), mimicking a slow bounce.
+- FAKE_OSASCRIPT_DETACH: "1" exits immediately and keeps writing in a child process, like the real
+  osascript returning before Logic Pro finishes the bounce.
+- FAKE_OSASCRIPT_EXIT_CODE: Exit status used by "fail" mode (default 1).
+- FAKE_OSASCRIPT_STDERR_BYTES: Log this many bytes to stderr before bouncing, like a chatty script.
+- FAKE_OSASCRIPT_CLEANUP_SECONDS: Keep running this long after the bounce, like the real script
+  closing the Logic project, then touch FAKE_OSASCRIPT_CLEANUP_MARKER if it is set.
+"""
+import os
+import sys
+import time
+
+
+def write_bounce(path, chunks, chunk_bytes, delay):
+    with open(path, "wb") as bounce:
+        for _ in range(chunks):
+            bounce.write(b"\0" * chunk_bytes)
+            bounce.flush()
+            time.sleep(delay)
+
+
+def main():
+    mode = os.getenv("FAKE_OSASCRIPT_MODE", "bounce")
+    save_to_folder = os.getenv("saveToFolder")
+    if mode == "fail":
+        sys.stderr.write("execution error: Logic Pro X got an error: Can't get window 1. (-1719)\n")
+        return int(os.getenv("FAKE_OSASCRIPT_EXIT_CODE", "1"))
+    if mode == "hang":
+        while True:
+            time.sleep(60)
+    if mode == "noop":
+        return 0
+    if not save_to_folder:
+        sys.stderr.write("saveToFolder is not set\n")
+        return 1
+
+    path = os.path.join(save_to_folder, os.getenv("FAKE_OSASCRIPT_FILENAME", "looped_audio.mp3"))
+    chunks = int(os.getenv("FAKE_OSASCRIPT_CHUNKS", "10"))
+    chunk_bytes = int(os.getenv("FAKE_OSASCRIPT_CHUNK_BYTES", str(64 * 1024)))
+    delay = float(os.getenv("FAKE_OSASCRIPT_DELAY", "0.2"))
+
+    if os.getenv("FAKE_OSASCRIPT_DETACH") == "1" and os.fork() != 0:
+        return 0
+    stderr_bytes = int(os.getenv("FAKE_OSASCRIPT_STDERR_BYTES", "0"))
+    for _ in range(stderr_bytes // 80):
+        sys.stderr.write("osascript: Logic Pro X is busy, retrying the menu click in 0.1 seconds.........\n")
+    sys.stderr.flush()
+    write_bounce(path, chunks, chunk_bytes, delay)
+    time.sleep(float(os.getenv("FAKE_OSASCRIPT_CLEANUP_SECONDS", "0")))
+    marker = os.getenv("FAKE_OSASCRIPT_CLEANUP_MARKER")
+    if marker:
+        open(marker, "w").close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from example.utilities.resumable_upload import CHUNK_ALIGNMENT, RESUME_INCOMPLETE
+
+UPLOAD_PATH = "/upload/youtube/v3/videos"
+
+
+class FakeUploadServer:
+    def __init__(self, host="127.0.0.1", port=0, output_dir=None, error_rate=0.0, partial_rate=0.0,
+                 disconnect_rate=0.0, bytes_per_second=None, seed=None, quota_units=None, upload_cost=1600):
+        """
+        Local stand-in for the YouTube resumable upload endpoint, for exercising uploads offline.
+
+        Implements the parts of the protocol ResumableUpload uses: POST to open a session (the
+        session URI comes back in Location), PUT chunks with Content-Range (308 with a Range
+        header until the last one), and "bytes */*" status queries. Each upload is written to
+        output_dir so it can be compared with the file that was rendered.
+
+        Failures can be injected into chunk PUTs to exercise the client's retry and resync logic.
+
+        Parameters:
+        - host (str): Interface to listen on.
+        - port (int): Port to listen on; 0 picks a free one.
+        - output_dir (str): Where received uploads are stored. Defaults to a temporary folder.
+        - error_rate (float): Share of chunk PUTs answered with 503 without storing anything.
+        - partial_rate (float): Share of chunk PUTs of which only a 256 KiB-aligned prefix is kept.
+        - disconnect_rate (float): Share of chunk PUTs after which the connection is dropped
+          without a response (the chunk itself is stored).
+        - bytes_per_second (float): Optional bandwidth limit, to watch adaptive chunk sizing.
+        - seed (int): Seed for the failure dice, for reproducible runs.
+        - quota_units (int): Optional daily quota; opening a session once it is spent returns a
+          403 quotaExceeded error like the real API.
+        - upload_cost (int): Quota units charged per opened session (videos.insert costs 1600).
+        """
+        self.output_dir = output_dir or tempfile.mkdtemp(prefix="fake_upload_")
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.uploads = {}
+        self.lock = threading.Lock()
+        self.error_rate = error_rate
+        self.partial_rate = partial_rate
+        self.disconnect_rate = disconnect_rate
+        self.bytes_per_second = bytes_per_second
+        self.random = random.Random(seed)
+        self.injected = {"error": 0, "partial": 0, "disconnect": 0}
+        self.quota_units = quota_units
+        self.upload_cost = upload_cost
+        self.quota_used = 0
+        self.max_concurrent = 0
+        self.active_requests = 0
+        self.httpd = ThreadingHTTPServer((host, port), self.make_handler())
+        self.thread = None
+
+    @property
+    def upload_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{UPLOAD_PATH}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-upload-server", daemon=True)
+        self.thread.start()
+        logging.info(f"Fake upload server listening on {self.upload_url}, storing uploads in {self.output_dir}")
+        return self.upload_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def open_session(self, metadata):
+        """Create an upload session, or return None if the quota is used up."""
+        upload_id = uuid.uuid4().hex
+        with self.lock:
+            if self.quota_units is not None and self.quota_used + self.upload_cost > self.quota_units:
+                return None
+            self.quota_used += self.upload_cost
+            self.uploads[upload_id] = {"metadata": metadata, "path": os.path.join(self.output_dir, f"{upload_id}.bin"),
+                                       "received": 0, "video_id": None}
+        open(self.uploads[upload_id]["path"], "wb").close()
+        return upload_id
+
+    def roll_failure(self, data):
+        """Decide which failure, if any, to inject into a chunk PUT."""
+        if not data:
+            return None
+        with self.lock:
+            roll = self.random.random()
+        for failure, rate in (("error", self.error_rate), ("partial", self.partial_rate),
+                              ("disconnect", self.disconnect_rate)):
+            if roll < rate:
+                self.injected[failure] += 1
+                return failure
+            roll -= rate
+        return None
+
+    def receive_chunk(self, upload_id, content_range, data, keep=None):
+        """
+        Apply one PUT to a session.
+
+        Parameters:
+        - keep (int): Store only this many leading bytes of the chunk (simulates a partial write).
+
+        Returns:
+        - tuple: (HTTP status, headers, JSON body or None).
+        """
+        upload = self.uploads[upload_id]
+        first_last, _, total = content_range.replace("bytes ", "", 1).partition("/")
+        total = None if total == "*" else int(total)
+        with self.lock:
+            if first_last != "*":
+                first, last = (int(value) for value in first_last.split("-"))
+                if first != upload["received"] or last - first + 1 != len(data):
+                    # Out of step with the client: report what we have so it can resend from there
+                    return self.incomplete(upload)
+                if total is None or last + 1 < total:
+                    if len(data) % CHUNK_ALIGNMENT:
+                        return 400, {}, {"error": f"Chunk of {len(data)} bytes is not a multiple of {CHUNK_ALIGNMENT}"}
+                if keep is not None:
+                    data = data[:keep]
+                with open(upload["path"], "ab") as media:
+                    media.write(data)
+                upload["received"] += len(data)
+            if total is not None and upload["received"] == total:
+                upload["video_id"] = upload["video_id"] or uuid.uuid4().hex[:11]
+                return 200, {}, {"kind": "youtube#video", "id": upload["video_id"], **upload["metadata"]}
+            return self.incomplete(upload)
+
+    @staticmethod
+    def incomplete(upload):
+        headers = {"Range": f"bytes=0-{upload['received'] - 1}"} if upload["received"] else {}
+        return RESUME_INCOMPLETE, headers, None
+
+    def make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                if url.path != UPLOAD_PATH or parse_qs(url.query).get("uploadType") != ["resumable"]:
+                    return self.reply(404, {}, {"error": "not found"})
+                metadata = json.loads(self.read_body() or b"{}")
+                upload_id = server.open_session(metadata)
+                if upload_id is None:
+                    return self.reply(403, {}, {"error": {"code": 403, "errors": [{"reason": "quotaExceeded"}]}})
+                host, port = server.httpd.server_address[:2]
+                location = f"http://{host}:{port}{UPLOAD_PATH}?uploadType=resumable&upload_id={upload_id}"
+                self.reply(200, {"Location": location}, None)
+
+            def do_PUT(self):
+                with server.lock:
+                    server.active_requests += 1
+                    server.max_concurrent = max(server.max_concurrent, server.active_requests)
+                try:
+                    self.handle_put()
+                finally:
+                    with server.lock:
+                        server.active_requests -= 1
+
+            def handle_put(self):
+                upload_id = parse_qs(urlsplit(self.path).query).get("upload_id", [None])[0]
+                data = self.read_body()
+                if upload_id not in server.uploads:
+                    return self.reply(404, {}, {"error": "unknown upload session"})
+                if server.bytes_per_second:
+                    time.sleep(len(data) / server.bytes_per_second)
+                content_range = self.headers.get("Content-Range", "bytes */*")
+                failure = server.roll_failure(data)
+                if failure == "error":
+                    return self.reply(503, {}, {"error": "injected backend error"})
+                keep = None
+                if failure == "partial":
+                    keep = server.random.randrange(0, len(data) // CHUNK_ALIGNMENT + 1) * CHUNK_ALIGNMENT
+                status = server.receive_chunk(upload_id, content_range, data, keep=keep)
+                if failure == "disconnect":
+                    # Drop the connection after storing the chunk, as if the response was lost
+                    self.close_connection = True
+                    return
+                self.reply(*status)
+
+            def read_body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def reply(self, status, headers, body):
+                payload = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Fake upload server: {format % args}")
+
+        return Handler
+
+
+# Usage example
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the YouTube resumable upload endpoint.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output-dir")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of chunks answered with 503")
+    parser.add_argument("--partial-rate", type=float, default=0.0, help="Share of chunks only partly kept")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="Share of chunks with no response")
+    parser.add_argument("--mbps", type=float, help="Bandwidth limit in MiB/s")
+    parser.add_argument("--quota", type=int, help="Daily quota units (each upload costs 1600)")
+    args = parser.parse_args()
+
+    fake_server = FakeUploadServer(port=args.port, output_dir=args.output_dir, error_rate=args.error_rate,
+                                   partial_rate=args.partial_rate, disconnect_rate=args.disconnect_rate,
+                                   bytes_per_second=args.mbps * 1024 ** 2 if args.mbps else None,
+                                   quota_units=args.quota)
+    print(f"Set YOUTUBE_UPLOAD_URL={fake_server.upload_url} to upload here.")
+    fake_server.httpd.serve_forever()
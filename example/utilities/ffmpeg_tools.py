@@ -0,0 +1,264 @@
+import os
+import json
+import shutil
+import logging
+import subprocess
+
+
+def get_ffmpeg_binary():
+    """
+    Locate the ffmpeg executable.
+
+    The FFMPEG_BINARY environment variable wins, then the binary bundled with imageio-ffmpeg
+    (installed alongside moviepy), then whatever ffmpeg is on the PATH.
+    """
+    binary = os.getenv("FFMPEG_BINARY")
+    if binary:
+        return binary
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return shutil.which("ffmpeg") or "ffmpeg"
+
+
+def run_ffmpeg(args, description="ffmpeg"):
+    """
+    Run ffmpeg with the given arguments and raise if it fails.
+
+    Parameters:
+    - args (list): Arguments passed to ffmpeg (without the binary itself).
+    - description (str): Short label used in log and error messages.
+    """
+    command = [get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y"] + list(args)
+    logging.debug(f"Running {description}: {' '.join(command)}")
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        stderr = result.stderr.decode(errors="replace").strip()
+        raise RuntimeError(f"{description} failed with exit code {result.returncode}: {stderr[-2000:]}")
+    return result
+
+
+def open_ffmpeg_pipe(args, description="ffmpeg"):
+    """
+    Start ffmpeg with stdin connected to a pipe so raw data can be streamed into it.
+
+    Parameters:
+    - args (list): Arguments passed to ffmpeg (without the binary itself).
+    - description (str): Short label used in log messages.
+    """
+    command = [get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y"] + list(args)
+    logging.debug(f"Starting {description}: {' '.join(command)}")
+    return subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def open_ffmpeg_reader(args, description="ffmpeg", stdin=subprocess.DEVNULL):
+    """
+    Start ffmpeg with stdout connected to a pipe so its output can be consumed while it is written.
+
+    Parameters:
+    - args (list): Arguments passed to ffmpeg (without the binary itself), ending in "pipe:1".
+    - description (str): Short label used in log messages.
+    - stdin: subprocess.PIPE to also stream input into ffmpeg; no input by default.
+    """
+    command = [get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y"] + list(args)
+    logging.debug(f"Starting {description}: {' '.join(command)}")
+    return subprocess.Popen(command, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def close_ffmpeg_pipe(process, description="ffmpeg"):
+    """Close the stdin of a piped ffmpeg process, wait for it and raise if it failed."""
+    process.stdin.close()
+    stderr = process.stderr.read()
+    process.wait()
+    if process.returncode != 0:
+        stderr = stderr.decode(errors="replace").strip()
+        raise RuntimeError(f"{description} failed with exit code {process.returncode}: {stderr[-2000:]}")
+
+
+def decode_audio_to_pcm(audio_path, pcm_path, sample_rate=44100, channels=2):
+    """
+    Decode any audio file into raw interleaved float32 PCM on disk.
+
+    Parameters:
+    - audio_path (str): Source audio file (mp3, wav, ...).
+    - pcm_path (str): Destination of the raw f32le samples.
+    - sample_rate (int): Output sample rate in Hz.
+    - channels (int): Output channel count.
+    """
+    run_ffmpeg(
+        ["-i", audio_path, "-vn", "-f", "f32le", "-acodec", "pcm_f32le",
+         "-ar", str(sample_rate), "-ac", str(channels), pcm_path],
+        description=f"decode of {os.path.basename(audio_path)}"
+    )
+    return pcm_path
+
+
+def get_ffprobe_binary():
+    """
+    Locate the ffprobe executable.
+
+    The FFPROBE_BINARY environment variable wins, then an ffprobe next to the ffmpeg binary,
+    then whatever ffprobe is on the PATH.
+    """
+    binary = os.getenv("FFPROBE_BINARY")
+    if binary:
+        return binary
+    sibling = os.path.join(os.path.dirname(get_ffmpeg_binary()), "ffprobe")
+    if os.path.isfile(sibling):
+        return sibling
+    return shutil.which("ffprobe") or "ffprobe"
+
+
+def probe_media(path, count_packets=False):
+    """
+    Read container and stream metadata with ffprobe, without opening a decoder.
+
+    Parameters:
+    - path (str): Media file to inspect.
+    - count_packets (bool): Also count the video packets (demux-only pass over the whole file).
+
+    Returns:
+    - dict: duration, width, height, fps, video_codec, audio_codec, video_duration,
+      audio_duration, video_start, audio_start and (optionally) video_packets.
+    """
+    command = [get_ffprobe_binary(), "-v", "error", "-print_format", "json", "-show_format", "-show_streams"]
+    if count_packets:
+        command.append("-count_packets")
+    result = subprocess.run(command + [path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        stderr = result.stderr.decode(errors="replace").strip()
+        raise RuntimeError(f"ffprobe failed for {path}: {stderr[-2000:]}")
+    data = json.loads(result.stdout or b"{}")
+
+    info = {
+        "duration": float(data.get("format", {}).get("duration") or 0.0),
+        "width": None, "height": None, "fps": None,
+        "video_codec": None, "audio_codec": None,
+        "video_duration": None, "audio_duration": None,
+        "video_start": None, "audio_start": None,
+        "video_packets": None,
+    }
+    for stream in data.get("streams", []):
+        kind = stream.get("codec_type")
+        if kind == "video" and info["video_codec"] is None:
+            info["video_codec"] = stream.get("codec_name")
+            info["width"] = stream.get("width")
+            info["height"] = stream.get("height")
+            info["fps"] = _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate"))
+            info["video_duration"] = _parse_float(stream.get("duration"))
+            info["video_start"] = _parse_float(stream.get("start_time"))
+            if count_packets:
+                info["video_packets"] = int(stream.get("nb_read_packets") or 0)
+        elif kind == "audio" and info["audio_codec"] is None:
+            info["audio_codec"] = stream.get("codec_name")
+            info["audio_duration"] = _parse_float(stream.get("duration"))
+            info["audio_start"] = _parse_float(stream.get("start_time"))
+    return info
+
+
+def measure_loudness(path):
+    """
+    Measure the integrated loudness of a file's audio with ffmpeg's EBU R128 filter.
+
+    Returns:
+    - float: Integrated loudness in LUFS, or None if the file has no measurable audio.
+    """
+    command = [get_ffmpeg_binary(), "-hide_banner", "-nostats", "-i", path, "-vn",
+               "-af", "ebur128=framelog=quiet", "-f", "null", "-"]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        return None
+    loudness = None
+    for line in result.stderr.decode(errors="replace").splitlines():
+        line = line.strip()
+        if line.startswith("I:") and line.endswith("LUFS"):
+            loudness = _parse_float(line[2:-4].strip())
+    return loudness
+
+
+def concat_segments(list_path, output_path, audio_path=None, audio_codec="aac", audio_bitrate="320k", duration=None,
+                    pipeline=None, feed=None):
+    """
+    Join encoded segments listed in a concat-demuxer file without re-encoding the video.
+
+    Parameters:
+    - list_path (str): ffconcat list describing the segments in playback order.
+    - output_path (str): Final container path.
+    - audio_path (str): Optional audio track to mux alongside the joined video.
+    - audio_codec (str): Audio codec for the muxed track ("copy" keeps the source stream).
+    - audio_bitrate (str): Bitrate used when the audio is encoded.
+    - duration (float): Optional hard cap on the output duration in seconds.
+    - pipeline (PipelinedUpload): Optional; write a fragmented MP4 through it so the file is
+      uploaded while it is being joined.
+    - feed (callable): With a pipeline only. Called with ffmpeg's stdin to write the segments as
+      one MPEG-TS stream instead of reading list_path, so the join (and the upload) can start
+      before the last segment has been encoded.
+    """
+    if feed is not None:
+        args = ["-f", "mpegts", "-i", "pipe:0"]
+    else:
+        args = ["-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_path:
+        args += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-c:a", audio_codec]
+        if audio_codec != "copy":
+            args += ["-b:a", audio_bitrate]
+    args += ["-c:v", "copy"]
+    if duration is not None:
+        args += ["-t", f"{duration:.6f}"]
+    if pipeline is not None:
+        # Fragmented MP4 starts with its moov and never seeks back, so it can be written to a pipe
+        args += ["-f", "mp4", "-movflags", "+frag_keyframe+empty_moov+default_base_moof"]
+        return pipeline.run(args, output_path, description=f"pipelined concat into {os.path.basename(output_path)}",
+                            feed=feed)
+    args += ["-movflags", "+faststart", output_path]
+    return run_ffmpeg(args, description=f"concat into {os.path.basename(output_path)}")
+
+
+def mux_audio(video_path, audio_path, output_path, audio_codec="copy", duration=None):
+    """
+    Put an audio track next to an existing video stream without re-encoding the video.
+
+    Parameters:
+    - video_path (str): File providing the video stream.
+    - audio_path (str): File providing the audio stream.
+    - output_path (str): Final container path.
+    - audio_codec (str): Audio codec for the muxed track ("copy" keeps the source stream).
+    - duration (float): Optional hard cap on the output duration in seconds.
+    """
+    args = ["-i", video_path, "-i", audio_path, "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy", "-c:a", audio_codec]
+    if duration is not None:
+        args += ["-t", f"{duration:.6f}"]
+    args += ["-movflags", "+faststart", output_path]
+    return run_ffmpeg(args, description=f"audio mux into {os.path.basename(output_path)}")
+
+
+def stream_hashes(path, algorithm="sha256"):
+    """
+    Hash the packets of every stream in a file, ignoring the container around them.
+
+    Two renders compare equal here when their encoded audio and video are identical, even if
+    muxer metadata such as creation times differs.
+
+    Returns:
+    - list: One "index,type,algorithm=digest" entry per stream, as printed by ffmpeg's streamhash muxer.
+    """
+    result = run_ffmpeg(["-i", path, "-map", "0", "-c", "copy", "-f", "streamhash", "-hash", algorithm, "pipe:1"],
+                        description=f"stream hash of {os.path.basename(path)}")
+    return result.stdout.decode().split()
+
+
+def _parse_rate(value):
+    numerator, _, denominator = (value or "").partition("/")
+    try:
+        numerator, denominator = float(numerator), float(denominator or 1)
+    except ValueError:
+        return None
+    return numerator / denominator if numerator and denominator else None
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
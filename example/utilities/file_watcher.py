@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import logging
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+class DirectoryWatcher:
+    def __init__(self, folder, poll_interval=0.5):
+        """
+        Block until something changes in a folder.
+
+        Uses inotify on Linux so the caller wakes up as soon as a file is created or written.
+        On other platforms (or if inotify is unavailable) it falls back to sleeping for
+        poll_interval, and the caller simply rescans.
+
+        Parameters:
+        - folder (str): Folder to watch (not recursive).
+        - poll_interval (float): Sleep used by the polling fallback.
+        """
+        self.folder = folder
+        self.poll_interval = poll_interval
+        self.fd = None
+        if sys.platform.startswith("linux"):
+            self.fd = self.open_inotify(folder)
+        logging.debug(f"Watching {folder} with {'inotify' if self.fd is not None else 'polling'}")
+
+    @staticmethod
+    def open_inotify(folder):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_ATTRIB
+            if libc.inotify_add_watch(fd, os.fsencode(folder), mask) < 0:
+                error = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(error, f"inotify_add_watch failed for {folder}")
+            return fd
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify unavailable, falling back to polling: {e}")
+            return None
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds for a filesystem event.
+
+        Returns:
+        - bool: True if an event arrived (always True for the polling fallback), False on timeout.
+        """
+        timeout = max(0.0, timeout)
+        if self.fd is None:
+            time.sleep(min(timeout, self.poll_interval))
+            return True
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
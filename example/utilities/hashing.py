@@ -0,0 +1,19 @@
+import hashlib
+
+
+def file_sha256(path, chunk_size=4 * 1024 * 1024):
+    """
+    Hash a file's contents in fixed-size chunks so large media files never load into memory.
+
+    Parameters:
+    - path (str): File to hash.
+    - chunk_size (int): Bytes read per iteration.
+
+    Returns:
+    - str: Hex-encoded SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
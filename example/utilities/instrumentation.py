@@ -0,0 +1,324 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import functools
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: no rusage, so CPU, RSS and block IO are left out
+    resource = None
+
+REPORT_NAME = "performance.json"
+METRIC_PREFIX = "youtube_sleep"
+
+local = threading.local()
+
+
+def active_stages():
+    """Stack of stage timers open on the calling thread, innermost last."""
+    if not hasattr(local, "stages"):
+        local.stages = []
+    return local.stages
+
+
+def rusage_snapshot():
+    """CPU seconds, high-water RSS and block IO of this process and of its finished children (e.g. ffmpeg)."""
+    if resource is None:
+        return None
+    # ru_maxrss is in bytes on macOS and in KiB on Linux
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    snapshot = {}
+    for prefix, who in (("self", resource.RUSAGE_SELF), ("children", resource.RUSAGE_CHILDREN)):
+        usage = resource.getrusage(who)
+        snapshot[prefix] = {"cpu": usage.ru_utime + usage.ru_stime, "maxrss": usage.ru_maxrss * rss_unit,
+                            "inblock": usage.ru_inblock, "oublock": usage.ru_oublock}
+    return snapshot
+
+
+def process_io_snapshot():
+    """Bytes this process has read and written through syscalls, from /proc/self/io (Linux only)."""
+    try:
+        with open("/proc/self/io") as io_file:
+            fields = dict(line.split(":", 1) for line in io_file)
+        return {"read": int(fields["rchar"]), "written": int(fields["wchar"])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class StageTimer:
+    def __init__(self, name, report=None):
+        """
+        Measure one stage: wall time, CPU time, peak RSS and IO, plus counters the stage records.
+
+        Use it as a context manager (usually through RunReport.stage() or stage()). Counters added
+        with record() while it is open, e.g. frames_encoded or bytes_uploaded, are turned into
+        encode fps and upload throughput when it closes.
+
+        CPU, RSS and IO come from getrusage and /proc, which are per process: when batch jobs run
+        stages concurrently, each stage's figures include whatever ran beside it. thread_cpu_seconds
+        is this thread's own share. Child figures cover subprocesses (ffmpeg) that finished during
+        the stage; peak RSS values are high-water marks, so a stage that raised them shows a jump.
+
+        Parameters:
+        - name (str): Stage name, e.g. "render".
+        - report (RunReport): Report the result is added to when the stage closes.
+        """
+        self.name = name
+        self.report = report
+        self.counters = {}
+        self.counters_lock = threading.Lock()
+        self.result = None
+
+    def add(self, **counters):
+        with self.counters_lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def __enter__(self):
+        active_stages().append(self)
+        self.started_at = time.time()
+        self.start_wall = time.perf_counter()
+        self.start_thread_cpu = time.thread_time()
+        self.start_rusage = rusage_snapshot()
+        self.start_io = process_io_snapshot()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.start_wall
+        result = {"stage": self.name, "status": "failed" if exc_type else "ok", "started_at": self.started_at,
+                  "wall_seconds": wall, "thread_cpu_seconds": time.thread_time() - self.start_thread_cpu}
+        end_rusage = rusage_snapshot()
+        if end_rusage is not None:
+            start_self, end_self = self.start_rusage["self"], end_rusage["self"]
+            start_children, end_children = self.start_rusage["children"], end_rusage["children"]
+            result.update({
+                "cpu_seconds": end_self["cpu"] - start_self["cpu"],
+                "children_cpu_seconds": end_children["cpu"] - start_children["cpu"],
+                "peak_rss_bytes": end_self["maxrss"],
+                "peak_rss_growth_bytes": end_self["maxrss"] - start_self["maxrss"],
+                "children_peak_rss_bytes": end_children["maxrss"],
+                "children_read_bytes": (end_children["inblock"] - start_children["inblock"]) * 512,
+                "children_written_bytes": (end_children["oublock"] - start_children["oublock"]) * 512,
+            })
+        end_io = process_io_snapshot()
+        if end_io is not None and self.start_io is not None:
+            result["read_bytes"] = end_io["read"] - self.start_io["read"]
+            result["written_bytes"] = end_io["written"] - self.start_io["written"]
+        elif end_rusage is not None:
+            result["read_bytes"] = (end_rusage["self"]["inblock"] - self.start_rusage["self"]["inblock"]) * 512
+            result["written_bytes"] = (end_rusage["self"]["oublock"] - self.start_rusage["self"]["oublock"]) * 512
+        result["counters"] = dict(self.counters)
+        if self.counters.get("frames_encoded"):
+            result["encode_fps"] = self.counters["frames_encoded"] / max(wall, 1e-9)
+        if self.counters.get("media_seconds"):
+            result["realtime_factor"] = self.counters["media_seconds"] / max(wall, 1e-9)
+        if self.counters.get("bytes_uploaded"):
+            result["upload_bytes_per_second"] = self.counters["bytes_uploaded"] / max(wall, 1e-9)
+        self.result = result
+
+        stack = active_stages()
+        if self in stack:
+            stack.remove(self)
+        logging.info(f"Stage {self.name} {result['status']} in {wall:.2f}s"
+                     + (f", {result['cpu_seconds'] + result['children_cpu_seconds']:.2f}s CPU, "
+                        f"peak RSS {result['peak_rss_bytes'] / 1024 ** 2:.0f} MiB" if "cpu_seconds" in result else ""))
+        if self.report is not None:
+            self.report.add(result)
+        return False
+
+
+def stage(name, report=None):
+    """
+    Time a block of code as a stage, for use anywhere in the pipeline.
+
+    Without a report, the stage nests under the stage open on this thread (if any) and is
+    reported as "<outer>.<name>" in the outer stage's report; with no stage open it is only logged.
+    """
+    if report is None:
+        stack = active_stages()
+        if stack:
+            return StageTimer(f"{stack[-1].name}.{name}", report=stack[-1].report)
+    return StageTimer(name, report=report)
+
+
+def instrumented(name=None):
+    """Decorator form of stage(): @instrumented("loop_points") times every call of the function."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(**counters):
+    """
+    Add counters (frames_encoded, media_seconds, bytes_uploaded, ...) to the stages open on this thread.
+
+    Outer stages get them too, so a render's frame count includes its nested encodes. Without an
+    open stage this does nothing, so utilities can call it unconditionally.
+    """
+    for timer in active_stages():
+        timer.add(**counters)
+
+
+def current_stage():
+    stack = active_stages()
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def attach(timer):
+    """Let a helper thread record() into a stage opened on another thread (e.g. a pipelined upload)."""
+    stack = active_stages()
+    if timer is not None:
+        stack.append(timer)
+    try:
+        yield timer
+    finally:
+        if timer is not None and timer in stack:
+            stack.remove(timer)
+
+
+class RunReport:
+    textfile_lock = threading.Lock()
+    textfile_runs = {}
+
+    def __init__(self, output_dir, job=None, textfile=None):
+        """
+        Per-run performance report, written to performance.json in the run's output directory.
+
+        The file is rewritten after every stage, so a crashed run still reports what it got through,
+        and a resumed run appends to it.
+        With a textfile path, the latest stage metrics are also written in the Prometheus text format
+        for node_exporter's textfile collector, labelled by job, so regressions across many renders
+        show up on a dashboard.
+
+        Parameters:
+        - output_dir (str): The run's output directory.
+        - job (str): Job label; defaults to the output directory name.
+        - textfile (str): Optional Prometheus textfile path (should end in .prom).
+        """
+        self.output_dir = os.path.abspath(output_dir)
+        self.path = os.path.join(self.output_dir, REPORT_NAME)
+        self.job = job or os.path.basename(self.output_dir)
+        self.textfile = textfile
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.stages = []
+        if os.path.exists(self.path):
+            # A resumed run keeps the stages of its earlier attempts
+            with open(self.path) as report_file:
+                self.stages = json.load(report_file).get("stages", [])
+
+    def stage(self, name):
+        return StageTimer(name, report=self)
+
+    def skipped(self, name, reason="up to date"):
+        self.add({"stage": name, "status": "skipped", "reason": reason, "started_at": time.time(),
+                  "wall_seconds": 0.0})
+
+    def add(self, result):
+        with self.lock:
+            self.stages.append(result)
+        self.save()
+
+    def summary(self):
+        with self.lock:
+            stages = list(self.stages)
+        top_level = [entry for entry in stages if "." not in entry["stage"]]
+        return {
+            "job": self.job,
+            "started_at": self.started_at,
+            "updated_at": time.time(),
+            "wall_seconds": sum(entry["wall_seconds"] for entry in top_level),
+            "cpu_seconds": sum(entry.get("cpu_seconds", 0.0) + entry.get("children_cpu_seconds", 0.0)
+                               for entry in top_level),
+            "peak_rss_bytes": max((entry.get("peak_rss_bytes", 0) for entry in stages), default=0),
+            "failed": [entry["stage"] for entry in stages if entry["status"] == "failed"],
+            "stages": stages,
+        }
+
+    def save(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        summary = self.summary()
+        temp_path = f"{self.path}.tmp"
+        with self.lock:
+            with open(temp_path, "w") as report_file:
+                json.dump(summary, report_file, indent=2)
+            os.replace(temp_path, self.path)
+        if self.textfile:
+            self.write_textfile(summary)
+
+    def write_textfile(self, summary):
+        """Write the latest stage metrics of every run in this process to the Prometheus textfile."""
+        with RunReport.textfile_lock:
+            runs = RunReport.textfile_runs.setdefault(self.textfile, {})
+            runs[self.job] = summary
+            temp_path = f"{self.textfile}.tmp"
+            with open(temp_path, "w") as textfile:
+                textfile.write(prometheus_text(runs.values()))
+            # The collector must never read a half-written file
+            os.replace(temp_path, self.textfile)
+
+
+PROMETHEUS_METRICS = [
+    ("stage_wall_seconds", "wall_seconds", "Wall time of the stage."),
+    ("stage_cpu_seconds", "cpu_seconds", "CPU time of this process during the stage."),
+    ("stage_children_cpu_seconds", "children_cpu_seconds", "CPU time of subprocesses finished during the stage."),
+    ("stage_peak_rss_bytes", "peak_rss_bytes", "Process peak resident set size at the end of the stage."),
+    ("stage_read_bytes", "read_bytes", "Bytes read by this process during the stage."),
+    ("stage_written_bytes", "written_bytes", "Bytes written by this process during the stage."),
+    ("stage_encode_fps", "encode_fps", "Frames encoded per wall-clock second."),
+    ("stage_realtime_factor", "realtime_factor", "Seconds of media produced per wall-clock second."),
+    ("stage_upload_bytes_per_second", "upload_bytes_per_second", "Upload throughput."),
+]
+
+
+def prometheus_text(summaries):
+    """Render run summaries in the Prometheus text exposition format."""
+    lines = []
+    for metric, key, help_text in PROMETHEUS_METRICS:
+        name = f"{METRIC_PREFIX}_{metric}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for summary in summaries:
+            for entry in summary["stages"]:
+                if entry["status"] != "skipped" and entry.get(key) is not None:
+                    lines.append(f'{name}{{job="{summary["job"]}",stage="{entry["stage"]}"}} {entry[key]:.10g}')
+    name = f"{METRIC_PREFIX}_stage_success"
+    lines += [f"# HELP {name} 1 if the stage's last run succeeded or was skipped, 0 if it failed.",
+              f"# TYPE {name} gauge"]
+    for summary in summaries:
+        for entry in summary["stages"]:
+            lines.append(f'{name}{{job="{summary["job"]}",stage="{entry["stage"]}"}} '
+                         f'{0 if entry["status"] == "failed" else 1}')
+    name = f"{METRIC_PREFIX}_run_updated_timestamp_seconds"
+    lines += [f"# HELP {name} When the run's report was last written.", f"# TYPE {name} gauge"]
+    for summary in summaries:
+        lines.append(f'{name}{{job="{summary["job"]}"}} {summary["updated_at"]:.0f}')
+    return "\n".join(lines) + "\n"
+
+
+# Usage example
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the stage table of a run's performance report.")
+    parser.add_argument("output_dir")
+    args = parser.parse_args()
+
+    with open(os.path.join(args.output_dir, REPORT_NAME)) as report_file:
+        report = json.load(report_file)
+    print(f"{report['job']}: {report['wall_seconds']:.2f}s wall, {report['cpu_seconds']:.2f}s CPU, "
+          f"peak RSS {report['peak_rss_bytes'] / 1024 ** 2:.0f} MiB")
+    for entry in report["stages"]:
+        extras = [f"{key}={entry[key]:.1f}" for key in ("encode_fps", "realtime_factor") if key in entry]
+        if "upload_bytes_per_second" in entry:
+            extras.append(f"upload={entry['upload_bytes_per_second'] / 1024 ** 2:.1f} MiB/s")
+        print(f"  {entry['stage']:<24} {entry['status']:<8} {entry['wall_seconds']:>9.2f}s "
+              f"{entry.get('cpu_seconds', 0.0) + entry.get('children_cpu_seconds', 0.0):>9.2f}s CPU  "
+              + " ".join(extras))
@@ -2,18 +2,36 @@ import subprocess
 import logging
 import os
 import time
+import tempfile
+import threading
 from datetime import datetime
 
+from example.utilities.file_watcher import DirectoryWatcher
+
 
 class LogicProAutomation:
-    def __init__(self, scpt_path):
+    def __init__(self, scpt_path, osascript_binary=None, timeout=3 * 60 * 60, stable_seconds=5, exit_grace=30,
+                 output_grace=120):
         """
         Initialize the LogicProAutomation class with the path to the .scpt file.
 
         Parameters:
         - scpt_path (str): Path to the compiled AppleScript (.scpt) file for Logic Pro automation.
+        - osascript_binary (str): Script runner. Defaults to $OSASCRIPT_BINARY or "osascript";
+          point it at fake_osascript.py to exercise the pipeline on Linux without Logic Pro.
+        - timeout (float): Default seconds to wait for a bounce before giving up.
+        - stable_seconds (float): Default time the bounced file must stay unchanged to count as complete.
+        - exit_grace (float): Seconds to wait for osascript to exit after the bounce is complete, so the
+          script can close or save the Logic project before the pipeline moves on.
+        - output_grace (float): Seconds a bounce may take to appear after osascript exits cleanly
+          (Logic Pro can still be writing it); with no file by then the bounce has failed.
         """
         self.scpt_path = os.path.abspath(scpt_path)
+        self.osascript_binary = osascript_binary or os.getenv("OSASCRIPT_BINARY") or "osascript"
+        self.timeout = timeout
+        self.stable_seconds = stable_seconds
+        self.exit_grace = exit_grace
+        self.output_grace = output_grace
         self.temp_file = "/tmp/logic_pro_audio_path.txt"  # Temporary file for passing the audio file path
         self.verify_script_path()
         logging.info(f"LogicProAutomation initialized with script path: {self.scpt_path}")
@@ -34,51 +52,141 @@ class LogicProAutomation:
         self.verify_script_path()
         logging.info(f"Script path updated to: {self.scpt_path}")
 
-    def run_automation(self, target_folder, save_to_folder):
+    def run_automation(self, target_folder, save_to_folder, timeout=None, stable_seconds=None):
         """
         Execute the AppleScript automation for Logic Pro.
 
+        Completion is detected from filesystem events in save_to_folder: the bounce is done once a
+        new file has kept the same size and mtime for stable_seconds. A non-zero osascript exit
+        status fails immediately, as does a clean exit with no bounced file within output_grace,
+        and the whole wait is bounded by timeout. After a complete bounce,
+        osascript gets exit_grace seconds to finish its own cleanup; if it is still running then, it
+        is left to finish in the background and only killed once timeout has passed.
+
         Parameters:
         - target_folder (str): Folder containing the music files to be imported.
         - save_to_folder (str): Dynamic output directory where the bounced file will be saved.
+        - timeout (float): Seconds to wait for the bounce before giving up. Defaults to self.timeout.
+        - stable_seconds (float): How long the file must stay unchanged. Defaults to self.stable_seconds.
+
+        Returns:
+        - str: Path of the bounced file.
+
+        Raises:
+        - RuntimeError: If osascript exits with a non-zero status, or exits without bouncing anything.
+        - TimeoutError: If no stable file appears within the timeout.
         """
+        timeout = self.timeout if timeout is None else timeout
+        stable_seconds = self.stable_seconds if stable_seconds is None else stable_seconds
+        existing_files = self.snapshot(save_to_folder)
+
         # Run the AppleScript with the target and save folders as environment variables
         logging.info("Starting Logic Pro automation for audio looping and export...")
+        env = dict(os.environ, targetFolder=target_folder, saveToFolder=save_to_folder)
+        # A file rather than a pipe, so a chatty script never blocks on a full pipe while we wait
+        stderr_file = tempfile.TemporaryFile()
         process = subprocess.Popen(
-            ["osascript", self.scpt_path],
-            env={"targetFolder": target_folder, "saveToFolder": save_to_folder},
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            [self.osascript_binary, self.scpt_path],
+            env=env, stdout=subprocess.DEVNULL, stderr=stderr_file
         )
 
-        # Monitor the output directory until the new file appears
         logging.info("Waiting for Logic Pro to complete the bounce and save the file...")
+        deadline = time.monotonic() + timeout
         latest_file = None
-        latest_mtime = None
-
-        while True:
-            files = [os.path.join(save_to_folder, f) for f in os.listdir(save_to_folder)]
-            files = [f for f in files if os.path.isfile(f)]
-
-            if not files:
-                time.sleep(1)
-                continue
-
-            most_recent_file = max(files, key=os.path.getmtime)
-            most_recent_mtime = os.path.getmtime(most_recent_file)
-
-            if most_recent_file != latest_file:
-                latest_file = most_recent_file
-                latest_mtime = most_recent_mtime
-                logging.info(f"New file detected: {latest_file}. Waiting for completion...")
-            elif most_recent_mtime == latest_mtime:
-                logging.info(f"File '{latest_file}' appears to be saved completely.")
-                break
-            else:
-                latest_mtime = most_recent_mtime
-
-            time.sleep(1)
-
-        return latest_file
+        latest_signature = None
+        stable_since = None
+        exited_at = None
+        bounced = False
+
+        try:
+            with DirectoryWatcher(save_to_folder) as watcher:
+                while True:
+                    now = time.monotonic()
+                    return_code = process.poll()
+                    if return_code is not None and exited_at is None:
+                        exited_at = now
+                        if return_code != 0:
+                            stderr_file.seek(0)
+                            stderr = stderr_file.read().decode(errors="replace").strip()
+                            raise RuntimeError(f"osascript exited with status {return_code}: {stderr[-2000:]}")
+                        logging.info("osascript finished; waiting for the bounced file to settle...")
+
+                    candidate = self.newest_changed_file(save_to_folder, existing_files)
+                    if candidate:
+                        path, signature = candidate
+                        if path != latest_file:
+                            logging.info(f"New file detected: {path}. Waiting for completion...")
+                        if path != latest_file or signature != latest_signature:
+                            latest_file, latest_signature, stable_since = path, signature, now
+                        elif signature[0] > 0 and now - stable_since >= stable_seconds:
+                            logging.info(f"File '{latest_file}' appears to be saved completely.")
+                            bounced = True
+                            return latest_file
+
+                    has_output = latest_signature is not None and latest_signature[0] > 0
+                    if exited_at is not None and not has_output and now - exited_at >= self.output_grace:
+                        raise RuntimeError(f"osascript exited without bouncing a file into {save_to_folder} "
+                                           f"within {self.output_grace} seconds.")
+                    if now >= deadline:
+                        raise TimeoutError(f"Logic Pro bounce did not finish within {timeout} seconds "
+                                           f"(last file seen: {latest_file}).")
+
+                    # Sleep until the next filesystem event, the end of the stability window or the deadline
+                    wake_at = deadline
+                    if stable_since is not None:
+                        wake_at = min(wake_at, stable_since + stable_seconds)
+                    if return_code is None:
+                        wake_at = min(wake_at, now + 1)
+                    elif not has_output:
+                        wake_at = min(wake_at, exited_at + self.output_grace)
+                    watcher.wait(wake_at - now)
+        finally:
+            if bounced and process.poll() is None:
+                self.wait_for_exit(process, deadline)
+            elif process.poll() is None:
+                process.kill()
+                process.wait()
+            # The child keeps its own handle if it is still finishing in the background
+            stderr_file.close()
+
+    def wait_for_exit(self, process, deadline):
+        """Give osascript exit_grace seconds to finish after a bounce, then reap it in the background."""
+        try:
+            process.wait(timeout=max(0.0, min(self.exit_grace, deadline - time.monotonic())))
+            return
+        except subprocess.TimeoutExpired:
+            pass
+        logging.warning(f"osascript is still running {self.exit_grace} seconds after the bounce; "
+                        f"letting it finish in the background")
+
+        def reap():
+            try:
+                process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logging.warning("osascript did not exit before the Logic Pro timeout; killing it")
+                process.kill()
+                process.wait()
+
+        threading.Thread(target=reap, name="osascript-reaper", daemon=True).start()
+
+    @staticmethod
+    def snapshot(folder):
+        """Map every file in folder to its (size, mtime) signature."""
+        signatures = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    signatures[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def newest_changed_file(self, folder, existing_files):
+        """Return (path, signature) of the most recently modified file that is new or changed since the start."""
+        changed = [(path, signature) for path, signature in self.snapshot(folder).items()
+                   if existing_files.get(path) != signature]
+        if not changed:
+            return None
+        return max(changed, key=lambda item: item[1][1])
 
 
 # Usage example
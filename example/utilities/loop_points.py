@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import hashlib
+import logging
+
+from example.utilities.hashing import file_sha256
+from example.utilities.ffmpeg_tools import run_ffmpeg, probe_media
+from example.utilities.instrumentation import instrumented
+
+
+class LoopPointFinder:
+    def __init__(self, cache_dir=None, analysis_rate=11025, template_seconds=2.0, search_seconds=30.0,
+                 candidate_count=16, video_size=(32, 18), video_search_seconds=5.0, video_window=3):
+        """
+        Find loop-in/loop-out points that make a track or clip repeat without an audible or visible seam.
+
+        Audio: templates taken from the start of the track are matched against the end of the track
+        with FFT-based normalized cross-correlation, all candidates in one batched transform.
+        Video: frames are downsampled to a tiny grayscale thumbnail and every candidate loop-in frame
+        is compared with every candidate loop-out frame through one matrix product.
+
+        Results are cached as JSON per content hash, so each source is analyzed once.
+
+        Parameters:
+        - cache_dir (str): Result cache folder. Defaults to $LOOP_POINT_CACHE_DIR or ~/.cache.
+        - analysis_rate (int): Sample rate the audio is analyzed at.
+        - template_seconds (float): Length of audio that must match across the seam.
+        - search_seconds (float): How far into the start (loop-in) and end (loop-out) to search.
+        - candidate_count (int): Number of loop-in templates tried for audio.
+        - video_size (tuple): Thumbnail size frames are reduced to for matching.
+        - video_search_seconds (float): How far into the start and end of a clip to search.
+        - video_window (int): Consecutive frames compared per candidate, so motion matches too.
+        """
+        self.cache_dir = os.path.abspath(cache_dir or os.getenv("LOOP_POINT_CACHE_DIR") or os.path.join(
+            os.path.expanduser("~"), ".cache", "youtube_sleep_automation", "loop_points"))
+        self.analysis_rate = analysis_rate
+        self.template_seconds = template_seconds
+        self.search_seconds = search_seconds
+        self.candidate_count = candidate_count
+        self.video_size = video_size
+        self.video_search_seconds = video_search_seconds
+        self.video_window = video_window
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def find_audio_loop(self, path, content_hash=None):
+        """
+        Return {"loop_in", "loop_out", "score"} in seconds for an audio file (cached per content hash).
+
+        Playing [0, loop_out) and then repeating [loop_in, loop_out) joins two stretches of audio
+        whose following template_seconds correlate best.
+        """
+        params = {"kind": "audio", "rate": self.analysis_rate, "template": self.template_seconds,
+                  "search": self.search_seconds, "candidates": self.candidate_count}
+        return self.cached(path, content_hash, params, self.analyze_audio)
+
+    def find_video_loop(self, path, content_hash=None):
+        """Return {"loop_in", "loop_out", "score"} in seconds for a video clip (cached per content hash)."""
+        params = {"kind": "video", "size": list(self.video_size), "search": self.video_search_seconds,
+                  "window": self.video_window}
+        return self.cached(path, content_hash, params, self.analyze_video)
+
+    def cached(self, path, content_hash, params, analyze):
+        content_hash = content_hash or file_sha256(path)
+        key = json.dumps({"content_hash": content_hash, **params}, sort_keys=True)
+        cache_path = os.path.join(self.cache_dir, f"{hashlib.sha256(key.encode()).hexdigest()}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path) as cache_file:
+                cached = json.load(cache_file)
+            if cached.get("key") == key:
+                logging.info(f"Loop points for {os.path.basename(path)} loaded from cache: {cached['result']}")
+                return cached["result"]
+
+        start_time = time.time()
+        result = analyze(path)
+        logging.info(f"Found {params['kind']} loop points for {os.path.basename(path)} in "
+                     f"{time.time() - start_time:.2f} seconds: {result}")
+        temp_path = f"{cache_path}.tmp"
+        with open(temp_path, "w") as cache_file:
+            json.dump({"key": key, "source": path, "result": result}, cache_file, indent=2)
+        os.replace(temp_path, cache_path)
+        return result
+
+    @instrumented("audio_loop_analysis")
+    def analyze_audio(self, path):
+        import numpy as np
+        rate = self.analysis_rate
+        raw = run_ffmpeg(["-i", path, "-vn", "-ac", "1", "-ar", str(rate), "-f", "f32le", "pipe:1"],
+                         description=f"loop analysis decode of {os.path.basename(path)}").stdout
+        samples = np.frombuffer(raw, dtype=np.float32)
+        total = len(samples)
+        template = int(self.template_seconds * rate)
+        # Keep the loop at least half the track long: loop-in comes from the first quarter, loop-out from the last
+        search = min(int(self.search_seconds * rate), max(0, total // 4))
+        if search <= template or total < 4 * template:
+            return {"loop_in": 0.0, "loop_out": total / rate, "score": None}
+
+        # Loop-in candidates: evenly spaced templates from the start of the track
+        starts = np.linspace(0, search - template, self.candidate_count).astype(np.int64)
+        templates = samples[starts[:, None] + np.arange(template)]
+
+        # Loop-out search region: the end of the track, leaving room for a full template after loop-out
+        region_start = total - search - template
+        region = samples[region_start:]
+        lags = len(region) - template + 1
+
+        size = 1 << int(np.ceil(np.log2(len(region) + template)))
+        region_spectrum = np.fft.rfft(region, size)
+        template_spectra = np.fft.rfft(templates, size, axis=1)
+        correlation = np.fft.irfft(template_spectra.conj() * region_spectrum, size, axis=1)[:, :lags]
+
+        energy = np.concatenate(([0.0], np.cumsum(region.astype(np.float64) ** 2)))
+        window_norms = np.sqrt(energy[template:template + lags] - energy[:lags])
+        template_norms = np.linalg.norm(templates, axis=1)
+        scores = correlation / (template_norms[:, None] * window_norms[None, :] + 1e-9)
+
+        best_candidate, best_lag = np.unravel_index(np.argmax(scores), scores.shape)
+        return {
+            "loop_in": float(starts[best_candidate] / rate),
+            "loop_out": float((region_start + best_lag) / rate),
+            "score": float(scores[best_candidate, best_lag]),
+        }
+
+    @instrumented("video_loop_analysis")
+    def analyze_video(self, path):
+        import numpy as np
+        info = probe_media(path)
+        fps = info["fps"] or 24
+        width, height = self.video_size
+        raw = run_ffmpeg(["-i", path, "-an", "-vf", f"scale={width}:{height},format=gray",
+                          "-f", "rawvideo", "pipe:1"],
+                         description=f"loop analysis decode of {os.path.basename(path)}").stdout
+        frames = np.frombuffer(raw, dtype=np.uint8)
+        frames = frames[:len(frames) - len(frames) % (width * height)].reshape(-1, width * height).astype(np.float32)
+        count = len(frames)
+        window = self.video_window
+        search = min(int(self.video_search_seconds * fps), max(0, (count - window) // 4))
+        if search < 1:
+            return {"loop_in": 0.0, "loop_out": count / fps, "score": None}
+
+        # distance[i, j]: summed squared difference between frames i.. (loop-in) and j.. (the frame that
+        # would follow loop-out), over `window` consecutive frames
+        heads = frames[:search + window]
+        tails_start = count - search - window + 1
+        tails = frames[tails_start:]
+        squared = ((heads ** 2).sum(axis=1)[:, None] + (tails ** 2).sum(axis=1)[None, :]
+                   - 2.0 * heads @ tails.T)
+        distance = sum(squared[k:k + search, k:k + search] for k in range(window))
+
+        loop_in, offset = np.unravel_index(np.argmin(distance), distance.shape)
+        loop_out = tails_start + offset
+        return {
+            "loop_in": float(loop_in / fps),
+            "loop_out": float(loop_out / fps),
+            "score": float(distance[loop_in, offset] / (window * width * height)),
+        }
@@ -0,0 +1,65 @@
+import os
+import logging
+import tempfile
+import numpy as np
+from moviepy.video.VideoClip import VideoClip
+
+from example.utilities.ffmpeg_tools import run_ffmpeg, probe_media
+
+
+class LoopedVideoClip(VideoClip):
+    def __init__(self, source_path, duration, cache_dir=None, size=None, fps=24, loop_in=None, loop_out=None):
+        """
+        A clip that repeats one source clip for an arbitrary duration at constant cost.
+
+        The source is decoded once into a raw RGB frame cache on disk, which is memory-mapped and
+        indexed by ``t % loop_duration``. Unlike concatenating ``num_loops`` copies of a
+        VideoFileClip, memory use and per-frame lookup cost do not grow with the duration.
+
+        Parameters:
+        - source_path (str): Video file to loop.
+        - duration (float): Total duration of the looped clip in seconds.
+        - cache_dir (str): Directory for the raw frame cache. Defaults to the system temp folder.
+        - size (tuple): Optional (width, height) to scale the source to; defaults to the source size.
+        - fps (float): Frame rate the source is resampled to in the cache.
+        - loop_in (float): Optional start of the looped range in seconds (e.g. from LoopPointFinder).
+        - loop_out (float): Optional end of the looped range in seconds.
+        """
+        info = probe_media(source_path)
+        width, height = size or (info["width"], info["height"])
+        self.source_path = source_path
+        self.loop_fps = fps
+
+        cache_fd, self.cache_path = tempfile.mkstemp(suffix=".rgb", dir=cache_dir)
+        os.close(cache_fd)
+        logging.info(f"Decoding {source_path} into loop frame cache {self.cache_path}...")
+        loop_range = []
+        if loop_in is not None and loop_out is not None:
+            loop_range = ["-ss", f"{loop_in:.6f}", "-t", f"{loop_out - loop_in:.6f}"]
+        run_ffmpeg(loop_range + ["-i", source_path, "-an", "-vf", f"scale={width}:{height},fps={fps}",
+                    "-f", "rawvideo", "-pix_fmt", "rgb24", self.cache_path],
+                   description=f"frame cache decode of {os.path.basename(source_path)}")
+
+        frames = np.memmap(self.cache_path, dtype=np.uint8, mode="r")
+        frame_bytes = width * height * 3
+        self.frames = frames[:len(frames) - len(frames) % frame_bytes].reshape(-1, height, width, 3)
+        if len(self.frames) == 0:
+            self.close()
+            raise ValueError(f"No frames decoded from {source_path}")
+        self.loop_duration = len(self.frames) / fps
+        logging.info(f"Cached {len(self.frames)} frames ({self.loop_duration:.2f}s loop) of {source_path}")
+
+        VideoClip.__init__(self, make_frame=self.frame_at, duration=duration)
+        self.fps = fps
+
+    def frame_at(self, t):
+        """Return the cached frame shown at time t of the looped clip."""
+        index = int((t % self.loop_duration) * self.loop_fps + 1e-6)
+        return self.frames[min(index, len(self.frames) - 1)]
+
+    def close(self):
+        """Release the memory map and delete the frame cache."""
+        self.frames = None
+        if self.cache_path and os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+        self.cache_path = None
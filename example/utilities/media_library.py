@@ -0,0 +1,244 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from urllib.parse import quote
+
+from example.utilities.hashing import file_sha256
+from example.utilities.ffmpeg_tools import probe_media, measure_loudness
+from example.utilities.instrumentation import instrumented
+
+MEDIA_EXTENSIONS = {
+    "music": (".mp3", ".wav"),
+    "video": (".mp4", ".mov", ".m4v", ".mkv", ".webm"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    fps REAL,
+    video_codec TEXT,
+    audio_codec TEXT,
+    loudness REAL,
+    status TEXT NOT NULL DEFAULT 'unused',
+    archived_path TEXT,
+    indexed_at REAL,
+    status_changed_at REAL
+);
+CREATE INDEX IF NOT EXISTS media_selection ON media (kind, status, height, duration);
+CREATE INDEX IF NOT EXISTS media_content_hash ON media (content_hash);
+"""
+
+
+class MediaLibrary:
+    def __init__(self, db_path, measure_loudness=True, read_only=False):
+        """
+        SQLite catalog of the staging music and video files.
+
+        Files are probed once when they appear or change (by size and mtime), so selecting inputs
+        is an indexed query instead of a directory listing followed by opening every candidate.
+
+        Parameters:
+        - db_path (str): SQLite database file; created on first use.
+        - measure_loudness (bool): Run an EBU R128 pass over new music files to record their loudness.
+        - read_only (bool): Only query the catalog, e.g. for a dry run. Nothing is written to disk; a
+          catalog that does not exist yet reads as empty instead of being created.
+        """
+        self.db_path = os.path.abspath(db_path)
+        self.measure_loudness = measure_loudness
+        self.lock = threading.Lock()
+        if read_only and os.path.exists(self.db_path):
+            self.connection = sqlite3.connect(f"file:{quote(self.db_path)}?mode=ro", uri=True, check_same_thread=False)
+        elif read_only:
+            self.connection = sqlite3.connect(":memory:", check_same_thread=False)
+        else:
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        if not read_only or not os.path.exists(self.db_path):
+            with self.connection:
+                self.connection.executescript(SCHEMA)
+
+    @instrumented("media_sync")
+    def sync(self, folder, kind):
+        """
+        Bring the catalog up to date with a staging folder.
+
+        Only files whose size or mtime changed since the last sync are hashed and probed. Unused
+        entries whose file has disappeared are dropped; used and archived entries are kept as history.
+
+        Parameters:
+        - folder (str): Staging folder to scan.
+        - kind (str): "music" or "video".
+
+        Returns:
+        - int: Number of files (re)indexed.
+        """
+        start_time = time.time()
+        extensions = MEDIA_EXTENSIONS[kind]
+        with self.lock:
+            known = {row["path"]: (row["size"], row["mtime_ns"]) for row in self.connection.execute(
+                "SELECT path, size, mtime_ns FROM media WHERE kind = ?", (kind,))}
+
+        seen = set()
+        indexed = 0
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.name.lower().endswith(extensions) or not entry.is_file():
+                    continue
+                path = os.path.abspath(entry.path)
+                stat = entry.stat()
+                seen.add(path)
+                if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                try:
+                    self.index_file(path, kind, stat)
+                    indexed += 1
+                except Exception as e:
+                    logging.error(f"Failed to index {path}: {e}")
+
+        vanished = [path for path in known if path.startswith(os.path.abspath(folder) + os.sep) and path not in seen]
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM media WHERE path = ? AND status = 'unused'",
+                                        [(path,) for path in vanished])
+        logging.info(f"Media library synced {folder}: {indexed} indexed, {len(vanished)} gone, "
+                     f"{time.time() - start_time:.2f} seconds.")
+        return indexed
+
+    def index_file(self, path, kind, stat=None):
+        """
+        Hash and probe one file and upsert its catalog row.
+
+        A different file staged under the path of a used or archived one is a new input, so the row
+        goes back to 'unused' when the content hash changes.
+        """
+        stat = stat or os.stat(path)
+        info = probe_media(path)
+        loudness = measure_loudness(path) if self.measure_loudness and kind == "music" else None
+        row = {
+            "path": path, "kind": kind, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "content_hash": file_sha256(path), "duration": info["duration"],
+            "width": info["width"], "height": info["height"], "fps": info["fps"],
+            "video_codec": info["video_codec"], "audio_codec": info["audio_codec"],
+            "loudness": loudness, "indexed_at": time.time(),
+        }
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{column}" for column in row)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in row if column != "path")
+        # SET expressions see the stored row, so content_hash here is the old hash
+        replaced = "media.content_hash IS NOT excluded.content_hash"
+        updates += (f", status = CASE WHEN {replaced} THEN 'unused' ELSE status END"
+                    f", archived_path = CASE WHEN {replaced} THEN NULL ELSE archived_path END"
+                    f", status_changed_at = CASE WHEN {replaced} THEN excluded.indexed_at ELSE status_changed_at END")
+        with self.lock, self.connection:
+            self.connection.execute(
+                f"INSERT INTO media ({columns}) VALUES ({placeholders}) ON CONFLICT(path) DO UPDATE SET {updates}", row)
+        logging.info(f"Indexed {kind} file {path} ({info['duration']:.1f}s)")
+
+    def select(self, kind, min_height=None, min_duration=None, max_duration=None, folder=None):
+        """
+        Pick the first unused file matching the constraints, e.g. an unused clip of at least 1080p and 20s.
+
+        Parameters:
+        - kind (str): "music" or "video".
+        - min_height (int): Minimum vertical resolution.
+        - min_duration (float): Minimum duration in seconds.
+        - max_duration (float): Maximum duration in seconds.
+        - folder (str): Only consider files inside this folder.
+
+        Returns:
+        - dict: The catalog row, or None if nothing matches.
+        """
+        rows = self.select_many(kind, 1, min_height=min_height, min_duration=min_duration,
+                                max_duration=max_duration, folder=folder)
+        return rows[0] if rows else None
+
+    def select_many(self, kind, count, min_height=None, min_duration=None, max_duration=None, folder=None):
+        """
+        Pick up to `count` unused files matching the constraints, in the same order as select().
+
+        Returns:
+        - list: The catalog rows.
+        """
+        query = "SELECT * FROM media WHERE kind = ? AND status = 'unused'"
+        params = [kind]
+        if min_height is not None:
+            query += " AND height >= ?"
+            params.append(min_height)
+        if min_duration is not None:
+            query += " AND duration >= ?"
+            params.append(min_duration)
+        if max_duration is not None:
+            query += " AND duration <= ?"
+            params.append(max_duration)
+        if folder is not None:
+            query += " AND path >= ? AND path < ?"
+            prefix = os.path.abspath(folder) + os.sep
+            params += [prefix, prefix[:-1] + chr(ord(os.sep) + 1)]
+        query += " ORDER BY path LIMIT ?"
+        params.append(count)
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def pending(self, folder, kind):
+        """
+        List the files sync() would (re)index: new in the folder or changed since their last sync.
+
+        Only stats the files, so it is cheap enough for a dry run to tell whether the catalog is current.
+        """
+        extensions = MEDIA_EXTENSIONS[kind]
+        with self.lock:
+            known = {row["path"]: (row["size"], row["mtime_ns"]) for row in self.connection.execute(
+                "SELECT path, size, mtime_ns FROM media WHERE kind = ?", (kind,))}
+        pending = []
+        if not os.path.isdir(folder):
+            return pending
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.name.lower().endswith(extensions) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if known.get(os.path.abspath(entry.path)) != (stat.st_size, stat.st_mtime_ns):
+                    pending.append(os.path.abspath(entry.path))
+        return sorted(pending)
+
+    def get(self, path):
+        """Return the catalog row for a path, or None."""
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM media WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        return dict(row) if row else None
+
+    def set_status(self, path, status, archived_path=None):
+        """
+        Mark a file as 'unused', 'used' or 'archived'.
+
+        Parameters:
+        - path (str): Path the file was indexed under.
+        - status (str): New status.
+        - archived_path (str): Where the file was moved to, for archived entries.
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE media SET status = ?, archived_path = COALESCE(?, archived_path), status_changed_at = ? "
+                "WHERE path = ?", (status, archived_path, time.time(), os.path.abspath(path)))
+
+    def mark_unused(self, path):
+        self.set_status(path, "unused")
+
+    def mark_used(self, path):
+        self.set_status(path, "used")
+
+    def mark_archived(self, path, archived_path=None):
+        self.set_status(path, "archived", archived_path)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
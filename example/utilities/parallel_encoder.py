@@ -0,0 +1,415 @@
+import os
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from example.utilities.ffmpeg_tools import run_ffmpeg, probe_media, concat_segments, open_ffmpeg_reader
+from example.utilities.stream_renderer import plan_timeline, write_concat_list, verify_av_sync
+from example.utilities.encode_profiles import get_profile
+from example.utilities.checkpoint import partial_path_for
+from example.utilities.hashing import file_sha256
+from example.utilities.instrumentation import record
+
+# Every streamed segment is shifted by this much, so no segment's leading B-frame DTS goes negative
+STREAM_TS_BASE_OFFSET = 10.0
+
+
+def build_timeline_parts(plan, intro_path, video_file):
+    """
+    Turn a frame plan into the ordered list of sources that make up the output timeline.
+
+    Each part is a dict with the source kind ("file", "loop" or "black"), its path and its
+    length in frames. "loop" parts repeat their source every ``unit_frames`` frames.
+    """
+    parts = []
+    if plan["intro_frames"]:
+        parts.append({"kind": "file", "path": intro_path, "frames": plan["intro_frames"]})
+    if plan["loop_frames"]:
+        parts.append({"kind": "loop", "path": video_file, "frames": plan["loop_frames"],
+                      "unit_frames": plan["loop_unit_frames"]})
+    if plan["black_frames"]:
+        parts.append({"kind": "black", "path": None, "frames": plan["black_frames"]})
+    return parts
+
+
+def split_frames(total_frames, segment_count, gop):
+    """
+    Split [0, total_frames) into at most segment_count ranges whose boundaries fall on multiples of gop.
+
+    Every segment is encoded independently and so starts with a keyframe; keeping the boundaries on
+    the fixed GOP grid means the joined stream has the same keyframe layout as a single-process encode.
+    """
+    segment_count = max(1, segment_count)
+    gops = -(-total_frames // gop)
+    gops_per_segment = max(1, -(-gops // segment_count))
+    step = gops_per_segment * gop
+    return [(start, min(start + step, total_frames)) for start in range(0, total_frames, step)]
+
+
+def encode_range(job):
+    """
+    Encode frames [start, end) of the timeline into one segment file.
+
+    Module-level so it can run in a ProcessPoolExecutor worker. Only the sources that overlap the
+    range are opened, each seeked to its local offset, so no worker decodes the timeline from zero.
+    """
+    fps = job["fps"]
+    width, height = job["size"]
+    inputs, filters, labels = [], [], []
+    part_start = 0
+    for part in job["parts"]:
+        part_end = part_start + part["frames"]
+        overlap_start, overlap_end = max(job["start"], part_start), min(job["end"], part_end)
+        if overlap_start < overlap_end:
+            offset = overlap_start - part_start
+            if part["kind"] == "loop":
+                offset %= part["unit_frames"]
+                inputs += ["-stream_loop", "-1", "-ss", f"{offset / fps:.6f}", "-i", part["path"]]
+            elif part["kind"] == "file":
+                inputs += ["-ss", f"{offset / fps:.6f}", "-i", part["path"]]
+            else:
+                inputs += ["-f", "lavfi", "-i", f"color=c=black:s={width}x{height}:r={fps}"]
+            index = len(labels)
+            filters.append(f"[{index}:v]scale={width}:{height},setsar=1,fps={fps},"
+                           f"tpad=stop=-1:stop_mode=clone,trim=end_frame={overlap_end - overlap_start},"
+                           f"setpts=PTS-STARTPTS[v{index}]")
+            labels.append(f"[v{index}]")
+        part_start = part_end
+
+    filters.append(f"{''.join(labels)}concat=n={len(labels)}:v=1:a=0,format={job['pix_fmt']}[out]")
+    args = (inputs + ["-filter_complex", ";".join(filters), "-map", "[out]", "-an",
+                      "-frames:v", str(job["end"] - job["start"])] + job["encoder_args"]
+            + ["-g", str(job["gop"]), "-keyint_min", str(job["gop"]), "-sc_threshold", "0",
+               "-threads", str(job["threads"]), "-video_track_timescale", "90000"])
+    run_ffmpeg(args + [job["output"]], description=f"segment {job['start']}-{job['end']} encode")
+    return job["output"]
+
+
+class SegmentFeeder:
+    def __init__(self, entries, reader=open_ffmpeg_reader):
+        """
+        Stream finished segments, in timeline order, into the final join as one MPEG-TS stream.
+
+        Segments finish out of order on the process pool; feed() waits for each one in turn and
+        remuxes it with its timeline start as the timestamp offset, so the join (and a pipelined
+        upload behind it) runs while later segments are still being encoded.
+
+        Parameters:
+        - entries (list): (segment path, frame count, frame rate) tuples in playback order.
+        - reader (callable): Starts the remux of one segment; open_ffmpeg_reader by default.
+        """
+        self.entries = entries
+        self.reader = reader
+        self.done = set()
+        self.error = None
+        self.condition = threading.Condition()
+
+    def mark_done(self, path):
+        with self.condition:
+            self.done.add(path)
+            self.condition.notify_all()
+
+    def fail(self, error):
+        """Stop feeding because a segment could not be encoded."""
+        with self.condition:
+            self.error = error
+            self.condition.notify_all()
+
+    def wait_for(self, path):
+        with self.condition:
+            while path not in self.done and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise RuntimeError(f"Segment encoding failed: {self.error}")
+
+    def feed(self, stdin):
+        offset = 0.0
+        for path, frames, fps in self.entries:
+            self.wait_for(path)
+            process = self.reader(["-i", path, "-map", "0:v:0", "-c", "copy", "-f", "mpegts",
+                                   "-muxdelay", "0", "-muxpreload", "0",
+                                   "-output_ts_offset", f"{STREAM_TS_BASE_OFFSET + offset:.6f}", "pipe:1"],
+                                  description=f"stream of {os.path.basename(path)}")
+            try:
+                shutil.copyfileobj(process.stdout, stdin)
+                stderr = process.stderr.read()
+                process.wait()
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+                process.stderr.close()
+            if process.returncode != 0:
+                stderr = stderr.decode(errors="replace").strip()
+                raise RuntimeError(f"Streaming {path} failed with exit code {process.returncode}: {stderr[-2000:]}")
+            offset += frames / fps
+
+
+class ParallelSegmentEncoder:
+    def __init__(self, workers=None, profile=None, audio_codec="copy"):
+        """
+        Encode the full timeline as keyframe-aligned segments spread over a process pool.
+
+        The intro and looped clip are encoded at the profile's main frame rate and the black tail at
+        its tail frame rate, as separate runs of segments joined into one variable-frame-rate file.
+        The profile's GOP is fixed (no scene-cut keyframes) and segment boundaries are multiples of it.
+
+        Parameters:
+        - workers (int): Number of encoder processes. Defaults to the CPU count.
+        - profile (EncodeProfile): Export settings. Defaults to the "default" profile.
+        - audio_codec (str): Codec for the muxed audio track. "copy" muxes the looped audio as-is.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.profile = profile or get_profile("default")
+        self.fps = self.profile.fps
+        self.audio_codec = audio_codec
+
+    def render(self, intro_path, video_file, audio_path, output_video_path, duration_hours, work_dir=None,
+               video_loop=None, manifest=None, pipeline=None):
+        """
+        Build the final video with an intro, looped segment and black tail using all workers.
+
+        Parameters:
+        - intro_path (str): Path to the intro video.
+        - video_file (str): Path to the main video file to loop.
+        - audio_path (str): Path to the audio file.
+        - output_video_path (str): Path where the final video will be saved.
+        - duration_hours (float): Desired total duration of the video in hours.
+        - work_dir (str): Directory for intermediate segments. Defaults to a folder next to the output.
+        - video_loop (dict): Optional loop_in/loop_out seconds from LoopPointFinder; only that range
+          of the clip is repeated.
+        - manifest (RenderManifest): Optional checkpoint manifest; segments it lists as complete are
+          reused and only the missing ones are encoded, so an interrupted render can be resumed.
+        - pipeline (PipelinedUpload): Optional; segments are joined and uploaded as they finish
+          instead of after the last one.
+        """
+        start_time = time.time()
+        work_dir = work_dir or os.path.join(os.path.dirname(os.path.abspath(output_video_path)), "segments")
+        os.makedirs(work_dir, exist_ok=True)
+
+        video_info = probe_media(video_file)
+        size = (video_info["width"], video_info["height"])
+        loop_source = video_file
+        if video_loop:
+            loop_source = os.path.join(work_dir, "loop_source.mkv")
+            extract = lambda path: self.extract_loop_range(video_file, video_loop, path)
+            if manifest is None:
+                extract(loop_source)
+            else:
+                # Keyed by content, so a different clip saved under the same path is extracted again
+                manifest.checkpoint_segment(loop_source, {"kind": "loop_source", "source": file_sha256(video_file),
+                                                          "loop": video_loop, "fps": self.fps}, extract)
+            video_info = probe_media(loop_source)
+        plan = plan_timeline(probe_media(intro_path)["duration"], video_info["duration"],
+                             probe_media(audio_path)["duration"], duration_hours * 60 * 60, self.fps,
+                             self.profile.black_fps)
+        parts = build_timeline_parts(plan, intro_path, loop_source)
+        if manifest is not None:
+            # Segments are checkpointed by their parts; hash the sources so a replaced file invalidates them
+            for part in parts:
+                if part["path"]:
+                    part["source"] = file_sha256(part["path"])
+        # The black tail runs at its own frame rate, so it is split into segments of its own
+        sections = [([part for part in parts if part["kind"] != "black"], plan["intro_frames"] + plan["loop_frames"],
+                     plan["fps"]),
+                    ([part for part in parts if part["kind"] == "black"], plan["black_frames"], plan["black_fps"])]
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        jobs = []
+        for section_parts, frames, fps in sections:
+            for start, end in split_frames(frames, self.workers, self.profile.gop):
+                jobs.append({
+                    "parts": section_parts, "start": start, "end": end, "size": size, "fps": fps,
+                    "encoder_args": self.profile.encoder_args(), "pix_fmt": self.profile.pix_fmt,
+                    "gop": self.profile.gop, "threads": threads,
+                    "output": os.path.join(work_dir, f"segment_{len(jobs):05d}.mp4"),
+                })
+
+        entries = [(job["output"], job["end"] - job["start"], job["fps"]) for job in jobs]
+        list_path = os.path.join(work_dir, "segments.ffconcat")
+        write_concat_list(list_path, entries)
+
+        if pipeline is None:
+            self.encode_segments(jobs, manifest)
+            joined = False
+        else:
+            joined = self.encode_streamed(jobs, entries, manifest, pipeline, output_video_path, audio_path, plan)
+        if not joined:
+            concat_segments(list_path, output_video_path, audio_path=audio_path, audio_codec=self.audio_codec,
+                            audio_bitrate=self.profile.audio_bitrate, duration=plan["duration"])
+            verify_av_sync(output_video_path, plan)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        record(media_seconds=plan["duration"])
+
+        elapsed_time = time.time() - start_time
+        logging.info(f"Parallel render on {self.workers} workers finished in {elapsed_time:.2f} seconds.")
+        return output_video_path
+
+    def encode_streamed(self, jobs, entries, manifest, pipeline, output_video_path, audio_path, plan):
+        """
+        Encode the segments while a second thread joins and uploads them in order as they finish.
+
+        Returns:
+        - bool: True if the streamed join passed the A/V checks. Otherwise the pipelined upload is
+          aborted and the caller joins the finished segments the usual way.
+        """
+        feeder = SegmentFeeder(entries)
+        errors = []
+
+        def join():
+            try:
+                concat_segments(None, output_video_path, audio_path=audio_path, audio_codec=self.audio_codec,
+                                audio_bitrate=self.profile.audio_bitrate, duration=plan["duration"],
+                                pipeline=pipeline, feed=feeder.feed)
+            except Exception as e:
+                errors.append(e)
+
+        join_thread = threading.Thread(target=join, name="streamed-join", daemon=True)
+        join_thread.start()
+        try:
+            self.encode_segments(jobs, manifest, on_done=feeder.mark_done)
+        except Exception as e:
+            feeder.fail(e)
+            join_thread.join()
+            raise
+        join_thread.join()
+        if not errors:
+            try:
+                verify_av_sync(output_video_path, plan)
+                return True
+            except RuntimeError as e:
+                errors.append(e)
+        logging.warning(f"Streamed join failed, joining the finished segments instead: {errors[0]}")
+        pipeline.abort()
+        return False
+
+    def encode_segments(self, jobs, manifest=None, on_done=None):
+        """
+        Encode every job's segment in the process pool, skipping segments the manifest lists as complete.
+
+        Workers write to a partial file that is renamed into place (and checkpointed) as each one
+        finishes, so a crash loses at most the segments that were in flight. on_done, if given, is
+        called with each segment's path once it is in place, reused segments included.
+        """
+        pending = [job for job in jobs if manifest is None or not manifest.segment_done(job["output"], job)]
+        if on_done is not None:
+            for job in jobs:
+                if job not in pending:
+                    on_done(job["output"])
+        if len(pending) < len(jobs):
+            logging.info(f"Checkpoint: reusing {len(jobs) - len(pending)} of {len(jobs)} completed segments")
+        logging.info(f"Encoding {sum(job['end'] - job['start'] for job in pending)} frames as {len(pending)} "
+                     f"segments on {self.workers} workers...")
+        if not pending:
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(encode_range, dict(job, output=partial_path_for(job["output"]))): job
+                       for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                os.replace(future.result(), job["output"])
+                record(frames_encoded=job["end"] - job["start"])
+                if manifest is not None:
+                    manifest.mark_segment_done(job["output"], job)
+                if on_done is not None:
+                    on_done(job["output"])
+
+    def extract_loop_range(self, video_file, video_loop, output_path):
+        """
+        Cut [loop_in, loop_out) of the clip into a lossless intermediate that -stream_loop can repeat.
+
+        The clip is only seconds long, so this costs far less than the segments it feeds.
+        """
+        frames = max(1, int(round((video_loop["loop_out"] - video_loop["loop_in"]) * self.fps)))
+        run_ffmpeg(["-ss", f"{video_loop['loop_in']:.6f}", "-i", video_file, "-an",
+                    "-vf", f"fps={self.fps},tpad=stop=-1:stop_mode=clone", "-frames:v", str(frames),
+                    "-c:v", "libx264", "-qp", "0", "-preset", "ultrafast", output_path],
+                   description=f"loop range extract of {os.path.basename(video_file)}")
+        return output_path
+
+
+def create_synthetic_sources(folder, clip_seconds=10, size=(1280, 720)):
+    """Generate a synthetic intro, loop clip and audio track with ffmpeg's lavfi sources."""
+    width, height = size
+    intro_path = os.path.join(folder, "intro.mp4")
+    video_path = os.path.join(folder, "clip.mp4")
+    audio_path = os.path.join(folder, "audio.m4a")
+    run_ffmpeg(["-f", "lavfi", "-i", f"testsrc2=s={width}x{height}:r=24:d=3", "-pix_fmt", "yuv420p", intro_path],
+               description="synthetic intro")
+    run_ffmpeg(["-f", "lavfi", "-i", f"mandelbrot=s={width}x{height}:r=24", "-t", str(clip_seconds),
+                "-pix_fmt", "yuv420p", video_path], description="synthetic clip")
+    run_ffmpeg(["-f", "lavfi", "-i", "sine=frequency=220:sample_rate=44100", "-t", "3600",
+                "-c:a", "aac", audio_path], description="synthetic audio")
+    return intro_path, video_path, audio_path
+
+
+def benchmark(duration_seconds=120, workers=None, size=(1280, 720), profile="default"):
+    """
+    Compare the single-process moviepy render (write_videofile) against the segmented process pool.
+
+    Both renders use the same encode profile, intro, clip and audio, so the timeline (including the
+    black tail at the profile's black_fps) is the same. Each renderer is called directly rather than
+    through create_video_with_black_screen, whose moviepy fallback would hide a failing parallel render.
+
+    Parameters:
+    - duration_seconds (float): Output duration.
+    - workers (int): Encoder processes for the parallel render. Defaults to the CPU count.
+    - size (tuple): Resolution of the synthetic sources.
+    - profile (str): Encode profile name.
+
+    Returns:
+    - dict: Wall times for both runs and the resulting speedup.
+    """
+    from example.example import ExampleShell
+
+    workers = workers or os.cpu_count() or 1
+    duration_hours = duration_seconds / 3600
+    with tempfile.TemporaryDirectory() as folder:
+        intro_path, video_path, audio_path = create_synthetic_sources(folder, size=size)
+        shell = ExampleShell(configs={"media_library_path": os.path.join(folder, "media_library.sqlite3"),
+                                      "segment_cache_dir": os.path.join(folder, "segment_cache"),
+                                      "render_mode": "moviepy", "encode_profile": profile}, run=False)
+        shell.intro_path = intro_path
+        renders = {
+            "moviepy": lambda output_path, job_dir: shell.create_video_with_moviepy(
+                video_path, audio_path, output_path, duration_hours, output_dir=job_dir),
+            "parallel": lambda output_path, job_dir: ParallelSegmentEncoder(
+                workers=workers, profile=shell.encode_profile).render(
+                intro_path, video_path, audio_path, output_path, duration_hours,
+                work_dir=os.path.join(job_dir, "segments")),
+        }
+        timings = {}
+        for label, render in renders.items():
+            job_dir = os.path.join(folder, label)
+            os.makedirs(job_dir)
+            start_time = time.time()
+            render(os.path.join(job_dir, "final_output_video.mp4"), job_dir)
+            timings[label] = time.time() - start_time
+
+    result = {
+        "duration_seconds": duration_seconds,
+        "workers": workers,
+        "profile": profile,
+        "moviepy_seconds": round(timings["moviepy"], 3),
+        "parallel_seconds": round(timings["parallel"], 3),
+        "speedup": round(timings["moviepy"] / timings["parallel"], 2),
+    }
+    logging.info(f"Parallel encoding benchmark: {result}")
+    return result
+
+
+# Benchmark entry point
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Benchmark segmented parallel encoding against the moviepy render.")
+    parser.add_argument("--duration", type=float, default=120, help="Output duration in seconds.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--profile", default="default", help="Encode profile used by both renders.")
+    args = parser.parse_args()
+
+    benchmark(duration_seconds=args.duration, workers=args.workers, profile=args.profile)
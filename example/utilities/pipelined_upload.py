@@ -0,0 +1,182 @@
+import time
+import logging
+import threading
+import subprocess
+
+from example.utilities.ffmpeg_tools import open_ffmpeg_reader
+from example.utilities.instrumentation import attach, current_stage
+
+
+class FollowingFileReader:
+    def __init__(self, path, pipeline, poll_interval=0.2):
+        """
+        Read a file that is still being written, like `tail -f`, until its writer is done.
+
+        Parameters:
+        - path (str): File being written.
+        - pipeline (PipelinedUpload): Owner whose writer state decides between waiting, EOF and failure.
+        - poll_interval (float): Sleep while waiting for more bytes.
+        """
+        self.file = open(path, "rb")
+        self.pipeline = pipeline
+        self.poll_interval = poll_interval
+
+    def read(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.file.read(size - len(data))
+            if chunk:
+                data += chunk
+                continue
+            if self.pipeline.writer_error is not None:
+                raise RuntimeError(f"Render feeding the upload failed: {self.pipeline.writer_error}")
+            if self.pipeline.written.is_set():
+                # Catch bytes flushed between the last read and the writer finishing
+                chunk = self.file.read(size - len(data))
+                if not chunk:
+                    break
+                data += chunk
+                continue
+            time.sleep(self.poll_interval)
+        return bytes(data)
+
+    def close(self):
+        self.file.close()
+
+
+class PipelinedUpload:
+    def __init__(self, start_upload):
+        """
+        Upload the final video while it is being written instead of after it is finished.
+
+        The renderer's final join writes a fragmented MP4 to a pipe; run() copies it into the
+        output file while a background thread follows that file and feeds it into a resumable
+        upload session. Fragmented MP4 has no trailing index to patch, so every byte is final as
+        soon as it is written. The last chunk is held back until finish(), so a render that
+        fails its checks can still be abandoned without publishing anything.
+
+        Parameters:
+        - start_upload (callable): Returns a started ResumableUpload session.
+        """
+        self.start_upload = start_upload
+        self.written = threading.Event()
+        self.release = threading.Event()
+        self.writer_error = None
+        self.feed_error = None
+        self.aborted = False
+        self.thread = None
+        self.result = None
+        self.error = None
+        self.render_finished_at = None
+        # Bytes uploaded from the background thread count towards the stage that started the render
+        self.stage = current_stage()
+
+    @property
+    def started(self):
+        return self.thread is not None
+
+    def run(self, ffmpeg_args, output_path, description="pipelined render", feed=None):
+        """
+        Run ffmpeg writing fragmented MP4 to stdout, tee it into output_path and upload it as it grows.
+
+        Returns once output_path is complete; the upload keeps going in the background.
+
+        Parameters:
+        - feed (callable): Optional; called on a separate thread with ffmpeg's stdin to stream the
+          input while the output is read. ffmpeg is killed if it raises.
+        """
+        with open(output_path, "wb") as output:
+            self.thread = threading.Thread(target=self.upload, args=(output_path,), name="pipelined-upload",
+                                           daemon=True)
+            self.thread.start()
+            process = open_ffmpeg_reader(ffmpeg_args + ["pipe:1"], description=description,
+                                         stdin=subprocess.PIPE if feed is not None else subprocess.DEVNULL)
+            feeder = None
+            if feed is not None:
+                feeder = threading.Thread(target=self.feed_input, args=(feed, process),
+                                          name="pipelined-upload-feed", daemon=True)
+                feeder.start()
+            try:
+                while True:
+                    data = process.stdout.read(1024 * 1024)
+                    if not data:
+                        break
+                    output.write(data)
+                    output.flush()
+                stderr = process.stderr.read()
+                process.wait()
+                if feeder is not None:
+                    feeder.join()
+                    if self.feed_error is not None:
+                        raise RuntimeError(f"{description} input failed: {self.feed_error}")
+                if process.returncode != 0:
+                    stderr = stderr.decode(errors="replace").strip()
+                    raise RuntimeError(f"{description} failed with exit code {process.returncode}: {stderr[-2000:]}")
+            except Exception as e:
+                self.writer_error = e
+                process.kill()
+                raise
+            finally:
+                process.stdout.close()
+                process.stderr.close()
+                self.written.set()
+        self.render_finished_at = time.time()
+        return output_path
+
+    def feed_input(self, feed, process):
+        try:
+            with attach(self.stage):
+                feed(process.stdin)
+        except Exception as e:
+            self.feed_error = e
+            process.kill()
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    def upload(self, output_path):
+        reader = None
+        try:
+            session = self.start_upload()
+            reader = FollowingFileReader(output_path, self)
+            with attach(self.stage):
+                self.result = session.upload_stream(reader, before_finalize=self.wait_for_release)
+        except Exception as e:
+            self.error = e
+            logging.error(f"Pipelined upload of {output_path} stopped: {e}")
+        finally:
+            if reader is not None:
+                reader.close()
+
+    def wait_for_release(self):
+        self.release.wait()
+        if self.aborted:
+            raise RuntimeError("Pipelined upload aborted before the final chunk")
+
+    def finish(self):
+        """
+        Send the final chunk and wait for the upload to complete.
+
+        Returns:
+        - dict: The uploaded video resource, or None if the pipeline never ran or the upload failed
+          (the caller can then upload the finished file the usual way).
+        """
+        if not self.started:
+            return None
+        self.release.set()
+        self.thread.join()
+        if self.render_finished_at is not None and self.result is not None:
+            logging.info(f"Pipelined upload finished {time.time() - self.render_finished_at:.2f} seconds "
+                         f"after the render.")
+        return self.result
+
+    def abort(self):
+        """Stop the upload without finalizing it, e.g. because the render failed."""
+        self.aborted = True
+        if self.writer_error is None and not self.written.is_set():
+            self.writer_error = RuntimeError("render aborted")
+        self.release.set()
+        if self.started:
+            self.thread.join()
@@ -0,0 +1,331 @@
+import os
+import json
+import time
+import random
+import logging
+import argparse
+
+from example.utilities.instrumentation import record
+
+UPLOAD_URL = "https://www.googleapis.com/upload/youtube/v3/videos"
+# Every chunk except the last must be a multiple of 256 KiB
+CHUNK_ALIGNMENT = 256 * 1024
+RESUME_INCOMPLETE = 308
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+class RetryableUploadError(Exception):
+    """A chunk failed in a way worth retrying (5xx, 429, timeouts)."""
+
+
+class QuotaExceededError(RuntimeError):
+    """The API refused to open an upload session because the project's daily quota is used up."""
+
+
+def align_chunk(size, minimum=CHUNK_ALIGNMENT, maximum=None):
+    """Round a chunk size down to a multiple of 256 KiB within [minimum, maximum]."""
+    if maximum is not None:
+        size = min(size, maximum)
+    return max(minimum, int(size) // CHUNK_ALIGNMENT * CHUNK_ALIGNMENT)
+
+
+class ResumableUpload:
+    def __init__(self, session, upload_url=None, chunk_size=8 * 1024 * 1024, timeout=300, state_path=None,
+                 min_chunk_size=CHUNK_ALIGNMENT, max_chunk_size=256 * 1024 * 1024, target_chunk_seconds=8.0,
+                 max_retries=8, backoff_base=1.0, backoff_cap=64.0):
+        """
+        YouTube resumable upload session that can be fed from a stream of unknown length.
+
+        Unlike MediaFileUpload, which needs the finished file, chunks are sent as soon as enough
+        bytes are available, with "bytes a-b/*" ranges until the stream ends and the total is known.
+        Chunk sizes follow the measured throughput so each PUT takes about target_chunk_seconds.
+        Failed chunks are retried with exponential backoff and full jitter, after asking the server
+        how much it actually kept. With a state_path, the session URI and acknowledged offset are
+        saved after every chunk so a new process can pick the upload up again with restore().
+
+        Parameters:
+        - session: requests-compatible session; an AuthorizedSession for YouTube, a plain
+          requests.Session for the local FakeUploadServer.
+        - upload_url (str): Upload endpoint. Defaults to $YOUTUBE_UPLOAD_URL or the YouTube API.
+        - chunk_size (int): Size of the first chunk, rounded down to a multiple of 256 KiB.
+        - timeout (float): Seconds allowed per HTTP request.
+        - state_path (str): JSON file the session URI and offset are persisted to.
+        - min_chunk_size (int): Smallest chunk adaptive sizing may choose.
+        - max_chunk_size (int): Largest chunk adaptive sizing may choose (bounds memory use).
+        - target_chunk_seconds (float): Wall time each chunk should take at the measured throughput.
+        - max_retries (int): Consecutive failed attempts tolerated for one chunk.
+        - backoff_base (float): First backoff ceiling in seconds; doubles with every failed attempt.
+        - backoff_cap (float): Largest backoff ceiling in seconds.
+        """
+        self.session = session
+        self.upload_url = upload_url or os.getenv("YOUTUBE_UPLOAD_URL") or UPLOAD_URL
+        self.min_chunk_size = align_chunk(min_chunk_size)
+        self.max_chunk_size = align_chunk(max_chunk_size, self.min_chunk_size)
+        self.chunk_size = align_chunk(chunk_size, self.min_chunk_size, self.max_chunk_size)
+        self.timeout = timeout
+        self.state_path = state_path
+        self.target_chunk_seconds = target_chunk_seconds
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.session_uri = None
+        self.offset = 0
+        self.media = None
+        self.completed = None
+        self.throughput = None
+        self.metrics = []
+
+    def start(self, metadata, part="snippet,status", content_type="video/mp4", media_path=None):
+        """
+        Open the upload session with the video metadata and remember its session URI.
+
+        Parameters:
+        - metadata (dict): The videos.insert body (snippet, status).
+        - part (str): Resource parts set by the metadata.
+        - content_type (str): MIME type of the media.
+        - media_path (str): The finished file being uploaded, recorded so restore() can check it is unchanged.
+        """
+        response = self.session.request(
+            "POST", f"{self.upload_url}?uploadType=resumable&part={part}",
+            data=json.dumps(metadata),
+            headers={"Content-Type": "application/json; charset=UTF-8", "X-Upload-Content-Type": content_type},
+            timeout=self.timeout)
+        if response.status_code == 403 and "quotaExceeded" in response.text:
+            raise QuotaExceededError(f"Upload quota exceeded: {response.text[:500]}")
+        if response.status_code != 200 or "Location" not in response.headers:
+            raise RuntimeError(f"Failed to start resumable upload: HTTP {response.status_code} {response.text[:500]}")
+        self.session_uri = response.headers["Location"]
+        self.offset = 0
+        self.media = media_fingerprint(media_path) if media_path else None
+        self.save_state()
+        logging.info(f"Resumable upload session started: {self.session_uri}")
+        return self.session_uri
+
+    def restore(self, media_path=None):
+        """
+        Pick up a session saved by an earlier process.
+
+        Returns:
+        - bool: True if the saved session is still open for this (unchanged) file and offset now
+          holds the bytes the server has; False if there is nothing usable to resume.
+        """
+        if not self.state_path or not os.path.exists(self.state_path):
+            return False
+        with open(self.state_path) as state_file:
+            state = json.load(state_file)
+        if media_path and state.get("media") != media_fingerprint(media_path):
+            logging.warning(f"{media_path} changed since the saved upload session; starting over.")
+            self.clear_state()
+            return False
+        self.session_uri = state["session_uri"]
+        self.media = state.get("media")
+        self.chunk_size = align_chunk(state.get("chunk_size", self.chunk_size), self.min_chunk_size,
+                                      self.max_chunk_size)
+        try:
+            self.offset, resource = self.query_offset()
+        except RuntimeError as e:
+            # Expired or unknown session; transient errors propagate and keep the state for a later try
+            logging.warning(f"Saved upload session {self.session_uri} is no longer usable ({e}); starting over.")
+            self.clear_state()
+            return False
+        if resource is not None:
+            # Finished in the earlier process, which died before recording the result
+            self.offset = None
+            self.completed = resource
+            return True
+        logging.info(f"Resuming upload session {self.session_uri} at byte {self.offset}")
+        return True
+
+    def save_state(self):
+        if not self.state_path:
+            return
+        state = {"session_uri": self.session_uri, "offset": self.offset, "media": self.media,
+                 "chunk_size": self.chunk_size, "upload_url": self.upload_url, "updated_at": time.time()}
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w") as state_file:
+            json.dump(state, state_file, indent=2)
+        os.replace(temp_path, self.state_path)
+
+    def clear_state(self):
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def query_offset(self):
+        """
+        Ask the server how many bytes of the session it holds.
+
+        Returns:
+        - tuple: (bytes received, the video resource if the upload is already complete).
+        """
+        response = self.session.request("PUT", self.session_uri, data=b"",
+                                        headers={"Content-Range": "bytes */*"}, timeout=self.timeout)
+        if response.status_code in (200, 201):
+            return None, response.json()
+        if response.status_code == RESUME_INCOMPLETE:
+            return acknowledged_bytes(response.headers.get("Range")), None
+        if response.status_code in RETRYABLE_STATUS:
+            raise RetryableUploadError(f"Status query failed: HTTP {response.status_code}")
+        raise RuntimeError(f"Upload session status query failed: HTTP {response.status_code} {response.text[:500]}")
+
+    def send_chunk(self, data, total=None):
+        """
+        PUT one chunk at the current offset.
+
+        Returns:
+        - tuple: (bytes the server has acknowledged in total, the video resource once the upload is complete).
+        """
+        total_text = "*" if total is None else str(total)
+        content_range = (f"bytes {self.offset}-{self.offset + len(data) - 1}/{total_text}" if data
+                         else f"bytes */{total_text}")
+        response = self.session.request("PUT", self.session_uri, data=bytes(data),
+                                        headers={"Content-Range": content_range}, timeout=self.timeout)
+        if response.status_code in (200, 201):
+            return self.offset + len(data), response.json()
+        if response.status_code == RESUME_INCOMPLETE:
+            return acknowledged_bytes(response.headers.get("Range")), None
+        if response.status_code in RETRYABLE_STATUS:
+            raise RetryableUploadError(f"Chunk {content_range} failed: HTTP {response.status_code}")
+        raise RuntimeError(f"Chunk {content_range} failed: HTTP {response.status_code} {response.text[:500]}")
+
+    def send_with_retry(self, data, total=None):
+        """
+        Send a chunk, retrying transient failures with exponential backoff and full jitter.
+
+        After a failure the server is asked for its offset, since it may have kept part of the chunk.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self.send_chunk(data, total)
+            except (RetryableUploadError, OSError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise RuntimeError(f"Giving up on chunk at byte {self.offset} after {self.max_retries} retries: {e}")
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1)))
+                # Whatever went wrong, a smaller chunk is more likely to make it through
+                self.chunk_size = align_chunk(self.chunk_size // 2, self.min_chunk_size, self.max_chunk_size)
+                logging.warning(f"Chunk at byte {self.offset} failed ({e}); retry {attempt}/{self.max_retries} "
+                                f"in {delay:.1f}s with {self.chunk_size / 1024 ** 2:.2f} MiB chunks")
+                time.sleep(delay)
+                try:
+                    acknowledged, resource = self.query_offset()
+                except (RetryableUploadError, OSError) as query_error:
+                    logging.warning(f"Upload status query failed too: {query_error}")
+                    continue
+                if resource is not None or acknowledged != self.offset:
+                    return (self.offset + len(data) if resource is not None else acknowledged), resource
+
+    def adapt_chunk_size(self, sent_bytes, seconds):
+        """Steer the next chunk towards target_chunk_seconds at the smoothed measured throughput."""
+        measured = sent_bytes / max(seconds, 1e-6)
+        self.throughput = measured if self.throughput is None else 0.5 * self.throughput + 0.5 * measured
+        target = self.throughput * self.target_chunk_seconds
+        # Grow at most 2x per chunk so one fast burst doesn't commit a huge buffer
+        self.chunk_size = align_chunk(min(target, self.chunk_size * 2), self.min_chunk_size, self.max_chunk_size)
+
+    def upload_stream(self, stream, before_finalize=None):
+        """
+        Upload everything read from stream, finalizing the session when it is exhausted.
+
+        Parameters:
+        - stream: Object with read(size) positioned at the current offset; an empty read means
+          the end of the media.
+        - before_finalize (callable): Called before the final chunk is sent. If it raises, the
+          session is left open and unfinalized, so a broken render is never published.
+
+        Returns:
+        - dict: The video resource returned by the API.
+        """
+        if self.session_uri is None:
+            raise RuntimeError("Call start() or restore() before uploading")
+        start_time = time.time()
+        start_offset = self.offset
+        buffer = bytearray()
+        exhausted = False
+        while True:
+            while not exhausted and len(buffer) < self.chunk_size:
+                data = stream.read(self.chunk_size - len(buffer))
+                if not data:
+                    exhausted = True
+                buffer += data
+            if exhausted and len(buffer) <= self.chunk_size:
+                if before_finalize is not None:
+                    before_finalize()
+                chunk, total = buffer, self.offset + len(buffer)
+            else:
+                chunk, total = buffer[:self.chunk_size], None
+
+            chunk_start = time.time()
+            acknowledged, resource = self.send_with_retry(chunk, total)
+            seconds = time.time() - chunk_start
+            if resource is not None:
+                record(bytes_uploaded=len(chunk))
+                self.clear_state()
+                elapsed = time.time() - start_time
+                total = total if total is not None else self.offset + len(buffer)
+                logging.info(f"Resumable upload of {total - start_offset} bytes finished in {elapsed:.2f} seconds "
+                             f"({(total - start_offset) / max(elapsed, 1e-9) / 1024 ** 2:.1f} MiB/s) "
+                             f"over {len(self.metrics) + 1} chunks. Video ID: {resource.get('id')}")
+                return resource
+
+            sent = acknowledged - self.offset
+            record(bytes_uploaded=max(sent, 0))
+            self.adapt_chunk_size(max(sent, 0), seconds)
+            self.metrics.append({"offset": self.offset, "bytes": sent, "seconds": seconds,
+                                 "throughput": sent / max(seconds, 1e-6), "next_chunk_size": self.chunk_size})
+            logging.info(f"Chunk at byte {self.offset}: {sent / 1024 ** 2:.2f} MiB in {seconds:.2f}s "
+                         f"({sent / max(seconds, 1e-6) / 1024 ** 2:.2f} MiB/s), "
+                         f"next chunk {self.chunk_size / 1024 ** 2:.2f} MiB")
+            # The server may keep less than was sent; the rest stays buffered and is sent again
+            del buffer[:sent]
+            self.offset = acknowledged
+            self.save_state()
+
+
+def acknowledged_bytes(range_header):
+    """Parse the Range header of a 308 response ("bytes=0-N") into the number of bytes received."""
+    if not range_header:
+        return 0
+    return int(range_header.rpartition("-")[2]) + 1
+
+
+def media_fingerprint(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def upload_file(upload, path, metadata, before_start=None):
+    """
+    Upload a finished file, resuming the session saved in upload.state_path if there is one.
+
+    before_start, if given, is called before a new session is opened (not when one is resumed).
+
+    Returns:
+    - dict: The video resource returned by the API.
+    """
+    if upload.restore(path):
+        if upload.offset is None:
+            upload.clear_state()
+            return upload.completed
+    else:
+        if before_start is not None:
+            before_start()
+        upload.start(metadata, media_path=path)
+    with open(path, "rb") as media:
+        media.seek(upload.offset)
+        return upload.upload_stream(media)
+
+
+# Usage example
+if __name__ == "__main__":
+    import requests
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Upload a file through a resumable upload session.")
+    parser.add_argument("path")
+    parser.add_argument("--upload-url", help="e.g. the URL printed by example.utilities.fake_upload_server")
+    args = parser.parse_args()
+
+    upload = ResumableUpload(requests.Session(), upload_url=args.upload_url, state_path=f"{args.path}.upload.json")
+    print(upload_file(upload, args.path, {"snippet": {"title": os.path.basename(args.path)},
+                                          "status": {"privacyStatus": "private"}}))
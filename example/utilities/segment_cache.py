@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+
+
+class SegmentCache:
+    def __init__(self, cache_dir=None, max_bytes=20 * 1024 ** 3):
+        """
+        Persistent, content-addressed cache of encoded video segments with an LRU size cap.
+
+        Each entry is stored as ``<key>.mp4`` with a ``<key>.json`` sidecar describing the
+        parameters it was encoded with. Entries are touched on every hit, so eviction removes
+        the least recently used files first.
+
+        Parameters:
+        - cache_dir (str): Cache folder. Defaults to $SEGMENT_CACHE_DIR or ~/.cache/youtube_sleep_automation/segments.
+        - max_bytes (int): Size cap enforced after every insert; None disables automatic eviction.
+        """
+        self.cache_dir = os.path.abspath(cache_dir or os.getenv("SEGMENT_CACHE_DIR") or os.path.join(
+            os.path.expanduser("~"), ".cache", "youtube_sleep_automation", "segments"))
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(**params):
+        """Derive a stable cache key from the parameters that determine a segment's bytes."""
+        encoded = json.dumps(params, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp4")
+
+    def get(self, key):
+        """Return the cached segment path for key, marking it as recently used, or None on a miss."""
+        path = self.entry_path(key)
+        try:
+            os.utime(path, None)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, source_path, params=None):
+        """
+        Move an encoded segment into the cache under key.
+
+        Parameters:
+        - key (str): Cache key from make_key.
+        - source_path (str): Freshly encoded segment; it is moved, not copied.
+        - params (dict): Encode parameters recorded in the sidecar for inspection.
+        """
+        path = self.entry_path(key)
+        with open(os.path.join(self.cache_dir, f"{key}.json"), "w") as sidecar:
+            json.dump({"params": params or {}, "created": time.time()}, sidecar, indent=2, sort_keys=True)
+        os.replace(source_path, path)
+        logging.info(f"Cached segment {key[:12]} ({os.path.getsize(path) / 1024 ** 2:.1f} MB)")
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes)
+        return path
+
+    def get_or_create(self, params, encode):
+        """
+        Return the cached segment for params, encoding and caching it on a miss.
+
+        Parameters:
+        - params (dict): Everything that determines the segment's bytes (source hash, size, fps, codec, ...).
+        - encode (callable): Called with a temporary output path to produce the segment.
+        """
+        key = self.make_key(**params)
+        path = self.get(key)
+        if path:
+            logging.info(f"Segment cache hit for {params.get('kind', 'segment')} ({key[:12]})")
+            return path
+
+        logging.info(f"Segment cache miss for {params.get('kind', 'segment')} ({key[:12]}), encoding...")
+        temp_fd, temp_path = tempfile.mkstemp(suffix=".mp4", dir=self.cache_dir)
+        os.close(temp_fd)
+        try:
+            encode(temp_path)
+            with self.lock:
+                return self.put(key, temp_path, params)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def link_into(self, cached_path, destination):
+        """
+        Hard-link a cached segment into a work folder (copying across filesystems).
+
+        Once linked, eviction can no longer pull the segment away mid-render.
+
+        Raises:
+        - FileNotFoundError: If the entry was evicted after it was looked up.
+        """
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(cached_path, destination)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copy2(cached_path, destination)
+        return destination
+
+    def fetch_into(self, params, encode, destination):
+        """
+        Place the segment for params at destination, from the cache when possible.
+
+        Another job may evict the entry between the lookup and the link; that is treated as a
+        miss and the segment is encoded straight into destination instead.
+
+        Parameters:
+        - params (dict): Cache parameters, as for get_or_create.
+        - encode (callable): Called with an output path to produce the segment.
+        - destination (str): Where the segment is needed.
+        """
+        try:
+            return self.link_into(self.get_or_create(params, encode), destination)
+        except FileNotFoundError:
+            logging.warning(f"Cached {params.get('kind', 'segment')} was evicted before it could be linked, "
+                            f"encoding it again")
+            encode(destination)
+            return destination
+
+    def entries(self):
+        """List cached segments as dicts with key, path, size and last_used, oldest first."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".mp4") or name.startswith("tmp"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append({"key": name[:-4], "path": path, "size": stat.st_size, "last_used": stat.st_mtime})
+        return sorted(entries, key=lambda entry: entry["last_used"])
+
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self.entries())
+
+    def evict(self, max_bytes=0):
+        """
+        Remove least recently used segments until the cache is at most max_bytes.
+
+        Returns:
+        - int: Number of bytes freed.
+        """
+        entries = self.entries()
+        total = sum(entry["size"] for entry in entries)
+        freed = 0
+        for entry in entries:
+            if total <= max_bytes:
+                break
+            for path in (entry["path"], os.path.join(self.cache_dir, f"{entry['key']}.json")):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= entry["size"]
+            freed += entry["size"]
+            logging.info(f"Evicted cached segment {entry['key'][:12]} ({entry['size'] / 1024 ** 2:.1f} MB)")
+        return freed
+
+
+# Cache maintenance entry point
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Inspect or trim the encoded segment cache.")
+    parser.add_argument("command", choices=["stats", "evict", "clear"])
+    parser.add_argument("--cache-dir", default=None, help="Cache folder (default: $SEGMENT_CACHE_DIR or ~/.cache).")
+    parser.add_argument("--max-gb", type=float, default=20, help="Size cap used by 'evict'.")
+    args = parser.parse_args()
+
+    cache = SegmentCache(cache_dir=args.cache_dir, max_bytes=None)
+    if args.command == "evict":
+        freed = cache.evict(int(args.max_gb * 1024 ** 3))
+        logging.info(f"Freed {freed / 1024 ** 2:.1f} MB")
+    elif args.command == "clear":
+        freed = cache.evict(0)
+        logging.info(f"Cleared {freed / 1024 ** 2:.1f} MB")
+    entries = cache.entries()
+    logging.info(f"{cache.cache_dir}: {len(entries)} segments, {cache.total_bytes() / 1024 ** 2:.1f} MB")
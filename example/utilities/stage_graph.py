@@ -0,0 +1,137 @@
+import os
+import json
+import hashlib
+import logging
+
+from example.utilities.hashing import file_sha256
+
+
+def inputs_key(inputs):
+    """Stable hash of a stage's inputs (source hashes, durations, encode settings)."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def fingerprint(path):
+    """Cheap on-disk identity of an artifact, checked before trusting its recorded content hash."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class StageGraph:
+    def __init__(self, manifest, report=None):
+        """
+        Ordered pipeline stages whose outputs are keyed by the content of their inputs.
+
+        Each stage declares its inputs (source file hashes, duration_hours, encode settings and the
+        content hashes of upstream artifacts) and returns its artifacts. Both are recorded in the
+        run's RenderManifest, and a stage is skipped when its inputs hash to the recorded key and
+        its artifact files are still the ones it wrote. Changing a setting or a source therefore
+        reruns that stage and, through the artifact hashes, everything downstream of it.
+
+        Parameters:
+        - manifest (RenderManifest): Checkpoint manifest of the run's output directory.
+        - report (RunReport): Optional performance report each executed stage is timed into.
+        """
+        self.manifest = manifest
+        self.report = report
+        self.stages = []
+
+    @property
+    def names(self):
+        return [stage["name"] for stage in self.stages]
+
+    def add(self, name, resource, run, inputs, artifact_files=()):
+        """
+        Append a stage.
+
+        Parameters:
+        - name (str): Stage name, e.g. "render".
+        - resource (str): BatchScheduler resource the stage occupies ("cpu", "logic", "upload" or None).
+        - run (callable): Does the work and returns a dict of artifacts (paths, IDs).
+        - inputs (callable): Returns the dict of inputs; evaluated right before the stage, so it can
+          use the artifact hashes of the stages before it.
+        - artifact_files (tuple): Keys of the returned dict that are files to hash and fingerprint.
+        """
+        self.stages.append({"name": name, "resource": resource, "run": run, "inputs": inputs,
+                            "artifact_files": tuple(artifact_files)})
+
+    def artifact(self, stage_name, key):
+        """Return an artifact recorded by an earlier stage, e.g. artifact("loop_audio", "looped_audio_path")."""
+        info = self.manifest.stage_info(stage_name)
+        if key not in info:
+            raise RuntimeError(f"Stage {stage_name} has no recorded {key}; run it first")
+        return info[key]
+
+    def artifact_hash(self, stage_name, key):
+        """Content hash of an artifact file recorded by an earlier stage."""
+        artifacts = self.manifest.stage_artifacts(stage_name)
+        if key not in artifacts:
+            raise RuntimeError(f"Stage {stage_name} has no recorded {key}; run it first")
+        return artifacts[key]["sha256"]
+
+    def up_to_date(self, stage, key):
+        """True if the stage completed with these inputs and its artifact files are unchanged on disk."""
+        name = stage["name"]
+        if not self.manifest.stage_done(name) or self.manifest.stage_inputs_key(name) != key:
+            return False
+        info = self.manifest.stage_info(name)
+        for artifact_key, recorded in self.manifest.stage_artifacts(name).items():
+            path = info.get(artifact_key)
+            if not path or not os.path.exists(path) or fingerprint(path) != recorded["fingerprint"]:
+                return False
+        return True
+
+    def execute(self, stage, force=False):
+        name = stage["name"]
+        inputs = stage["inputs"]()
+        key = inputs_key(inputs)
+        if not force and self.up_to_date(stage, key):
+            logging.info(f"Stage {name} is up to date (inputs {key[:12]}), skipping.")
+            if self.report is not None:
+                self.report.skipped(name)
+            return
+        if self.report is not None:
+            with self.report.stage(name):
+                info = stage["run"]() or {}
+        else:
+            info = stage["run"]() or {}
+        artifacts = {artifact_key: {"sha256": file_sha256(info[artifact_key]),
+                                    "fingerprint": fingerprint(info[artifact_key])}
+                     for artifact_key in stage["artifact_files"]}
+        self.manifest.mark_stage_done(name, info=info, inputs=inputs, inputs_key=key, artifacts=artifacts)
+
+    def require(self, stage):
+        """Stand-in for a stage left out by --from-stage/--only-stage: its recorded output must exist."""
+        name = stage["name"]
+        if not self.manifest.stage_done(name):
+            raise RuntimeError(f"Stage {name} has not completed in {self.manifest.output_dir}; run it first")
+        logging.info(f"Stage {name} not selected, using its recorded output.")
+
+    def plan(self, from_stage=None, only_stage=None):
+        """
+        Return (stage_name, resource, callable) entries for main(), resume() or BatchScheduler.
+
+        By default every stage runs unless it is up to date. from_stage forces that stage and all
+        later ones to run and leaves the earlier ones as they are; only_stage forces just that stage.
+        """
+        for selected in (from_stage, only_stage):
+            if selected is not None and selected not in self.names:
+                raise ValueError(f"Unknown stage {selected}; expected one of {self.names}")
+        start = self.names.index(from_stage) if from_stage else None
+
+        entries = []
+        for index, stage in enumerate(self.stages):
+            if only_stage is not None:
+                selected = stage["name"] == only_stage
+                force = selected
+            elif start is not None:
+                selected = index >= start
+                force = selected
+            else:
+                selected, force = True, False
+            if selected:
+                action = lambda stage=stage, force=force: self.execute(stage, force=force)
+            else:
+                action = lambda stage=stage: self.require(stage)
+            entries.append((stage["name"], stage["resource"] if selected else None, action))
+        return entries
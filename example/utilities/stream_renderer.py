@@ -0,0 +1,300 @@
+import os
+import time
+import shutil
+import logging
+
+from example.utilities.ffmpeg_tools import run_ffmpeg, probe_media, concat_segments
+from example.utilities.hashing import file_sha256
+from example.utilities.encode_profiles import get_profile
+from example.utilities.instrumentation import record
+
+
+def plan_timeline(intro_duration, video_duration, audio_duration, total_duration, fps, black_fps=None):
+    """
+    Lay out the intro, looped segment and black tail in whole frames.
+
+    Mirrors the moviepy path: the intro plus the looped clip cover the audio (capped at the
+    total duration), and whatever time is left is filled with a black screen.
+
+    Parameters:
+    - intro_duration (float): Intro clip duration in seconds.
+    - video_duration (float): Duration of one pass of the looped clip in seconds.
+    - audio_duration (float): Duration of the looped audio in seconds.
+    - total_duration (float): Desired total duration in seconds.
+    - fps (float): Frame rate of the intro and looped segment.
+    - black_fps (float): Frame rate of the black tail. Defaults to fps.
+
+    Returns:
+    - dict: Frame counts for every part of the timeline.
+    """
+    black_fps = black_fps or fps
+    total_frames = int(round(total_duration * fps))
+    main_frames = int(round(min(total_duration, audio_duration) * fps))
+    intro_frames = int(round(intro_duration * fps))
+    loop_unit_frames = max(1, int(round(video_duration * fps)))
+
+    if main_frames - intro_frames <= 0:
+        logging.warning("Intro and buffer duration exceed or match the specified total duration.")
+        intro_frames = min(intro_frames, total_frames)
+        loop_frames = 0
+        black_frames = 0
+    else:
+        loop_frames = main_frames - intro_frames
+        black_frames = int(round((total_frames - main_frames) / fps * black_fps))
+
+    duration = (intro_frames + loop_frames) / fps + black_frames / black_fps
+    return {
+        "fps": fps,
+        "black_fps": black_fps,
+        "intro_frames": intro_frames,
+        "loop_unit_frames": loop_unit_frames,
+        "loop_frames": loop_frames,
+        "num_loops": loop_frames // loop_unit_frames + 1,
+        "black_frames": black_frames,
+        "total_frames": intro_frames + loop_frames + black_frames,
+        "duration": duration,
+        "audio_duration": min(audio_duration, duration),
+    }
+
+
+def write_concat_list(list_path, entries):
+    """
+    Write an ffconcat list with explicit per-segment durations so seams land on exact frames.
+
+    Parameters:
+    - list_path (str): Destination of the list file.
+    - entries (list): (segment path, frame count, frame rate) tuples in playback order.
+    """
+    with open(list_path, "w") as concat_list:
+        concat_list.write("ffconcat version 1.0\n")
+        for segment_path, frames, fps in entries:
+            escaped = os.path.abspath(segment_path).replace("'", "'\\''")
+            concat_list.write(f"file '{escaped}'\n")
+            concat_list.write(f"duration {frames / fps:.6f}\n")
+    return list_path
+
+
+def verify_av_sync(output_video_path, plan):
+    """
+    Check that a joined file has exactly the planned frames and that audio and video line up.
+
+    Parameters:
+    - output_video_path (str): The joined video.
+    - plan (dict): Timeline returned by plan_timeline.
+
+    Raises:
+    - RuntimeError: If frames were dropped or duplicated at a seam, or the streams drift apart.
+    """
+    info = probe_media(output_video_path, count_packets=True)
+    frame_duration = 1.0 / plan["fps"]
+    expected_duration = plan["duration"]
+
+    if info["video_packets"] != plan["total_frames"]:
+        raise RuntimeError(f"Expected {plan['total_frames']} video frames in {output_video_path}, "
+                           f"found {info['video_packets']}.")
+    video_duration = info["video_duration"] or info["duration"]
+    if abs(video_duration - expected_duration) > frame_duration:
+        raise RuntimeError(f"Video duration {video_duration:.3f}s differs from the planned "
+                           f"{expected_duration:.3f}s by more than one frame.")
+    if info["audio_start"] is not None and info["video_start"] is not None:
+        offset = abs(info["audio_start"] - info["video_start"])
+        if offset > frame_duration:
+            raise RuntimeError(f"Audio starts {offset:.3f}s away from video in {output_video_path}.")
+    verify_audio_duration(output_video_path, plan["audio_duration"], plan["duration"], plan["fps"], info=info)
+    logging.info(f"A/V sync verified for {output_video_path}: {info['video_packets']} frames, "
+                 f"{video_duration:.3f}s of video.")
+
+
+def verify_audio_duration(output_video_path, expected_audio_duration, timeline_duration, fps, info=None):
+    """
+    Check that the muxed audio track is as long as expected to within one video frame.
+
+    The audio is expected to run for the whole timeline; a source that is shorter than the
+    timeline (a short Logic Pro bounce, for example) leaves a silent tail, which is logged.
+
+    Parameters:
+    - output_video_path (str): The muxed video.
+    - expected_audio_duration (float): Audio length the timeline was planned with, in seconds.
+    - timeline_duration (float): Length of the video timeline in seconds.
+    - fps (float): Video frame rate that sets the tolerance.
+    - info (dict): Optional probe_media result to reuse.
+
+    Raises:
+    - RuntimeError: If the audio is missing or off by more than one frame.
+    """
+    info = info or probe_media(output_video_path)
+    if info["audio_codec"] is None:
+        raise RuntimeError(f"No audio stream found in {output_video_path}.")
+    audio_duration = info["audio_duration"] or info["duration"]
+    drift = abs(audio_duration - expected_audio_duration)
+    if drift > 1.0 / fps:
+        raise RuntimeError(f"Muxed audio runs {audio_duration:.3f}s but {expected_audio_duration:.3f}s was "
+                           f"expected ({drift * 1000:.1f} ms off, more than one frame).")
+    if timeline_duration - expected_audio_duration > 1.0 / fps:
+        logging.warning(f"Audio covers {expected_audio_duration:.3f}s of the {timeline_duration:.3f}s timeline; "
+                        f"the remainder is silent.")
+    logging.info(f"Muxed audio duration {audio_duration:.3f}s is within one frame of the timeline "
+                 f"({drift * 1000:.1f} ms drift, codec {info['audio_codec']}).")
+
+
+class StreamCopyRenderer:
+    def __init__(self, profile=None, black_unit_seconds=600, audio_codec="copy", segment_cache=None):
+        """
+        Render the final video by encoding each distinct piece once and stream-copying the repeats.
+
+        The intro, one pass of the looped clip and one block of black frames are encoded with
+        identical codec parameters, then the concat demuxer tiles them into the final MP4, so
+        encode time depends on the length of the source clips rather than on duration_hours.
+
+        Parameters:
+        - profile (EncodeProfile): Export settings shared by every segment. Defaults to the "default" profile.
+        - black_unit_seconds (float): Length of the reusable black-screen block.
+        - audio_codec (str): Codec for the muxed audio track. "copy" muxes the looped audio as-is, so it
+          is encoded exactly once, by the looping stage.
+        - segment_cache (SegmentCache): Optional cache for the intro and black blocks, which are the
+          same across runs; only the looped clip is then encoded per video.
+        """
+        self.profile = profile or get_profile("default")
+        self.black_unit_seconds = black_unit_seconds
+        self.audio_codec = audio_codec
+        self.segment_cache = segment_cache
+
+    def render(self, intro_path, video_file, audio_path, output_video_path, duration_hours, work_dir=None,
+               video_loop=None, manifest=None, pipeline=None):
+        """
+        Build the final video with an intro, looped segment and black tail.
+
+        Parameters:
+        - intro_path (str): Path to the intro video.
+        - video_file (str): Path to the main video file to loop.
+        - audio_path (str): Path to the audio file.
+        - output_video_path (str): Path where the final video will be saved.
+        - duration_hours (float): Desired total duration of the video in hours.
+        - work_dir (str): Directory for intermediate segments. Defaults to a folder next to the output.
+        - video_loop (dict): Optional loop_in/loop_out seconds from LoopPointFinder; the loop unit is
+          cut from that range instead of the whole clip.
+        - manifest (RenderManifest): Optional checkpoint manifest; segments it lists as complete are
+          reused and new ones are recorded, so an interrupted render can be resumed.
+        - pipeline (PipelinedUpload): Optional; the final join is uploaded while it is written.
+        """
+        start_time = time.time()
+        work_dir = work_dir or os.path.join(os.path.dirname(os.path.abspath(output_video_path)), "segments")
+        os.makedirs(work_dir, exist_ok=True)
+
+        intro_info = probe_media(intro_path)
+        video_info = probe_media(video_file)
+        audio_info = probe_media(audio_path)
+        size = (video_info["width"], video_info["height"])
+        loop_start = video_loop["loop_in"] if video_loop else 0.0
+        loop_length = video_loop["loop_out"] - loop_start if video_loop else video_info["duration"]
+        plan = plan_timeline(intro_info["duration"], loop_length, audio_info["duration"],
+                             duration_hours * 60 * 60, self.profile.fps, self.profile.black_fps)
+        logging.info(f"Stream-copy timeline: {plan}")
+
+        entries = []
+        if plan["intro_frames"]:
+            intro_segment = os.path.join(work_dir, "intro.mp4")
+            intro_params = {"kind": "intro", "source": file_sha256(intro_path), "frames": plan["intro_frames"]}
+            self.checkpointed(manifest, intro_segment, intro_params, size, lambda path: self.encode_cached(
+                path, intro_params, size,
+                lambda temp_path: self.encode_file_segment(intro_path, temp_path, plan["intro_frames"], size)))
+            entries.append((intro_segment, plan["intro_frames"], plan["fps"]))
+
+        loop_source_hash = file_sha256(video_file) if manifest is not None else None
+        entries += self.encode_tiled(
+            plan["loop_frames"], plan["loop_unit_frames"], plan["fps"],
+            lambda path, frames: self.checkpointed(
+                manifest, path, {"kind": "loop", "source": loop_source_hash, "start": loop_start, "frames": frames},
+                size, lambda temp_path: self.encode_file_segment(video_file, temp_path, frames, size, start=loop_start)),
+            os.path.join(work_dir, "loop"))
+
+        black_unit_frames = max(1, int(round(self.black_unit_seconds * plan["black_fps"])))
+        entries += self.encode_tiled(
+            plan["black_frames"], black_unit_frames, plan["black_fps"],
+            lambda path, frames: self.checkpointed(
+                manifest, path, {"kind": "black", "frames": frames}, size, lambda partial_path: self.encode_cached(
+                    partial_path, {"kind": "black", "frames": frames}, size,
+                    lambda temp_path: self.encode_black_segment(temp_path, frames, size))),
+            os.path.join(work_dir, "black"))
+
+        list_path = os.path.join(work_dir, "segments.ffconcat")
+        write_concat_list(list_path, entries)
+
+        logging.info(f"Joining {len(entries)} segments into {output_video_path} without re-encoding...")
+        concat_segments(list_path, output_video_path, audio_path=audio_path, audio_codec=self.audio_codec,
+                        audio_bitrate=self.profile.audio_bitrate, duration=plan["duration"], pipeline=pipeline)
+        verify_av_sync(output_video_path, plan)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        record(media_seconds=plan["duration"])
+
+        elapsed_time = time.time() - start_time
+        logging.info(f"Stream-copy render finished in {elapsed_time:.2f} seconds.")
+        return output_video_path
+
+    def encode_tiled(self, total_frames, unit_frames, fps, encode, prefix):
+        """
+        Encode one full unit and, if needed, one shorter remainder, and list them to fill total_frames.
+
+        Returns:
+        - list: (segment path, frame count, frame rate) entries in playback order.
+        """
+        if total_frames <= 0:
+            return []
+        full_units, remainder = divmod(total_frames, unit_frames)
+        entries = []
+        if full_units:
+            unit_path = f"{prefix}_unit.mp4"
+            encode(unit_path, unit_frames)
+            entries += [(unit_path, unit_frames, fps)] * full_units
+        if remainder:
+            remainder_path = f"{prefix}_remainder.mp4"
+            encode(remainder_path, remainder)
+            entries.append((remainder_path, remainder, fps))
+        return entries
+
+    def checkpointed(self, manifest, segment_path, params, size, encode):
+        """Produce segment_path through the run's checkpoint manifest when one is given."""
+        if manifest is None:
+            return encode(segment_path)
+        checkpoint_params = dict(params, size=list(size), profile=self.profile.to_dict())
+        return manifest.checkpoint_segment(segment_path, checkpoint_params, encode)
+
+    def encode_cached(self, segment_path, params, size, encode):
+        """
+        Produce segment_path through the segment cache when one is configured.
+
+        The cache key combines params with the resolution and the whole encode profile, so a change
+        to any setting produces a new entry instead of reusing stale bytes.
+        """
+        if self.segment_cache is None:
+            return encode(segment_path)
+        key_params = dict(params, size=list(size), profile=self.profile.to_dict())
+        return self.segment_cache.fetch_into(key_params, encode, segment_path)
+
+    def video_args(self, size, frames, fps):
+        """Encoder arguments shared by every segment so they can be joined with stream copy."""
+        width, height = size
+        filters = (f"scale={width}:{height},setsar=1,fps={fps},"
+                   f"tpad=stop=-1:stop_mode=clone,format={self.profile.pix_fmt}")
+        return (["-an", "-vf", filters, "-frames:v", str(frames)] + self.profile.encoder_args()
+                + ["-g", str(self.profile.gop), "-video_track_timescale", "90000"])
+
+    def encode_file_segment(self, source_path, segment_path, frames, size, start=0.0):
+        """Encode `frames` frames of a file from `start` seconds, padding with its last frame if it runs short."""
+        logging.info(f"Encoding {frames} frames of {os.path.basename(source_path)} from {start:.3f}s -> {segment_path}")
+        run_ffmpeg(["-ss", f"{start:.6f}", "-i", source_path]
+                   + self.video_args(size, frames, self.profile.fps) + [segment_path],
+                   description=f"segment encode of {os.path.basename(source_path)}")
+        record(frames_encoded=frames)
+        return segment_path
+
+    def encode_black_segment(self, segment_path, frames, size):
+        """Encode `frames` frames of black at the output resolution and the profile's tail frame rate."""
+        width, height = size
+        fps = self.profile.tail_fps
+        logging.info(f"Encoding {frames} black frames at {fps} fps -> {segment_path}")
+        run_ffmpeg(["-f", "lavfi", "-i", f"color=c=black:s={width}x{height}:r={fps}"]
+                   + self.video_args(size, frames, fps) + [segment_path],
+                   description="black segment encode")
+        record(frames_encoded=frames)
+        return segment_path
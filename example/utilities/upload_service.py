@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import queue
+import logging
+import argparse
+import datetime
+import threading
+from concurrent.futures import Future
+
+from example.utilities.resumable_upload import QuotaExceededError
+
+# videos.insert costs 1600 units of the default 10,000 unit daily project quota
+UPLOAD_COST = 1600
+DAILY_QUOTA = 10000
+
+
+def quota_day_bounds(now=None):
+    """
+    Return (day, seconds until the next reset) for the API quota day.
+
+    Quota resets at midnight Pacific time; falls back to UTC when no tz database is installed.
+    """
+    try:
+        from zoneinfo import ZoneInfo
+        zone = ZoneInfo("America/Los_Angeles")
+    except Exception:
+        zone = datetime.timezone.utc
+    current = datetime.datetime.fromtimestamp(time.time() if now is None else now, zone)
+    next_midnight = (current + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return current.date().isoformat(), (next_midnight - current).total_seconds()
+
+
+class QuotaRateLimiter:
+    def __init__(self, daily_units=DAILY_QUOTA, upload_cost=UPLOAD_COST, min_interval=0.0, state_path=None):
+        """
+        Keep uploads within the YouTube Data API's daily quota.
+
+        Every videos.insert costs upload_cost units out of daily_units per quota day, which with
+        the defaults allows six uploads a day. acquire() charges an upload before its session is
+        opened and waits for the next quota day when the budget is spent, instead of letting the
+        API reject the upload. With a state_path the units spent today are persisted, so separate
+        runs on the same machine share one budget.
+
+        Parameters:
+        - daily_units (int): Quota units available per day.
+        - upload_cost (int): Units charged per upload.
+        - min_interval (float): Minimum seconds between two upload starts.
+        - state_path (str): JSON file the units spent today are kept in.
+        """
+        self.daily_units = daily_units
+        self.upload_cost = upload_cost
+        self.min_interval = min_interval
+        self.state_path = state_path
+        self.lock = threading.Lock()
+        self.day = None
+        self.used = 0
+        self.last_start = 0.0
+        self.load()
+
+    def load(self):
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path) as state_file:
+                state = json.load(state_file)
+            self.day, self.used = state["day"], state["used"]
+
+    def save(self):
+        if not self.state_path:
+            return
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w") as state_file:
+            json.dump({"day": self.day, "used": self.used}, state_file)
+        os.replace(temp_path, self.state_path)
+
+    def roll_day(self):
+        """Reset the spend when a new quota day has started; returns seconds until the next reset."""
+        day, until_reset = quota_day_bounds()
+        if day != self.day:
+            self.day, self.used = day, 0
+        return until_reset
+
+    @property
+    def remaining(self):
+        with self.lock:
+            self.roll_day()
+            return self.daily_units - self.used
+
+    def acquire(self, cost=None, timeout=None):
+        """
+        Charge one upload, waiting for budget and for min_interval since the previous start.
+
+        Parameters:
+        - cost (int): Units to charge; defaults to upload_cost.
+        - timeout (float): Give up after this many seconds of waiting (None waits for the reset).
+
+        Raises:
+        - QuotaExceededError: If no budget becomes available within timeout, or cost exceeds
+          the daily quota outright.
+        """
+        cost = self.upload_cost if cost is None else cost
+        if cost > self.daily_units:
+            raise QuotaExceededError(f"An upload costs {cost} units but the daily quota is {self.daily_units}")
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self.lock:
+                until_reset = self.roll_day()
+                if self.used + cost > self.daily_units:
+                    wait = until_reset + 1
+                    reason = f"quota spent ({self.used}/{self.daily_units} units)"
+                else:
+                    wait = self.last_start + self.min_interval - time.time()
+                    reason = "spacing upload starts"
+                if wait <= 0:
+                    self.used += cost
+                    self.last_start = time.time()
+                    self.save()
+                    logging.info(f"Upload quota: {self.used}/{self.daily_units} units used today.")
+                    return
+            if deadline is not None and time.time() + wait > deadline:
+                raise QuotaExceededError(f"No upload quota available within {timeout} seconds: {reason}")
+            logging.info(f"Upload waiting {wait:.0f} seconds: {reason}.")
+            time.sleep(min(wait, 60))
+
+    def exhaust(self):
+        """The API reported quotaExceeded (e.g. other clients share the project): stop until the reset."""
+        with self.lock:
+            self.roll_day()
+            self.used = max(self.used, self.daily_units)
+            self.save()
+        logging.warning("YouTube reported the upload quota as exhausted; waiting for the daily reset.")
+
+
+class UploadService:
+    def __init__(self, uploader, workers=2, queue_size=8, rate_limiter=None, max_quota_retries=1,
+                 quota_timeout=None):
+        """
+        Long-lived queue of uploads drained by a bounded pool of workers sharing one uploader.
+
+        submit() blocks when queue_size uploads are already waiting, so producers (batch render
+        jobs) cannot pile up more finished videos than the uploader can take. Every upload first
+        takes its quota from the rate limiter; if the API still answers quotaExceeded, the limiter
+        is marked exhausted and the upload waits for the next quota day (up to max_quota_retries times).
+
+        Parameters:
+        - uploader (YouTubeUploader): Shared client; its upload() and start_resumable_upload() are used.
+        - workers (int): Concurrent uploads.
+        - queue_size (int): Uploads allowed to wait for a worker.
+        - rate_limiter (QuotaRateLimiter): Quota budget; defaults to the 10,000 unit daily quota.
+        - max_quota_retries (int): Times an upload refused for quota is retried after the next reset.
+        - quota_timeout (float): Fail an upload instead of waiting longer than this for quota.
+        """
+        self.uploader = uploader
+        self.rate_limiter = rate_limiter or QuotaRateLimiter()
+        self.max_quota_retries = max_quota_retries
+        self.quota_timeout = quota_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.threads = []
+        for index in range(max(1, workers)):
+            thread = threading.Thread(target=self.worker, name=f"upload-worker-{index + 1}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        self.closed = False
+
+    def submit(self, video_path, metadata):
+        """
+        Queue a finished video for upload.
+
+        Parameters:
+        - video_path (str): The video file.
+        - metadata (dict): title, description, category_id and privacy_status.
+
+        Returns:
+        - Future: Resolves to the uploaded video resource, or raises the upload's error.
+        """
+        if self.closed:
+            raise RuntimeError("UploadService is closed")
+        future = Future()
+        self.queue.put((future, video_path, metadata))
+        return future
+
+    def worker(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                future, video_path, metadata = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(self.upload(video_path, metadata))
+                except Exception as e:
+                    logging.error(f"Queued upload of {video_path} failed: {e}")
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    def with_quota(self, action):
+        """
+        Run action(charge) within the quota, waiting for the next quota day if the API refuses it.
+
+        action calls charge() right before it opens a new upload session. Resuming a saved session
+        does not call it, since that session's videos.insert was already charged.
+        """
+        for attempt in range(self.max_quota_retries + 1):
+            charged = []
+
+            def charge():
+                self.rate_limiter.acquire(timeout=self.quota_timeout)
+                charged.append(True)
+
+            try:
+                return action(charge)
+            except QuotaExceededError:
+                # Only the API refusing a charged insert marks the day as spent
+                if not charged:
+                    raise
+                self.rate_limiter.exhaust()
+                if attempt == self.max_quota_retries:
+                    raise
+
+    def upload(self, video_path, metadata):
+        """Upload one video on the calling thread, within the quota."""
+        return self.with_quota(lambda charge: self.uploader.upload(video_path, before_start=charge, **metadata))
+
+    def start_session(self, metadata):
+        """Open a resumable session (for PipelinedUpload) within the quota."""
+        def start(charge):
+            charge()
+            return self.uploader.start_resumable_upload(**metadata)
+
+        return self.with_quota(start)
+
+    def join(self):
+        """Wait until every queued upload has finished."""
+        self.queue.join()
+
+    def close(self, wait=True):
+        """Stop the workers once the queue is drained."""
+        if self.closed:
+            return
+        self.closed = True
+        for _ in self.threads:
+            self.queue.put(None)
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Usage example
+if __name__ == "__main__":
+    import requests
+    from example.utilities.youtube_uploader import YouTubeUploader
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Upload several finished videos through one shared client.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--daily-quota", type=int, default=DAILY_QUOTA)
+    parser.add_argument("--quota-state", help="JSON file tracking units spent today")
+    parser.add_argument("--upload-url", help="Upload to a local FakeUploadServer without authenticating")
+    parser.add_argument("--quota-timeout", type=float, help="Fail uploads instead of waiting longer for quota")
+    args = parser.parse_args()
+
+    if args.upload_url:
+        uploader = YouTubeUploader(session=requests.Session(), upload_url=args.upload_url, pool_size=args.workers)
+    else:
+        uploader = YouTubeUploader(credentials_file='client_secrets.json', pool_size=args.workers)
+    limiter = QuotaRateLimiter(daily_units=args.daily_quota, state_path=args.quota_state)
+    with uploader, UploadService(uploader, workers=args.workers, rate_limiter=limiter,
+                                         quota_timeout=args.quota_timeout) as service:
+        futures = {path: service.submit(path, {"title": os.path.basename(path), "description": "",
+                                               "category_id": "10", "privacy_status": "private"})
+                   for path in args.paths}
+        for path, future in futures.items():
+            try:
+                print(f"{path}: {future.result()['id']}")
+            except Exception as e:
+                print(f"{path}: failed ({e})")
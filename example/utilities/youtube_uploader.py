@@ -1,19 +1,48 @@
 import os
 import time
+import pickle
 import logging
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import datetime
+import threading
 from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.http import MediaFileUpload
-import pickle
+from google.auth.transport.requests import Request, AuthorizedSession
+from requests.adapters import HTTPAdapter
+
+from example.utilities.resumable_upload import ResumableUpload, upload_file
 
 class YouTubeUploader:
-    def __init__(self, credentials_file='client_secrets.json', token_file='token.pickle'):
+    def __init__(self, credentials_file='client_secrets.json', token_file='token.pickle', pool_size=4,
+                 refresh_margin=300, session=None, upload_url=None):
+        """
+        Long-lived YouTube client: authenticates once and shares one HTTP connection pool.
+
+        Every upload (including concurrent ones from UploadService workers) goes through the
+        same AuthorizedSession, so connections are reused
+        instead of re-doing TLS per upload. Before each request the access token is refreshed if it
+        expires within refresh_margin seconds, so a multi-hour upload never runs into a 401 halfway.
+
+        Parameters:
+        - credentials_file (str): OAuth client secrets.
+        - token_file (str): Where the OAuth token is cached between runs.
+        - pool_size (int): Connections kept open per host; at least the number of upload workers.
+        - refresh_margin (float): Refresh the token when it expires within this many seconds.
+        - session: requests-compatible session to use instead of authenticating, e.g. a plain
+          requests.Session for the local FakeUploadServer.
+        - upload_url (str): Upload endpoint override, see ResumableUpload.
+        """
         self.credentials_file = credentials_file
         self.token_file = token_file
+        self.refresh_margin = refresh_margin
+        self.upload_url = upload_url
         self.credentials = None  # Store credentials here
-        self.youtube = self.authenticate_youtube()
+        self.lock = threading.Lock()
+        if session is not None:
+            self.session = session
+        else:
+            self.session = AuthorizedSession(self.authenticate_youtube())
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     def authenticate_youtube(self):
         scopes = ["https://www.googleapis.com/auth/youtube.upload"]
@@ -32,60 +61,107 @@ class YouTubeUploader:
                 self.credentials = flow.run_local_server(port=0)
 
             # Save the credentials for future use
-            with open(self.token_file, 'wb') as token:
-                pickle.dump(self.credentials, token)
+            self.save_credentials()
+
+        return self.credentials
+
+    def save_credentials(self):
+        with open(self.token_file, 'wb') as token:
+            pickle.dump(self.credentials, token)
+
+    def ensure_fresh_credentials(self):
+        """Refresh the access token (and the cached token file) if it expires within refresh_margin."""
+        if self.credentials is None:
+            return
+        with self.lock:
+            expiry = self.credentials.expiry  # naive UTC, as google-auth stores it
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            if expiry is None or (expiry - now).total_seconds() > self.refresh_margin:
+                return
+            logging.info(f"Refreshing YouTube credentials (token expires at {expiry:%H:%M:%S} UTC).")
+            self.credentials.refresh(Request())
+            self.save_credentials()
+
+    def request(self, method, url, **kwargs):
+        """requests-style entry point for ResumableUpload: refresh if needed, then use the shared pool."""
+        self.ensure_fresh_credentials()
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
 
-        # Initialize the YouTube API client with the saved credentials
-        return build('youtube', 'v3', credentials=self.credentials)
+    def __exit__(self, *exc_info):
+        self.close()
 
-    def upload_video(self, video_file_path, title, description, category_id, privacy_status):
+    def start_resumable_upload(self, title, description, category_id, privacy_status, chunk_size=8 * 1024 * 1024):
+        """
+        Open a resumable upload session that can be fed while the video is still being rendered.
+
+        Set YOUTUBE_UPLOAD_URL to point the session at a local FakeUploadServer.
+
+        Returns:
+        - ResumableUpload: The started session; pass the media to its upload_stream().
+        """
+        upload = ResumableUpload(self, upload_url=self.upload_url, chunk_size=chunk_size)
+        upload.start(self.build_request_body(title, description, category_id, privacy_status))
+        return upload
+
+    @staticmethod
+    def build_request_body(title, description, category_id, privacy_status):
+        return {
+            "snippet": {
+                "title": title,
+                "description": description,
+                "categoryId": category_id,
+            },
+            "status": {"privacyStatus": privacy_status},
+        }
+
+    def upload(self, video_file_path, title, description, category_id, privacy_status, state_path=None,
+               before_start=None):
+        """
+        Upload a finished video through a resumable session, raising on failure.
+
+        Chunk sizes adapt to the measured throughput and failed chunks are retried with exponential
+        backoff. The session URI and acknowledged offset are saved next to the video (or at
+        state_path), so if the process dies, the next call for the same unchanged file resumes
+        where the server left off instead of starting at byte 0.
+
+        Parameters:
+        - before_start (callable): Optional; called only when a new session has to be opened (not
+          when a saved one is resumed), e.g. to charge the upload quota.
+
+        Returns:
+        - dict: The video resource returned by the API.
+        """
+        logging.info(f"Uploading {video_file_path} to YouTube...")
+        start_time = time.time()
+        upload = ResumableUpload(self, upload_url=self.upload_url,
+                                 state_path=state_path or f"{video_file_path}.upload.json")
+        response = upload_file(upload, video_file_path,
+                               self.build_request_body(title, description, category_id, privacy_status),
+                               before_start=before_start)
+        elapsed_time = time.time() - start_time
+        logging.info(f"Video upload completed successfully in {elapsed_time:.2f} seconds. Video ID: {response.get('id')}")
+        return response
+
+    def upload_video(self, video_file_path, title, description, category_id, privacy_status, state_path=None):
+        """
+        Upload a finished video, see upload().
+
+        Returns:
+        - str: The video ID, or None if the upload failed.
+        """
         try:
-            logging.info("Initializing YouTube upload...")
-            youtube = build("youtube", "v3", credentials=self.credentials)
-            request_body = {
-                "snippet": {
-                    "title": title,
-                    "description": description,
-                    "categoryId": category_id,
-                },
-                "status": {"privacyStatus": privacy_status},
-            }
-
-            # Configure MediaFileUpload for resumable upload with a specified chunk size
-            media_body = MediaFileUpload(video_file_path, chunksize=1024 * 1024, resumable=True)
-            request = youtube.videos().insert(
-                part="snippet,status", body=request_body, media_body=media_body
-            )
-
-            # Initialize variables for tracking upload progress
-            response = None
-            retry_count = 0
-            max_retries = 5
-            start_time = time.time()
-
-            logging.info("Starting video upload in chunks...")
-            while response is None:
-                try:
-                    status, response = request.next_chunk()
-                    if status:
-                        logging.info(f"Upload progress: {int(status.progress() * 100)}% complete")
-                except Exception as e:
-                    if retry_count < max_retries:
-                        retry_count += 1
-                        logging.warning(f"Upload interrupted: {e}. Retrying ({retry_count}/{max_retries})...")
-                        time.sleep(5)  # wait before retrying
-                    else:
-                        logging.error("Maximum retries reached. Upload failed.")
-                        return None
-
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-            logging.info(f"Video upload completed successfully in {elapsed_time:.2f} seconds. Video ID: {response.get('id')}")
-
-            return response.get("id")
+            return self.upload(video_file_path, title, description, category_id, privacy_status,
+                               state_path=state_path).get("id")
         except Exception as e:
             logging.error(f"Error uploading video: {e}")
             return None
+
 # Example usage
 if __name__ == "__main__":
     # Set up logging
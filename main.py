@@ -1,22 +1,77 @@
 import os
+import sys
+import json
+import argparse
 from dotenv import load_dotenv
-from example.example import ExampleShell
 
-def main():
+STAGES = ["loop_audio", "render", "archive", "upload"]
+
+def main(argv=None):
     # Load environment variables from .env_run
     # load_dotenv(dotenv_path='.env_run')
 
     configs = {
         "run_primary_shell": os.getenv('run_primary_shell') == 'True',
         "replicate_api_token": os.getenv('replicate_api_token'),
+        "audio_backend": os.getenv('audio_backend', 'numpy'),  # "numpy" or "logic_pro"
+        "media_library_path": os.getenv('media_library_path'),  # SQLite catalog (default: next to staging_files/music)
+        "min_video_height": os.getenv('min_video_height'),  # e.g. 1080
+        "min_video_duration": os.getenv('min_video_duration'),  # Seconds, e.g. 20
+        "logic_pro_timeout": os.getenv('logic_pro_timeout'),  # Seconds to wait for a Logic Pro bounce
+        "render_mode": os.getenv('render_mode', 'stream_copy'),  # "stream_copy", "parallel" or "moviepy"
+        "render_workers": os.getenv('render_workers'),  # Encoder processes for "parallel" (default: CPU count)
+        "encode_profile": os.getenv('encode_profile', 'default'),  # "default" or "sleep-static"
+        "segment_cache_dir": os.getenv('segment_cache_dir'),  # Encoded intro/black-tail cache (default: ~/.cache)
+        "segment_cache_max_gb": os.getenv('segment_cache_max_gb'),  # LRU size cap for the segment cache
+        "intro_duration": os.getenv('intro_duration'),  # Intro seconds for --plan if it is not in the media library
+        "seamless_loops": os.getenv('seamless_loops', 'True'),  # Loop music and clip between matched points
+        "loop_point_cache_dir": os.getenv('loop_point_cache_dir'),  # Loop point results (default: ~/.cache)
+        "pipelined_upload": os.getenv('pipelined_upload', 'False'),  # Upload the final join while it is written
+        "batch_jobs": os.getenv('batch_jobs'),  # Render this many videos concurrently instead of one
+        "batch_cpu_slots": os.getenv('batch_cpu_slots'),  # Concurrent encodes in batch mode (default: 1)
+        "batch_logic_slots": os.getenv('batch_logic_slots'),  # Concurrent Logic Pro bounces (default: 1)
+        "batch_upload_slots": os.getenv('batch_upload_slots'),  # Concurrent uploads in batch mode (default: 1)
+        "youtube_daily_quota": os.getenv('youtube_daily_quota'),  # API quota units per day; an upload costs 1600
+        "upload_quota_state": os.getenv('upload_quota_state'),  # Units spent today (default: upload_quota.json)
+        "metrics_textfile": os.getenv('metrics_textfile'),  # Prometheus textfile for per-stage metrics, e.g. *.prom
     }
 
-    if configs.get('run_primary_shell'):
-        # Pass the configs dictionary to ExampleShell
-        ExampleShell(configs=configs)
+    parser = argparse.ArgumentParser(description="Build and upload a looped sleep video.")
+    parser.add_argument("--resume", metavar="OUTPUT_DIR",
+                        help="Finish an interrupted run, encoding only the segments its manifest lacks.")
+    stage_group = parser.add_mutually_exclusive_group()
+    stage_group.add_argument("--from-stage", choices=STAGES,
+                             help="With --resume: rerun this stage and every later one.")
+    stage_group.add_argument("--only-stage", choices=STAGES, help="With --resume: rerun just this stage.")
+    parser.add_argument("--plan", action="store_true",
+                        help="Dry run: print the inputs, loop count, black-screen duration and estimated size "
+                             "of the next run (or batch) from the media library, without rendering anything.")
+    args = parser.parse_args(argv)
+    if (args.from_stage or args.only_stage) and not args.resume:
+        parser.error("--from-stage and --only-stage need --resume OUTPUT_DIR")
+    if args.plan and args.resume:
+        parser.error("--plan cannot be combined with --resume")
+
+    # Imported here so --help and argument errors return before the pipeline modules load
+    from example.example import ExampleShell
+
+    if args.plan:
+        plan = ExampleShell(configs=configs, run=False).plan_run(int(configs.get('batch_jobs') or 1))
+        print(json.dumps(plan, indent=2))
+
+    elif args.resume:
+        ExampleShell(configs=configs, run=False).resume(args.resume, from_stage=args.from_stage,
+                                                        only_stage=args.only_stage)
+
+    elif configs.get('run_primary_shell'):
+        if configs.get('batch_jobs'):
+            ExampleShell(configs=configs, run=False).run_batch(int(configs['batch_jobs']))
+        else:
+            # Pass the configs dictionary to ExampleShell
+            ExampleShell(configs=configs)
 
     else:
         print("RUN_PRIMARY_SHELL is set to False. Skipping the example shell execution.")
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())